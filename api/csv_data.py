@@ -1,73 +1,49 @@
 from flask import Flask, jsonify, request
-import csv
-import io
-import base64
-from datetime import datetime
-import os
-import requests
+from datetime import date, datetime
+from homework_record import CSV_COLUMNS, HomeworkRecord, parse_date, sort_by_due_date
+from homework_store import build_homework_store
 
 app = Flask(__name__)
 
 # GitHub configuration
-GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN')
-GITHUB_REPO = os.environ.get('GITHUB_REPO')
 CSV_FILE_PATH = "homework_report.csv"
 
-def get_github_file(file_path):
-    """Get file content from GitHub repository"""
-    url = f"https://api.github.com/repos/{GITHUB_REPO}/contents/{file_path}"
-    headers = {
-        'Authorization': f'token {GITHUB_TOKEN}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
-    
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        content = response.json()
-        file_content = base64.b64decode(content['content']).decode('utf-8')
-        return file_content, content['sha']
-    return None, None
+homework_store = build_homework_store(CSV_FILE_PATH)
 
-def update_github_file(file_path, content, sha, commit_message):
-    """Update file content in GitHub repository"""
-    url = f"https://api.github.com/repos/{GITHUB_REPO}/contents/{file_path}"
-    headers = {
-        'Authorization': f'token {GITHUB_TOKEN}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
-    
-    encoded_content = base64.b64encode(content.encode('utf-8')).decode('utf-8')
-    
-    data = {
-        'message': commit_message,
-        'content': encoded_content,
-        'sha': sha
-    }
-    
-    response = requests.put(url, json=data, headers=headers)
-    return response.status_code == 200
+def date_arg(name):
+    """Optional YYYY-MM-DD query argument as a date"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if not isinstance(parsed, date):
+        raise ValueError(f"'{name}' must be a YYYY-MM-DD date")
+    return parsed
 
 @app.route('/api/get_csv', methods=['GET'])
 def api_get_csv():
-    """API endpoint to get CSV data"""
+    """API endpoint to get CSV data
+
+    ?from=YYYY-MM-DD and/or ?to=YYYY-MM-DD limit the rows to due dates in that
+    range; with partitioned storage only the partitions in range are read.
+    """
     try:
-        # Get CSV content from GitHub
-        csv_content, _ = get_github_file(CSV_FILE_PATH)
-        if csv_content is None:
-            return jsonify({"error": "CSV file not found"}), 404
+        try:
+            start, end = date_arg('from'), date_arg('to')
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Parse CSV data
-        homework_data = []
-        csv_reader = csv.DictReader(io.StringIO(csv_content))
-        for row in csv_reader:
-            homework_data.append(row)
+        # Get CSV data from GitHub
+        _, homework_data, version = homework_store.load(start, end)
+        if version is None and not homework_data and start is None and end is None:
+            return jsonify({"error": "CSV file not found"}), 404
         
         # Sort by due date (descending)
-        homework_data.sort(key=lambda x: x.get('endDate', ''), reverse=True)
+        sort_by_due_date(homework_data)
         
         return jsonify({
             "success": True,
-            "data": homework_data
+            "data": [record.to_json() for record in homework_data]
         })
         
     except Exception as e:
@@ -84,26 +60,22 @@ def api_update_csv():
         if not homework_data:
             return jsonify({"error": "No data provided"}), 400
         
-        # Get current CSV SHA
-        _, sha = get_github_file(CSV_FILE_PATH)
-        if sha is None:
+        # Get current CSV version (SHA, or the partition manifest)
+        version = homework_store.current_version()
+        if version is None:
             return jsonify({"error": "CSV file not found"}), 404
         
-        # Generate new CSV content
-        output = io.StringIO()
-        fieldnames = ['id', 'status', 'teaNameSurname', 'lesson', 'startDate', 'endDate', 'description']
-        writer = csv.DictWriter(output, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        # Sort by due date (descending) before writing
-        homework_data.sort(key=lambda x: x.get('endDate', ''), reverse=True)
-        writer.writerows(homework_data)
-        
-        new_csv_content = output.getvalue()
+        # Rebuild the records, sorted by due date (descending)
+        records = sort_by_due_date([HomeworkRecord.from_json(row) for row in homework_data])
+        fieldnames = list(CSV_COLUMNS)
+        for record in records:
+            for column in record.extra or ():
+                if column not in fieldnames:
+                    fieldnames.append(column)
         
-        # Update GitHub file
+        # Update GitHub file (only the partitions whose rows changed, when partitioned)
         commit_message = f"Update homework status - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        if update_github_file(CSV_FILE_PATH, new_csv_content, sha, commit_message):
+        if homework_store.save(fieldnames, records, version, commit_message):
             return jsonify({
                 "success": True,
                 "message": "CSV data updated successfully"
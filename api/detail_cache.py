@@ -0,0 +1,139 @@
+"""
+Homework Detail Cache
+Content-addressed on-disk cache of getHomeworkDetail responses with TTL and LRU eviction
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_DETAIL_CACHE_DIR = os.path.join(tempfile.gettempdir(), "homework_detail_cache")
+
+class DetailCache:
+    """Caches detail payloads by homework ID
+
+    Payloads are stored once per content hash under ``objects/`` and an index maps
+    each homework ID to its hash and timestamps, so identical payloads share a file
+    and a re-fetched ID that did not change costs no extra disk.
+    """
+
+    def __init__(self, directory, ttl_seconds=7 * 24 * 3600, max_entries=2000):
+        self.directory = directory
+        self.objects_dir = os.path.join(directory, "objects")
+        self.index_path = os.path.join(directory, "index.json")
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._index = None
+        self.hits = 0
+        self.misses = 0
+
+    def _load_index(self):
+        """Load the ID -> entry index from disk once"""
+        if self._index is None:
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except FileNotFoundError:
+                self._index = {}
+            except (ValueError, OSError) as e:
+                print(f"⚠️ Ignoring unreadable detail cache index: {e}")
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        """Atomically write the index back to disk"""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _object_path(self, content_hash):
+        return os.path.join(self.objects_dir, content_hash[:2], f"{content_hash}.json")
+
+    def _is_fresh(self, entry, now):
+        return self.ttl_seconds is None or now - entry['stored_at'] < self.ttl_seconds
+
+    def get(self, homework_id):
+        """Return the cached payload for a homework ID, or None if missing or stale"""
+        key = str(homework_id)
+        now = time.time()
+        with self._lock:
+            entry = self._load_index().get(key)
+            if not entry or not self._is_fresh(entry, now):
+                self.misses += 1
+                return None
+            try:
+                with open(self._object_path(entry['hash']), 'r', encoding='utf-8') as f:
+                    payload = json.load(f)
+            except (FileNotFoundError, ValueError):
+                # Index points at a missing or corrupt object - treat as a miss
+                del self._index[key]
+                self.misses += 1
+                return None
+            entry['accessed_at'] = now
+            self.hits += 1
+            return payload
+
+    def put(self, homework_id, payload):
+        """Store a payload for a homework ID and evict the least recently used entries"""
+        key = str(homework_id)
+        content = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        content_hash = hashlib.sha256(content).hexdigest()
+        now = time.time()
+
+        with self._lock:
+            index = self._load_index()
+            object_path = self._object_path(content_hash)
+            if not os.path.exists(object_path):
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                tmp_path = f"{object_path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(content)
+                os.replace(tmp_path, object_path)
+
+            index[key] = {'hash': content_hash, 'stored_at': now, 'accessed_at': now}
+            self._evict(now)
+            self._save_index()
+
+    def _evict(self, now):
+        """Drop expired entries, trim to max_entries by last access and delete orphaned objects"""
+        index = self._index
+        removed_hashes = set()
+
+        for key in [key for key, entry in index.items() if not self._is_fresh(entry, now)]:
+            removed_hashes.add(index.pop(key)['hash'])
+
+        if self.max_entries and len(index) > self.max_entries:
+            by_access = sorted(index.items(), key=lambda item: item[1]['accessed_at'])
+            for key, entry in by_access[:len(index) - self.max_entries]:
+                removed_hashes.add(entry['hash'])
+                del index[key]
+
+        if removed_hashes:
+            live_hashes = {entry['hash'] for entry in index.values()}
+            for content_hash in removed_hashes - live_hashes:
+                try:
+                    os.remove(self._object_path(content_hash))
+                except FileNotFoundError:
+                    pass
+
+    def flush(self):
+        """Persist access times collected by get()"""
+        with self._lock:
+            if self._index is not None:
+                self._save_index()
+
+def build_detail_cache():
+    """Build the detail cache from HOMEWORK_DETAIL_CACHE_* settings (None when disabled)"""
+    if os.environ.get('HOMEWORK_DETAIL_CACHE', 'on').lower() in ('off', '0', 'false'):
+        return None
+
+    directory = os.environ.get('HOMEWORK_DETAIL_CACHE_DIR', DEFAULT_DETAIL_CACHE_DIR)
+    ttl_hours = float(os.environ.get('HOMEWORK_DETAIL_CACHE_TTL_HOURS', '168'))
+    max_entries = int(os.environ.get('HOMEWORK_DETAIL_CACHE_MAX_ENTRIES', '2000'))
+    return DetailCache(directory, ttl_seconds=ttl_hours * 3600, max_entries=max_entries)
@@ -1,151 +1,373 @@
 from flask import Flask, jsonify, request
-import requests
 import json
-import csv
-import io
-import base64
 from datetime import datetime
 import os
+import threading
+import time
+from github_storage import github_storage
+from generate_html import generate_html_report, report_path_for, report_url
 from session_manager import session_manager
+from session_pool import load_accounts, session_pool
+from homework_record import sort_by_due_date
+from homework_store import build_homework_store
+from homework_sync import sync_accounts, sync_homework, timed_stage
+from id_index import IdIndex
+from sync_state import build_sync_state
+from run_lock import RunInProgress, build_single_flight
+from job_store import JobTracker, build_job_store
 
 app = Flask(__name__)
 
 # GitHub configuration
-GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN')
-GITHUB_REPO = os.environ.get('GITHUB_REPO')  # format: "username/repo-name"
 CSV_FILE_PATH = "homework_report.csv"
 
-def get_github_file(file_path):
-    """Get file content from GitHub repository"""
-    url = f"https://api.github.com/repos/{GITHUB_REPO}/contents/{file_path}"
-    headers = {
-        'Authorization': f'token {GITHUB_TOKEN}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
+# The default account's records (one CSV, or partitions with HOMEWORK_PARTITIONS set)
+homework_store = build_homework_store(CSV_FILE_PATH)
+
+# Remembers the last synced list fingerprint and any pending checkpoint between runs
+sync_state = build_sync_state()
+
+# Time budget for one invocation (keep below the Vercel function limit) and the part
+# of it held back for committing to GitHub
+FETCH_TIME_BUDGET = float(os.environ.get('FETCH_TIME_BUDGET', '50'))
+FETCH_COMMIT_RESERVE = float(os.environ.get('FETCH_COMMIT_RESERVE', '15'))
+
+# Status and progress of fetches started with {"async": true}
+job_store = build_job_store()
+
+def job_mode_unavailable():
+    """Why fetches can not run as background jobs here, or None if they can
+
+    A job runs on a thread after the 202 response, so it needs a server process that
+    keeps running (a Vercel function is frozen once it has answered) and a job store
+    that every process polling the job reads.
+    """
+    if os.environ.get('VERCEL'):
+        return "Job mode needs a long-running server; on Vercel POST without async"
+    if os.environ.get('FETCH_JOB_MODE', 'on').lower() == 'off':
+        return "Job mode is turned off (FETCH_JOB_MODE=off); POST without async"
+    return None
+
+# Overlapping fetches (cron, Fetch Homework, Refresh All) share one run per scope
+single_flights = {}
+single_flights_lock = threading.Lock()
+
+def get_single_flight(scope):
+    """Single-flight guard for one fetch scope (the default account or a set of batch accounts)"""
+    with single_flights_lock:
+        if scope not in single_flights:
+            single_flights[scope] = build_single_flight(scope, wait_timeout=FETCH_TIME_BUDGET)
+        return single_flights[scope]
+
+def accepts_joined_run(force):
+    """Which joined runs a fetch may take the result of: a forced fetch only takes a forced run's"""
+    if not force:
+        return None
+    return lambda result: bool(result[0].get('forced'))
+
+def render_report(records, on_stage=None):
+    """HTML report of sorted records, or None when there is nothing to report"""
+    if not records:
+        return None
+    with timed_stage(on_stage, 'render'):
+        return generate_html_report(records)
+
+def publish_stored_report(store, on_stage=None):
+    """Render the report from the records already in GitHub; returns the report URL, None if empty, False on failure"""
+    with timed_stage(on_stage, 'load'):
+        _, records, _ = store.load()
+    html_content = render_report(sort_by_due_date(records), on_stage)
+    if html_content is None:
+        return None
+    html_path = report_path_for(store.csv_path)
+    commit_message = f"Generate HTML report - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+    with timed_stage(on_stage, 'commit'):
+        committed = github_storage.commit_files({html_path: html_content}, commit_message)
+    return report_url(html_path) if committed else False
+
+def publish_joined_report(body, status, on_stage=None):
+    """Add the HTML report to the result of a plain fetch that a render request joined
+
+    The report is rendered from the data that run stored instead of syncing again.
+    Results that already carry ``report_url`` (a render run) are left as they are.
+    """
+    accounts = body.get('accounts')
+    if accounts is None:
+        if status != 200 or 'report_url' in body:
+            return body, status
+        url = publish_stored_report(homework_store, on_stage)
+        if url is False:
+            return {"error": "Failed to update HTML file"}, 500
+        return {**body, 'report_url': url}, status
     
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        content = response.json()
-        file_content = base64.b64decode(content['content']).decode('utf-8')
-        return file_content, content['sha']
-    return None, None
-
-def update_github_file(file_path, content, sha, commit_message):
-    """Update file content in GitHub repository"""
-    url = f"https://api.github.com/repos/{GITHUB_REPO}/contents/{file_path}"
-    headers = {
-        'Authorization': f'token {GITHUB_TOKEN}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
+    results = {}
+    for name, result in accounts.items():
+        if result.get('success') and 'report_url' not in result:
+            url = publish_stored_report(build_homework_store(result['csv_path']), on_stage)
+            result = {**result, 'report_url': url or None}
+        results[name] = result
+    return {**body, 'accounts': results}, status
+
+def save_sync_outcome(outcome, store, version, state_store, on_stage=None, render=False):
+    """Write a sync outcome to GitHub and update the sync state; returns (response dict, HTTP status)
+
+    ``store`` is the homework store the rows were loaded from and ``version`` what
+    its load returned, so a write over data changed in the meantime is refused.
+
+    With ``render`` the HTML report is rendered from the merged rows and committed
+    together with the CSV, so a refresh is one commit and one pass over the data.
+    """
+    if outcome is None:
+        return {"error": "Failed to fetch homework data"}, 500
+    
+    if outcome['unchanged']:
+        body = {
+            "success": True,
+            "message": "Homework list unchanged since last sync",
+            "new_items": 0,
+            "unchanged": True,
+            "complete": True
+        }
+        if render:
+            # Statuses may have been edited since the last report, so it is still refreshed
+            url = publish_stored_report(store, on_stage)
+            if url is False:
+                return {"error": "Failed to update HTML file"}, 500
+            body['report_url'] = url
+        return body, 200
     
-    encoded_content = base64.b64encode(content.encode('utf-8')).decode('utf-8')
+    all_rows = outcome['rows']
+    new_items = outcome['new_rows']
+    updated_count = outcome['updated_count']
+    still_pending = outcome['still_pending']
+    complete = outcome['complete']
     
-    data = {
-        'message': commit_message,
-        'content': encoded_content,
-        'sha': sha
+    # Sort all rows by due date (descending)
+    sort_by_due_date(all_rows)
+    
+    report_files = {}
+    html_path = report_path_for(store.csv_path)
+    if render:
+        html_content = render_report(all_rows, on_stage)
+        if html_content is not None:
+            report_files[html_path] = html_content
+    
+    # Update GitHub files; the report goes into the same commit as the data
+    commit_message = f"Auto-update homework data - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+    if not complete:
+        commit_message += f" (partial, {len(still_pending)} pending)"
+    with timed_stage(on_stage, 'commit'):
+        committed = store.save(outcome['fieldnames'], all_rows, version, commit_message, report_files)
+    if not committed:
+        return {"error": "Failed to update GitHub file"}, 500
+    
+    # The ID index of the committed CSV lets the next run classify items before the CSV is downloaded
+    list_result = outcome['list_result']
+    id_index = outcome['id_index'].to_text()
+    if complete:
+        state_store.update(
+            list_fingerprint=outcome['fingerprint'],
+            list_etag=list_result['etag'],
+            list_last_modified=list_result['last_modified'],
+            pending_ids=[],
+            id_index=id_index,
+            synced_at=datetime.now().isoformat()
+        )
+    else:
+        # Leave the fingerprint alone so the next run does not short-circuit
+        state_store.update(pending_ids=still_pending, id_index=id_index,
+                           checkpoint_at=datetime.now().isoformat())
+    
+    message = f"Added {len(new_items)} new and updated {updated_count} changed homework items"
+    if not complete:
+        message += f"; {len(still_pending)} items still pending, run again to finish"
+    body = {
+        "success": True,
+        "message": message,
+        "complete": complete,
+        "pending_items": len(still_pending),
+        "new_items": len(new_items),
+        "updated_items": updated_count,
+        "total_items": len(all_rows),
+        "connections": outcome['connections']
     }
+    if render:
+        body['report_url'] = report_url(html_path) if report_files else None
+    return body, 200
+
+def fetch_all_accounts(accounts, force, deadline, on_stage=None, on_progress=None, render=False):
+    """Sync every configured student account concurrently, each into its own CSV"""
+    state_stores = {account['name']: build_sync_state(account['name']) for account in accounts}
+    states = {name: store.load() for name, store in state_stores.items()}
+    homework_stores = {account['name']: build_homework_store(account['csv_path']) for account in accounts}
+    versions = {}
     
-    response = requests.put(url, json=data, headers=headers)
-    return response.status_code == 200
+    def load_existing(account):
+        fieldnames, rows, versions[account['name']] = homework_stores[account['name']].load()
+        return fieldnames, rows
+    
+    def save_outcome(account, outcome):
+        body, status = save_sync_outcome(
+            outcome, homework_stores[account['name']], versions.get(account['name']),
+            state_stores[account['name']], on_stage, render
+        )
+        body['csv_path'] = account['csv_path']
+        return body
+    
+    results = sync_accounts(
+        session_pool,
+        accounts,
+        load_existing,
+        save_outcome,
+        states=states,
+        load_index=lambda account: IdIndex.from_text(states[account['name']].get('id_index')),
+        force=force,
+        deadline=deadline,
+        on_stage=on_stage,
+        on_progress=on_progress
+    )
+    
+    failed = [name for name, result in results.items() if not result.get('success')]
+    return {
+        "success": not failed,
+        "message": f"Synced {len(results) - len(failed)} of {len(results)} accounts",
+        "complete": all(result.get('complete') for result in results.values()),
+        "accounts": results,
+        "detail_cache": session_pool.flush_detail_cache(),
+        "github": github_storage.get_stats()
+    }, 200 if not failed else 500
+
+def run_fetch(force, detail_deadline, selected_accounts=None, on_stage=None, on_progress=None, render=False):
+    """Run one fetch (all SCHOOL_ACCOUNTS in batch mode, else the default account); returns (body, status)
+
+    ``on_stage``/``on_progress`` receive pipeline progress (see JobTracker). ``render``
+    also publishes each account's HTML report (see save_sync_outcome).
+    """
+    # With SCHOOL_ACCOUNTS configured every listed student is synced (or those named in "accounts")
+    accounts = load_accounts()
+    if accounts:
+        if isinstance(selected_accounts, list):
+            accounts = [account for account in accounts if account['name'] in selected_accounts]
+        body, status = fetch_all_accounts(accounts, force, detail_deadline, on_stage, on_progress, render)
+        if force:
+            body['forced'] = True
+        return body, status
+    
+    # The CSV is only read once the sync needs it (never for an unchanged list); keep the version for the write
+    stored = {}
+    
+    def load_existing_csv():
+        fieldnames, rows, stored['version'] = homework_store.load()
+        return fieldnames, rows
+    
+    state = sync_state.load()
+    outcome = sync_homework(
+        session_manager,
+        load_existing_csv,
+        state=state,
+        load_index=lambda: IdIndex.from_text(state.get('id_index')),
+        force=force,
+        deadline=detail_deadline,
+        on_stage=on_stage,
+        on_progress=on_progress
+    )
+    body, status = save_sync_outcome(outcome, homework_store, stored.get('version'), sync_state, on_stage, render)
+    if status == 200 and not body.get('unchanged'):
+        body['detail_cache'] = session_manager.flush_detail_cache()
+        body['github'] = github_storage.get_stats()
+    if force:
+        body['forced'] = True
+    return body, status
+
+def run_fetch_job(tracker, scope, force, detail_deadline, selected_accounts, render):
+    """Background worker for a fetch started in job mode"""
+    tracker.start()
+    try:
+        (body, status), coalesced = get_single_flight(scope).run(
+            lambda: run_fetch(force, detail_deadline, selected_accounts, tracker.on_stage, tracker.on_progress,
+                              render),
+            accepts_joined_run(force)
+        )
+        if coalesced:
+            if render:
+                body, status = publish_joined_report(body, status, tracker.on_stage)
+            body = {**body, "coalesced": True}
+    except RunInProgress as e:
+        body, status = {"error": str(e), "in_progress": True}, 409
+    except Exception as e:
+        body, status = {"error": str(e)}, 500
+    tracker.finish(body, status)
 
-def fetch_homework_data():
-    """Make API call to fetch homework data using session manager"""
-    return session_manager.get_homework_list()
+@app.route('/api/fetch_homework', methods=['GET'])
+def api_fetch_homework_status():
+    """Status and progress of a fetch started in job mode (?job=<id>)
 
-def fetch_homework_detail(homework_id):
-    """Make API call to fetch homework detail data for a specific ID using session manager"""
-    return session_manager.get_homework_detail(homework_id)
+    Without ``job`` it tells the dashboard whether job mode can be used here.
+    """
+    if 'job' not in request.args:
+        return jsonify({"job_mode": job_mode_unavailable() is None, "time_budget": FETCH_TIME_BUDGET})
+    job = job_store.load(request.args.get('job', ''))
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
 
 @app.route('/api/fetch_homework', methods=['POST'])
 def api_fetch_homework():
-    """API endpoint to fetch and update homework data"""
+    """API endpoint to fetch and update homework data
+
+    POST {"async": true} (or ?async=1) to get a job ID back immediately (HTTP 202)
+    and poll GET /api/fetch_homework?job=<id> for progress, where job mode is
+    available (see job_mode_unavailable). {"render": true} also
+    publishes the HTML report in the same commit as the CSV.
+    """
     try:
-        # Get existing CSV content
-        csv_content, sha = get_github_file(CSV_FILE_PATH)
-        if csv_content is None:
-            # Create new CSV if doesn't exist
-            csv_content = "id,status,teaNameSurname,lesson,startDate,endDate,description\n"
-            sha = None
-        
-        # Parse existing CSV
-        existing_ids = set()
-        existing_rows = []
-        csv_reader = csv.DictReader(io.StringIO(csv_content))
-        fieldnames = csv_reader.fieldnames or ['id', 'status', 'teaNameSurname', 'lesson', 'startDate', 'endDate', 'description']
-        
-        for row in csv_reader:
-            existing_rows.append(row)
-            if row.get('id'):
-                existing_ids.add(str(row['id']))
-        
-        # Fetch new homework data
-        homework_list_data = fetch_homework_data()
-        if not homework_list_data:
-            return jsonify({"error": "Failed to fetch homework data"}), 500
-        
-        # Extract homework items
-        homework_items = []
-        if isinstance(homework_list_data, dict) and 'data' in homework_list_data:
-            homework_items = homework_list_data['data']
-        elif isinstance(homework_list_data, list):
-            homework_items = homework_list_data
-        
-        # Find new homework items
-        new_items = []
-        for item in homework_items:
-            homework_id = str(item.get('id', ''))
-            if homework_id and homework_id not in existing_ids:
-                # Fetch details
-                detail_data = fetch_homework_detail(homework_id)
-                description = ''
-                if detail_data and isinstance(detail_data, dict):
-                    if 'data' in detail_data and isinstance(detail_data['data'], dict):
-                        description = detail_data['data'].get('description', '')
-                    elif 'description' in detail_data:
-                        description = detail_data['description']
-                
-                item['description'] = description
-                new_items.append(item)
+        started = time.monotonic()
+        payload = request.get_json(silent=True) or {}
+        force = bool(payload.get('force')) or request.args.get('force') == '1'
+        time_budget = float(payload.get('time_budget') or FETCH_TIME_BUDGET)
+        detail_deadline = started + max(0, time_budget - FETCH_COMMIT_RESERVE)
+        selected_accounts = payload.get('accounts')
+        render = bool(payload.get('render')) or request.args.get('render') == '1'
         
-        # Sort new items by due date (descending)
-        new_items.sort(key=lambda x: x.get('endDate', ''), reverse=True)
+        # One scope per set of accounts, whatever the options: every run writes the same CSVs
+        scope = 'fetch'
+        if isinstance(selected_accounts, list):
+            scope += ':' + ','.join(sorted(str(name) for name in selected_accounts))
         
-        # Combine existing and new data
-        all_rows = existing_rows.copy()
-        for item in new_items:
-            row = {
-                'id': item.get('id', ''),
-                'status': '',  # Empty for manual filling
-                'teaNameSurname': item.get('teaNameSurname', ''),
-                'lesson': item.get('lesson', ''),
-                'startDate': item.get('startDate', ''),
-                'endDate': item.get('endDate', ''),
-                'description': item.get('description', '')
-            }
-            all_rows.append(row)
-        
-        # Sort all rows by due date (descending)
-        all_rows.sort(key=lambda x: x.get('endDate', ''), reverse=True)
-        
-        # Generate new CSV content
-        output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(all_rows)
-        new_csv_content = output.getvalue()
-        
-        # Update GitHub file
-        commit_message = f"Auto-update homework data - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        if update_github_file(CSV_FILE_PATH, new_csv_content, sha, commit_message):
+        if payload.get('async') or request.args.get('async') == '1':
+            unavailable = job_mode_unavailable()
+            if unavailable:
+                return jsonify({"error": unavailable}), 501
+            job_store.prune()
+            tracker = JobTracker(job_store)
+            threading.Thread(
+                target=run_fetch_job,
+                args=(tracker, scope, force, detail_deadline, selected_accounts, render),
+                name=f"fetch-job-{tracker.job_id[:8]}",
+                daemon=True
+            ).start()
             return jsonify({
                 "success": True,
-                "message": f"Added {len(new_items)} new homework items",
-                "new_items": len(new_items),
-                "total_items": len(all_rows)
-            })
-        else:
-            return jsonify({"error": "Failed to update GitHub file"}), 500
+                "job_id": tracker.job_id,
+                "status_url": f"/api/fetch_homework?job={tracker.job_id}"
+            }), 202
+        
+        # Join a fetch that is already running instead of racing it to write the CSV
+        # (a forced fetch waits for an unforced one to finish and then runs its own)
+        try:
+            (body, status), coalesced = get_single_flight(scope).run(
+                lambda: run_fetch(force, detail_deadline, selected_accounts, render=render),
+                accepts_joined_run(force)
+            )
+        except RunInProgress as e:
+            return jsonify({"error": str(e), "in_progress": True}), 409
+        
+        if coalesced:
+            if render:
+                # The joined run may not have rendered; publish the report from what it stored
+                body, status = publish_joined_report(body, status)
+            body = {**body, "coalesced": True}
+        return jsonify(body), status
             
     except Exception as e:
         return jsonify({"error": str(e)}), 500
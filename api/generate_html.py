@@ -1,59 +1,33 @@
 from flask import Flask, jsonify, request, send_file
-import csv
-import io
-import base64
 from datetime import datetime
 import os
-import requests
+from github_storage import github_storage
+from homework_record import format_value, sort_by_due_date
+from homework_store import build_homework_store
 
 app = Flask(__name__)
 
 # GitHub configuration
-GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN')
 GITHUB_REPO = os.environ.get('GITHUB_REPO')
 CSV_FILE_PATH = "homework_report.csv"
 HTML_FILE_PATH = "homework_report.html"
 
-def get_github_file(file_path):
-    """Get file content from GitHub repository"""
-    url = f"https://api.github.com/repos/{GITHUB_REPO}/contents/{file_path}"
-    headers = {
-        'Authorization': f'token {GITHUB_TOKEN}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
-    
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        content = response.json()
-        file_content = base64.b64decode(content['content']).decode('utf-8')
-        return file_content, content['sha']
-    return None, None
+homework_store = build_homework_store(CSV_FILE_PATH)
 
-def update_github_file(file_path, content, sha, commit_message):
-    """Update file content in GitHub repository"""
-    url = f"https://api.github.com/repos/{GITHUB_REPO}/contents/{file_path}"
-    headers = {
-        'Authorization': f'token {GITHUB_TOKEN}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
-    
-    encoded_content = base64.b64encode(content.encode('utf-8')).decode('utf-8')
-    
-    data = {
-        'message': commit_message,
-        'content': encoded_content,
-        'sha': sha if sha else None
-    }
-    
-    response = requests.put(url, json=data, headers=headers)
-    return response.status_code == 200
+def report_path_for(csv_path):
+    """Repository path of the HTML report rendered from a CSV"""
+    return f"{os.path.splitext(csv_path)[0]}.html"
+
+def report_url(html_path=HTML_FILE_PATH):
+    """Raw URL of a published HTML report"""
+    return f"https://raw.githubusercontent.com/{GITHUB_REPO}/{github_storage.branch}/{html_path}"
 
 def generate_html_report(homework_data):
-    """Generate beautiful HTML report from homework data"""
+    """Generate beautiful HTML report from a list of HomeworkRecords"""
     
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     total_homework = len(homework_data)
-    completed_homework = len([h for h in homework_data if h.get('status', '').strip().lower() == 'done'])
+    completed_homework = sum(1 for h in homework_data if h.done)
     pending_homework = total_homework - completed_homework
     
     completion_percentage = (completed_homework / total_homework * 100) if total_homework > 0 else 0
@@ -357,19 +331,19 @@ def generate_html_report(homework_data):
     
     # Add homework rows
     for homework in homework_data:
-        status = homework.get('status', '').strip()
+        status = homework.status.strip()
         status_class = 'status-done' if status.lower() == 'done' else 'status-empty'
         status_text = status if status else 'Not Started'
         
         html_content += f"""
                         <tr>
-                            <td><div class="homework-id">{homework.get('id', '')}</div></td>
+                            <td><div class="homework-id">{format_value(homework.id)}</div></td>
                             <td><span class="{status_class}">{status_text}</span></td>
-                            <td><div class="teacher-name">{homework.get('teaNameSurname', '')}</div></td>
-                            <td><div class="lesson-name">{homework.get('lesson', '')}</div></td>
-                            <td><div class="date-cell">{homework.get('startDate', '')}</div></td>
-                            <td><div class="date-cell">{homework.get('endDate', '')}</div></td>
-                            <td><div class="description-cell">{homework.get('description', '')}</div></td>
+                            <td><div class="teacher-name">{homework.teacher}</div></td>
+                            <td><div class="lesson-name">{homework.lesson}</div></td>
+                            <td><div class="date-cell">{format_value(homework.start_date)}</div></td>
+                            <td><div class="date-cell">{format_value(homework.end_date)}</div></td>
+                            <td><div class="description-cell">{homework.description}</div></td>
                         </tr>"""
     
     html_content += f"""
@@ -393,36 +367,30 @@ def generate_html_report(homework_data):
 def api_generate_html():
     """API endpoint to generate HTML report"""
     try:
-        # Get CSV content from GitHub
-        csv_content, _ = get_github_file(CSV_FILE_PATH)
-        if csv_content is None:
+        # Get CSV data from GitHub
+        _, homework_data, version = homework_store.load()
+        if version is None and not homework_data:
             return jsonify({"error": "CSV file not found"}), 404
         
-        # Parse CSV data
-        homework_data = []
-        csv_reader = csv.DictReader(io.StringIO(csv_content))
-        for row in csv_reader:
-            homework_data.append(row)
-        
         if not homework_data:
             return jsonify({"error": "No homework data found"}), 404
         
         # Sort by due date (descending)
-        homework_data.sort(key=lambda x: x.get('endDate', ''), reverse=True)
+        sort_by_due_date(homework_data)
         
         # Generate HTML
         html_content = generate_html_report(homework_data)
         
         # Get existing HTML SHA (if exists)
-        _, html_sha = get_github_file(HTML_FILE_PATH)
+        _, html_sha = github_storage.get_file(HTML_FILE_PATH)
         
         # Update HTML file in GitHub
         commit_message = f"Generate HTML report - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        if update_github_file(HTML_FILE_PATH, html_content, html_sha, commit_message):
+        if github_storage.update_file(HTML_FILE_PATH, html_content, html_sha, commit_message):
             return jsonify({
                 "success": True,
                 "message": "HTML report generated successfully",
-                "url": f"https://raw.githubusercontent.com/{GITHUB_REPO}/main/{HTML_FILE_PATH}"
+                "url": report_url()
             })
         else:
             return jsonify({"error": "Failed to update HTML file"}), 500
@@ -0,0 +1,296 @@
+"""
+GitHub Storage
+Pooled client for the repository files used as storage, with ETag-conditional reads and rate-limit tracking
+"""
+
+import base64
+import codecs
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+GITHUB_API_URL = "https://api.github.com"
+
+# Branch that multi-file commits are written to
+DEFAULT_BRANCH = os.environ.get('GITHUB_BRANCH', 'main')
+
+# Warn once fewer than this many core API requests are left in the current window
+RATE_LIMIT_WARNING = int(os.environ.get('GITHUB_RATE_LIMIT_WARNING', '100'))
+
+# Files larger than this (in characters) are written through the blobs API; the contents
+# API only inlines files up to 1 MB and its base64 payload is a third larger again
+LARGE_FILE_THRESHOLD = int(os.environ.get('GITHUB_LARGE_FILE_THRESHOLD', str(512 * 1024)))
+
+# Bytes per chunk when streaming a blob and characters per slice when encoding one
+BLOB_CHUNK_SIZE = 256 * 1024
+
+class GitHubStorage:
+    """Reads and writes repository files through the contents API over one pooled session
+
+    Every successful read is cached with its ETag, content and SHA. Later reads of
+    the same path send ``If-None-Match``; GitHub answers an unchanged file with a
+    body-less 304 that does not count against the rate limit, and the cached copy
+    is returned. Writes refresh the cached content and SHA. The remaining rate
+    limit is tracked from the ``X-RateLimit-*`` headers of every response.
+
+    Files past the contents API's inline limit are read as raw blobs and decoded
+    while they stream in, and written as blobs sent as UTF-8 instead of base64, so
+    no JSON or base64 copy of a large file is ever held in memory.
+    """
+
+    def __init__(self, token=None, repo=None, branch=None, pool_size=None, timeout=30):
+        self.token = token if token is not None else os.environ.get('GITHUB_TOKEN')
+        self.repo = repo if repo is not None else os.environ.get('GITHUB_REPO')  # format: "username/repo-name"
+        self.branch = branch or DEFAULT_BRANCH
+        self.timeout = timeout
+
+        if pool_size is None:
+            pool_size = int(os.environ.get('GITHUB_HTTP_POOL_SIZE', '4'))
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.http = requests.Session()
+        self.http.mount('https://', self.adapter)
+        self.http.headers.update({
+            'Authorization': f'token {self.token}',
+            'Accept': 'application/vnd.github.v3+json'
+        })
+
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.rate_limit = {'limit': None, 'remaining': None, 'reset_at': None}
+        self.stats = {'requests': 0, 'not_modified': 0}
+
+    def _contents_url(self, file_path):
+        return f"{GITHUB_API_URL}/repos/{self.repo}/contents/{file_path}"
+
+    def _git_url(self, path):
+        return f"{GITHUB_API_URL}/repos/{self.repo}/git/{path}"
+
+    def _track(self, response):
+        """Record the rate-limit headers of a response"""
+        headers = response.headers
+        with self._lock:
+            self.stats['requests'] += 1
+            if 'X-RateLimit-Remaining' not in headers:
+                return
+            try:
+                self.rate_limit = {
+                    'limit': int(headers.get('X-RateLimit-Limit', 0)),
+                    'remaining': int(headers['X-RateLimit-Remaining']),
+                    'reset_at': int(headers.get('X-RateLimit-Reset', 0))
+                }
+            except ValueError:
+                return
+        remaining = self.rate_limit['remaining']
+        if remaining < RATE_LIMIT_WARNING:
+            reset_in = max(0, self.rate_limit['reset_at'] - time.time())
+            print(f"⚠️ GitHub rate limit low: {remaining} requests left, resets in {reset_in / 60:.0f} min")
+
+    def get_file(self, file_path):
+        """Get file content from the repository, returning ``(content, sha)`` or ``(None, None)``"""
+        with self._lock:
+            cached = self._cache.get(file_path)
+
+        headers = {}
+        if cached and cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+
+        response = self.http.get(self._contents_url(file_path), headers=headers, timeout=self.timeout)
+        self._track(response)
+
+        if response.status_code == 304 and cached:
+            with self._lock:
+                self.stats['not_modified'] += 1
+            return cached['content'], cached['sha']
+
+        if response.status_code == 200:
+            content = response.json()
+            if content.get('encoding') == 'base64':
+                file_content = base64.b64decode(content['content']).decode('utf-8')
+            elif cached and cached['sha'] == content['sha']:
+                # Too large to inline, but the blob is the one already cached (e.g. after our own write)
+                file_content = cached['content']
+            else:
+                # Too large to inline: the response only carries metadata, so stream the blob
+                file_content = self.read_blob(content['sha'])
+                if file_content is None:
+                    return None, None
+            with self._lock:
+                self._cache[file_path] = {
+                    'etag': response.headers.get('ETag'),
+                    'content': file_content,
+                    'sha': content['sha']
+                }
+            return file_content, content['sha']
+
+        if response.status_code == 404:
+            with self._lock:
+                self._cache.pop(file_path, None)
+        else:
+            print(f"⚠️ GitHub read of {file_path} failed with HTTP {response.status_code}")
+        return None, None
+
+    def read_blob(self, sha):
+        """Text of a blob, streamed raw and decoded chunk by chunk; None on failure"""
+        response = self.http.get(self._git_url(f"blobs/{sha}"), headers={'Accept': 'application/vnd.github.raw'},
+                                 stream=True, timeout=self.timeout)
+        self._track(response)
+        with response:
+            if response.status_code != 200:
+                print(f"⚠️ GitHub read of blob {sha[:7]} failed with HTTP {response.status_code}")
+                return None
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            parts = [decoder.decode(chunk) for chunk in response.iter_content(BLOB_CHUNK_SIZE)]
+        parts.append(decoder.decode(b'', final=True))
+        return ''.join(parts)
+
+    def create_blob(self, content):
+        """Upload text as a blob, returning its SHA or None
+
+        The request body is assembled from JSON-escaped slices of the content, so
+        the only full-size copy is the encoded body itself.
+        """
+        body = bytearray(b'{"encoding": "utf-8", "content": "')
+        for start in range(0, len(content), BLOB_CHUNK_SIZE):
+            body += json.dumps(content[start:start + BLOB_CHUNK_SIZE])[1:-1].encode('ascii')
+        body += b'"}'
+        response = self.http.post(self._git_url('blobs'), data=body, timeout=self.timeout,
+                                  headers={'Content-Type': 'application/json'})
+        del body
+        self._track(response)
+        if response.status_code != 201:
+            print(f"⚠️ GitHub blob upload failed with HTTP {response.status_code}")
+            return None
+        return response.json()['sha']
+
+    def update_file(self, file_path, content, sha, commit_message):
+        """Create or update a file in the repository (``sha`` is None for a new file); returns success"""
+        if len(content) > LARGE_FILE_THRESHOLD:
+            # Past the contents API limit; same stale-sha check, through a blob and a commit
+            return self.commit_files({file_path: content}, commit_message, expected_shas={file_path: sha}) is not None
+
+        encoded_content = base64.b64encode(content.encode('utf-8')).decode('utf-8')
+
+        data = {
+            'message': commit_message,
+            'content': encoded_content,
+            'sha': sha if sha else None
+        }
+
+        response = self.http.put(self._contents_url(file_path), json=data, timeout=self.timeout)
+        self._track(response)
+        if response.status_code not in (200, 201):
+            print(f"⚠️ GitHub write of {file_path} failed with HTTP {response.status_code}")
+            return False
+
+        # The new SHA comes back with the commit; the next read revalidates with a fresh ETag
+        new_sha = response.json().get('content', {}).get('sha')
+        with self._lock:
+            self._cache[file_path] = {'etag': None, 'content': content, 'sha': new_sha}
+        return True
+
+    def _git_call(self, method, path, **kwargs):
+        """One Git Data API call; returns the parsed JSON body, or None with the status printed"""
+        response = self.http.request(method, self._git_url(path), timeout=self.timeout, **kwargs)
+        self._track(response)
+        if response.status_code not in (200, 201):
+            print(f"⚠️ GitHub {method} git/{path.split('?')[0]} failed with HTTP {response.status_code}")
+            return None
+        return response.json()
+
+    def commit_files(self, files, commit_message, expected_shas=None, max_attempts=3):
+        """Write several text files as one commit through the Git Data API
+
+        ``files`` maps paths to content (None deletes the file). ``expected_shas`` maps paths to the blob SHA
+        they had when they were read (None for a file that did not exist yet); if
+        any of them changed on the branch since, nothing is written, like a
+        contents-API PUT with a stale sha. The new tree is built on the branch head
+        and the ref only moves forward, so a commit that raced another writer is
+        retried on top of it. Large files are uploaded as blobs once, up front.
+        Returns the new commit SHA, or None on failure.
+        """
+        expected_shas = expected_shas or {}
+        entries = []
+        for path, content in files.items():
+            entry = {'path': path, 'mode': '100644', 'type': 'blob'}
+            if content is None:
+                entry['sha'] = None
+            elif len(content) > LARGE_FILE_THRESHOLD:
+                entry['sha'] = self.create_blob(content)
+                if entry['sha'] is None:
+                    return None
+            else:
+                entry['content'] = content
+            entries.append(entry)
+
+        for attempt in range(max_attempts):
+            ref = self._git_call('GET', f"ref/heads/{self.branch}")
+            if ref is None:
+                return None
+            head_sha = ref['object']['sha']
+            head = self._git_call('GET', f"commits/{head_sha}")
+            if head is None:
+                return None
+            base_tree = head['tree']['sha']
+
+            if expected_shas:
+                tree = self._git_call('GET', f"trees/{base_tree}?recursive=1")
+                if tree is None:
+                    return None
+                current = {entry['path']: entry['sha'] for entry in tree.get('tree', []) if entry['type'] == 'blob'}
+                stale = [path for path, sha in expected_shas.items() if current.get(path) != sha]
+                if stale:
+                    print(f"⚠️ Not committing: {', '.join(stale)} changed since it was read")
+                    return None
+
+            tree = self._git_call('POST', 'trees', json={'base_tree': base_tree, 'tree': entries})
+            if tree is None:
+                return None
+            commit = self._git_call('POST', 'commits', json={
+                'message': commit_message,
+                'tree': tree['sha'],
+                'parents': [head_sha]
+            })
+            if commit is None:
+                return None
+
+            response = self.http.patch(self._git_url(f"refs/heads/{self.branch}"),
+                                       json={'sha': commit['sha'], 'force': False}, timeout=self.timeout)
+            self._track(response)
+            if response.status_code == 200:
+                written = {path: {'etag': None, 'content': content, 'sha': blob_sha(content)}
+                           for path, content in files.items() if content is not None}
+                with self._lock:
+                    for path in files:
+                        if path in written:
+                            self._cache[path] = written[path]
+                        else:
+                            self._cache.pop(path, None)
+                return commit['sha']
+            if response.status_code != 422:
+                print(f"⚠️ GitHub ref update failed with HTTP {response.status_code}")
+                return None
+            # Someone else committed in between; rebuild on the new head
+            print(f"🔁 Branch moved during commit, retrying (attempt {attempt + 2}/{max_attempts})")
+        return None
+
+    def get_stats(self):
+        """Request counts, 304 hits and the last seen rate limit"""
+        with self._lock:
+            return {**self.stats, 'rate_limit': dict(self.rate_limit)}
+
+def blob_sha(content):
+    """Git blob SHA of text content, as reported by the contents and trees APIs (hashed in slices)"""
+    starts = range(0, len(content), BLOB_CHUNK_SIZE)
+    size = sum(len(content[start:start + BLOB_CHUNK_SIZE].encode('utf-8')) for start in starts)
+    digest = hashlib.sha1(b"blob %d\0" % size)
+    for start in starts:
+        digest.update(content[start:start + BLOB_CHUNK_SIZE].encode('utf-8'))
+    return digest.hexdigest()
+
+# Shared by the Vercel functions in this process so warm invocations reuse connections and cached files
+github_storage = GitHubStorage()
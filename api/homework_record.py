@@ -0,0 +1,295 @@
+"""
+Homework Record
+Compact slotted homework row shared by every module, with CSV, JSON and OBS payload codecs
+"""
+
+import csv
+import hashlib
+import io
+import json
+import sys
+from datetime import date
+from operator import attrgetter, itemgetter
+
+# CSV layout shared by every writer; listHash holds the hash of the row's list fields
+CSV_COLUMNS = ['id', 'status', 'teaNameSurname', 'lesson', 'startDate', 'endDate', 'description', 'listHash']
+
+# Columns copied from getHomeworkList items into each row
+LIST_COLUMNS = ['teaNameSurname', 'lesson', 'startDate', 'endDate']
+
+def parse_id(value):
+    """Homework ID as an int; IDs that are not plain integers are kept as stripped text ('' -> None)
+
+    Only canonical integers are converted, so an ID such as '007' or '+7' keeps its
+    text and is written back unchanged.
+    """
+    if value is None or isinstance(value, int):
+        return value
+    text = str(value).strip()
+    if not text:
+        return None
+    try:
+        number = int(text)
+    except ValueError:
+        return text
+    return number if str(number) == text else text
+
+# Homework shares a handful of dates, so parsed dates are shared objects (bounded, cleared when full)
+_DATE_CACHE = {}
+_DATE_CACHE_SIZE = 4096
+
+def parse_date(value):
+    """A ``YYYY-MM-DD`` value as a date; anything else is kept as text so it round-trips unchanged"""
+    if value is None or isinstance(value, date):
+        return value
+    text = str(value)
+    parsed = _DATE_CACHE.get(text)
+    if parsed is not None:
+        return parsed
+    parsed = text or None
+    if len(text) == 10:
+        try:
+            parsed = date.fromisoformat(text)
+        except ValueError:
+            pass
+        else:
+            # Other ISO forms of the same length (e.g. week dates) stay text
+            if parsed.isoformat() != text:
+                parsed = text
+    if len(_DATE_CACHE) >= _DATE_CACHE_SIZE:
+        _DATE_CACHE.clear()
+    _DATE_CACHE[text] = parsed
+    return parsed
+
+def format_value(value):
+    """CSV/JSON text of an ID or date field ('' for None)"""
+    if value is None:
+        return ''
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+def _date_text(value, cache={}):
+    """format_value for date fields, reusing the text of dates already seen"""
+    text = cache.get(value)
+    if text is None:
+        if len(cache) >= _DATE_CACHE_SIZE:
+            cache.clear()
+        text = cache[value] = format_value(value)
+    return text
+
+def list_hash_of(teacher, lesson, start, end):
+    """Short hash of the list fields stored for one homework item (all given as text)"""
+    canonical = json.dumps([teacher, lesson, start, end], ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+class HomeworkRecord:
+    """One homework row
+
+    ``id`` is an int and the dates are ``datetime.date`` objects whenever that
+    gives back the same text (see parse_id and parse_date). Columns outside
+    CSV_COLUMNS (added to the CSV by hand) are kept in ``extra`` so they survive a rewrite.
+    """
+
+    __slots__ = ('id', 'status', 'teacher', 'lesson', 'start_date', 'end_date',
+                 'description', 'list_hash', 'extra')
+
+    def __init__(self, id=None, status='', teacher='', lesson='', start_date=None, end_date=None,
+                 description='', list_hash='', extra=None):
+        self.id = parse_id(id)
+        self.status = sys.intern(status or '')
+        self.teacher = sys.intern(teacher or '')
+        self.lesson = sys.intern(lesson or '')
+        self.start_date = parse_date(start_date)
+        self.end_date = parse_date(end_date)
+        self.description = description or ''
+        self.list_hash = list_hash or ''
+        self.extra = extra or None
+
+    def __repr__(self):
+        return f"HomeworkRecord(id={self.id!r}, lesson={self.lesson!r}, end_date={self.end_date!r})"
+
+    def __eq__(self, other):
+        if not isinstance(other, HomeworkRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    @property
+    def key(self):
+        """ID as text, for matching against IDs that arrive as strings (checkpoints, query args)"""
+        return format_value(self.id)
+
+    @property
+    def done(self):
+        return self.status.strip().lower() == 'done'
+
+    def due_key(self):
+        """Sort key for due date (records are listed most recent due date first)"""
+        return format_value(self.end_date)
+
+    def compute_list_hash(self):
+        return list_hash_of(self.teacher, self.lesson, format_value(self.start_date),
+                            format_value(self.end_date))
+
+    def current_list_hash(self):
+        """Stored list hash, or one computed from the fields for rows written before hashes existed"""
+        return self.list_hash or self.compute_list_hash()
+
+    def update_list_fields(self, other):
+        """Take the list fields and description of a re-fetched record, keeping the status"""
+        self.teacher = other.teacher
+        self.lesson = other.lesson
+        self.start_date = other.start_date
+        self.end_date = other.end_date
+        self.description = other.description
+        self.list_hash = other.list_hash
+
+    # --- OBS payload ---
+
+    @classmethod
+    def from_obs(cls, item, description=''):
+        """Record for a getHomeworkList item (status left empty for manual filling)"""
+        return cls(
+            id=item.get('id'),
+            teacher=item.get('teaNameSurname', ''),
+            lesson=item.get('lesson', ''),
+            start_date=item.get('startDate'),
+            end_date=item.get('endDate'),
+            description=description,
+            list_hash=obs_list_hash(item)
+        )
+
+    # --- JSON (dashboard API) ---
+
+    def to_json(self):
+        """Dict with the CSV column names, as served to the dashboard"""
+        data = dict(self.extra) if self.extra else {}
+        data.update({
+            'id': self.id if self.id is not None else '',
+            'status': self.status,
+            'teaNameSurname': self.teacher,
+            'lesson': self.lesson,
+            'startDate': format_value(self.start_date),
+            'endDate': format_value(self.end_date),
+            'description': self.description,
+            'listHash': self.list_hash
+        })
+        return data
+
+    @classmethod
+    def from_json(cls, data):
+        extra = {key: value for key, value in data.items() if key not in CSV_COLUMNS}
+        return cls(
+            id=data.get('id'),
+            status=data.get('status', ''),
+            teacher=data.get('teaNameSurname', ''),
+            lesson=data.get('lesson', ''),
+            start_date=data.get('startDate'),
+            end_date=data.get('endDate'),
+            description=data.get('description', ''),
+            list_hash=data.get('listHash', ''),
+            extra=extra
+        )
+
+def obs_list_hash(item):
+    """List hash of a raw getHomeworkList item"""
+    return list_hash_of(*(str(item.get(column, '') or '') for column in LIST_COLUMNS))
+
+# Record attribute behind each standard CSV column
+_COLUMN_ATTRS = {
+    'id': 'id',
+    'status': 'status',
+    'teaNameSurname': 'teacher',
+    'lesson': 'lesson',
+    'startDate': 'start_date',
+    'endDate': 'end_date',
+    'description': 'description',
+    'listHash': 'list_hash'
+}
+
+def read_records(file):
+    """Parse an open CSV file (or any iterable of lines) into ``(fieldnames, records)``
+
+    Uses csv.reader with the header's column positions rather than DictReader, so
+    no per-row dict is built. Teacher, lesson and status repeat across rows and are
+    interned.
+    """
+    reader = csv.reader(file)
+    fieldnames = next(reader, None) or []
+    width = len(fieldnames)
+    # Columns missing from the header read from a blank cell appended past the end
+    positions = [fieldnames.index(name) if name in fieldnames else width for name in CSV_COLUMNS]
+    get_columns = itemgetter(*positions)
+    unknown = [(index, name) for index, name in enumerate(fieldnames) if name not in _COLUMN_ATTRS]
+    intern = sys.intern
+    new = HomeworkRecord.__new__
+    dates = _DATE_CACHE
+
+    records = []
+    for values in reader:
+        if not values:
+            continue
+        if len(values) < width:
+            values += [''] * (width - len(values))
+        values.append('')
+        homework_id, status, teacher, lesson, start, end, description, list_hash = get_columns(values)
+
+        record = new(HomeworkRecord)
+        if homework_id.isdigit() and homework_id.isascii() and homework_id[0] != '0':
+            record.id = int(homework_id)
+        else:
+            record.id = parse_id(homework_id)
+        record.status = intern(status)
+        record.teacher = intern(teacher)
+        record.lesson = intern(lesson)
+        record.start_date = dates.get(start) or parse_date(start)
+        record.end_date = dates.get(end) or parse_date(end)
+        record.description = description
+        record.list_hash = list_hash
+        record.extra = None
+        if unknown:
+            record.extra = {name: values[index] for index, name in unknown if values[index]} or None
+        records.append(record)
+    return fieldnames, records
+
+def parse_csv(text):
+    """``(fieldnames, records)`` from CSV text"""
+    return read_records(io.StringIO(text))
+
+def record_row(record, fieldnames=CSV_COLUMNS):
+    """CSV values of a record in ``fieldnames`` order"""
+    homework_id = record.id
+    row = [
+        '' if homework_id is None else str(homework_id), record.status, record.teacher, record.lesson,
+        _date_text(record.start_date), _date_text(record.end_date),
+        record.description, record.list_hash
+    ]
+    if fieldnames is CSV_COLUMNS or fieldnames == CSV_COLUMNS:
+        return row
+    by_name = dict(zip(CSV_COLUMNS, row))
+    extra = record.extra or {}
+    return [by_name[name] if name in by_name else extra.get(name, '') for name in fieldnames]
+
+def write_records(file, fieldnames, records, header=True):
+    """Write records as CSV rows to an open file"""
+    writer = csv.writer(file)
+    if header:
+        writer.writerow(fieldnames)
+    writer.writerows(record_row(record, fieldnames) for record in records)
+
+def records_to_csv(fieldnames, records):
+    """CSV text for records, header included"""
+    output = io.StringIO()
+    write_records(output, fieldnames, records)
+    return output.getvalue()
+
+def sort_by_due_date(records):
+    """Sort records in place, most recent due date first"""
+    try:
+        # Dates compare directly; only a mix with missing or free-text dates needs the text key
+        records.sort(key=attrgetter('end_date'), reverse=True)
+    except TypeError:
+        records.sort(key=HomeworkRecord.due_key, reverse=True)
+    return records
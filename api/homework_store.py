@@ -0,0 +1,300 @@
+"""
+Homework Store
+Storage interface for the homework records, with GitHub backends (one CSV, or CSV partitions with a manifest)
+"""
+
+import json
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from github_storage import blob_sha, github_storage
+from homework_record import CSV_COLUMNS, format_value, parse_csv, records_to_csv, sort_by_due_date
+
+# Partitions read at the same time (each is one conditional GET)
+PARTITION_READ_WORKERS = 4
+
+UNDATED_PARTITION = 'undated'
+
+def partition_key(due, scheme):
+    """Partition of a due date: 'YYYY-MM' by month, 'YYYY-YYYY-T' by school term
+
+    The autumn term runs September to January and the spring term February to
+    August. Rows without a real due date share one 'undated' partition.
+    """
+    if not isinstance(due, date):
+        return UNDATED_PARTITION
+    if scheme == 'month':
+        return f"{due.year:04d}-{due.month:02d}"
+    if due.month >= 9:
+        return f"{due.year}-{due.year + 1}-1"
+    if due.month == 1:
+        return f"{due.year - 1}-{due.year}-1"
+    return f"{due.year - 1}-{due.year}-2"
+
+def in_range(due, start=None, end=None):
+    """Whether a due date falls within [start, end] (either bound may be None)"""
+    if start is None and end is None:
+        return True
+    if not isinstance(due, date):
+        return False
+    return (start is None or due >= start) and (end is None or due <= end)
+
+class HomeworkStore(ABC):
+    """Where one dataset of homework records (one account's ``csv_path``) is kept
+
+    ``load()`` returns ``(fieldnames, records, version)``; ``save()`` replaces the
+    full dataset and returns its new version, refusing (returning None) if it
+    changed since ``version``. ``version`` is opaque to callers and None when
+    nothing is stored yet.
+    """
+
+    csv_path = None
+
+    @abstractmethod
+    def load(self, start=None, end=None):
+        """``(fieldnames, records, version)``, optionally only records due in [start, end]"""
+
+    @abstractmethod
+    def current_version(self):
+        """Version of the stored data without loading it; None if nothing is stored"""
+
+    @abstractmethod
+    def save(self, fieldnames, records, version, commit_message, extra_files=None):
+        """Replace the stored records and return the new version (None if refused or failed)
+
+        ``extra_files`` (e.g. the HTML report) are published to GitHub with them.
+        """
+
+class SingleCsvStore(HomeworkStore):
+    """All records in one CSV file; the version is the file's blob SHA"""
+
+    def __init__(self, csv_path, storage=None):
+        self.csv_path = csv_path
+        self.storage = storage if storage is not None else github_storage
+
+    def load(self, start=None, end=None):
+        """``(fieldnames, records, version)``; a missing file gives no records and version None
+
+        A load limited to due dates in [start, end] returns no version, so the
+        subset can not be saved over the full dataset.
+        """
+        csv_content, sha = self.storage.get_file(self.csv_path)
+        if csv_content is None:
+            return list(CSV_COLUMNS), [], None
+        fieldnames, records = parse_csv(csv_content)
+        if start is not None or end is not None:
+            return fieldnames, [record for record in records if in_range(record.end_date, start, end)], None
+        return fieldnames, records, sha
+
+    def current_version(self):
+        """Version of the stored data without parsing it; None if nothing is stored"""
+        return self.storage.get_file(self.csv_path)[1]
+
+    def save(self, fieldnames, records, version, commit_message, extra_files=None):
+        """Replace the stored records (the full dataset) unless they changed since ``version``
+
+        ``extra_files`` (e.g. the HTML report) are committed in the same commit.
+        Returns the new version (the blob SHA GitHub gives the written CSV) or None.
+        """
+        csv_content = records_to_csv(fieldnames, sort_by_due_date(records))
+        if extra_files:
+            files = {self.csv_path: csv_content, **extra_files}
+            committed = self.storage.commit_files(files, commit_message,
+                                                  expected_shas={self.csv_path: version}) is not None
+        else:
+            committed = self.storage.update_file(self.csv_path, csv_content, version, commit_message)
+        return blob_sha(csv_content) if committed else None
+
+class PartitionedCsvStore(HomeworkStore):
+    """Records split into one CSV per month or school term, listed in a manifest
+
+    ``homework_report.csv`` is stored as ``homework_report/<partition>.csv`` plus
+    ``homework_report/manifest.json``, which lists every partition's row count,
+    due-date range and blob SHA. A save re-serializes each partition but commits
+    only those whose SHA changed (normally just the current term or month) and the
+    manifest, in one commit. A ranged load reads only the partitions whose due
+    dates overlap the range.
+
+    A repository that still has the single CSV is read from it and split into
+    partitions on the first save; the old file is left in place.
+    """
+
+    def __init__(self, csv_path, scheme='term', storage=None):
+        self.csv_path = csv_path
+        self.scheme = scheme
+        self.storage = storage if storage is not None else github_storage
+        self.directory = os.path.splitext(csv_path)[0]
+        self.manifest_path = f"{self.directory}/manifest.json"
+
+    def partition_path(self, key):
+        return f"{self.directory}/{key}.csv"
+
+    def _read_manifest(self):
+        """``(manifest, sha)``; an unreadable or missing manifest gives ``(None, sha)``"""
+        manifest_content, sha = self.storage.get_file(self.manifest_path)
+        if manifest_content is None:
+            return None, None
+        try:
+            return json.loads(manifest_content), sha
+        except ValueError:
+            print(f"⚠️ Ignoring unreadable partition manifest {self.manifest_path}")
+            return None, sha
+
+    def _load_legacy(self, manifest_sha, start, end):
+        """Records of the single CSV written before partitioning was turned on"""
+        fieldnames, records, sha = SingleCsvStore(self.csv_path, self.storage).load(start, end)
+        if start is not None or end is not None or (sha is None and manifest_sha is None):
+            return fieldnames, records, None
+        return fieldnames, records, {'manifest': {}, 'manifest_sha': manifest_sha, 'shas': {}}
+
+    def load(self, start=None, end=None):
+        """``(fieldnames, records, version)`` of every partition, or only those overlapping [start, end]
+
+        As with SingleCsvStore, a ranged load returns no version.
+        """
+        manifest, manifest_sha = self._read_manifest()
+        if manifest is None:
+            return self._load_legacy(manifest_sha, start, end)
+
+        entries = manifest.get('partitions', [])
+        if start is not None or end is not None:
+            entries = [entry for entry in entries if self._overlaps(entry, start, end)]
+
+        def read(entry):
+            return entry, self.storage.get_file(entry['path'])
+
+        with ThreadPoolExecutor(max_workers=PARTITION_READ_WORKERS, thread_name_prefix="partition-read") as executor:
+            results = list(executor.map(read, entries))
+
+        fieldnames = list(manifest.get('fieldnames') or CSV_COLUMNS)
+        records = []
+        shas = {}
+        for entry, (csv_content, sha) in results:
+            shas[entry['path']] = sha
+            if csv_content is None:
+                print(f"⚠️ Partition {entry['path']} listed in the manifest is missing")
+                continue
+            partition_fieldnames, partition_records = parse_csv(csv_content)
+            fieldnames.extend(name for name in partition_fieldnames if name not in fieldnames)
+            records.extend(partition_records)
+        if start is not None or end is not None:
+            return fieldnames, [record for record in records if in_range(record.end_date, start, end)], None
+        return fieldnames, records, {'manifest': manifest, 'manifest_sha': manifest_sha, 'shas': shas}
+
+    @staticmethod
+    def _overlaps(entry, start, end):
+        first, last = entry.get('first_due'), entry.get('last_due')
+        if not first or not last:
+            return False
+        return (end is None or first <= end.isoformat()) and (start is None or last >= start.isoformat())
+
+    def current_version(self):
+        """Version of the stored data from the manifest alone; None if nothing is stored"""
+        manifest, manifest_sha = self._read_manifest()
+        if manifest is None:
+            if self.storage.get_file(self.csv_path)[1] is None and manifest_sha is None:
+                return None
+            return {'manifest': {}, 'manifest_sha': manifest_sha, 'shas': {}}
+        shas = {entry['path']: entry.get('sha') for entry in manifest.get('partitions', [])}
+        return {'manifest': manifest, 'manifest_sha': manifest_sha, 'shas': shas}
+
+    def save(self, fieldnames, records, version, commit_message, extra_files=None):
+        """Replace the stored records (the full dataset), committing only the partitions that changed
+
+        Partitions left without records are deleted. The commit is refused if the
+        manifest or a rewritten partition changed since ``version`` was read.
+        Returns the new version, built from the SHAs of what was written, or None.
+        """
+        version = version or {'manifest': {}, 'manifest_sha': None, 'shas': {}}
+        previous = {entry['key']: entry for entry in version['manifest'].get('partitions', [])}
+
+        groups = {}
+        for record in sort_by_due_date(records):
+            groups.setdefault(partition_key(record.end_date, self.scheme), []).append(record)
+
+        files = {}
+        expected_shas = {self.manifest_path: version['manifest_sha']}
+        entries = []
+        for key in sorted(groups):
+            path = self.partition_path(key)
+            rows = groups[key]
+            csv_content = records_to_csv(fieldnames, rows)
+            sha = blob_sha(csv_content)
+            stored_sha = version['shas'].get(path, previous.get(key, {}).get('sha'))
+            if sha != stored_sha:
+                files[path] = csv_content
+                expected_shas[path] = stored_sha
+            dates = [row.end_date for row in rows if isinstance(row.end_date, date)]
+            entries.append({
+                'key': key,
+                'path': path,
+                'rows': len(rows),
+                'first_due': format_value(min(dates)) if dates else None,
+                'last_due': format_value(max(dates)) if dates else None,
+                'sha': sha
+            })
+        for key in previous.keys() - groups.keys():
+            path = self.partition_path(key)
+            files[path] = None
+            expected_shas[path] = version['shas'].get(path, previous[key].get('sha'))
+
+        manifest = {
+            'scheme': self.scheme,
+            'fieldnames': list(fieldnames),
+            'partitions': entries
+        }
+        if not files and manifest == {key: version['manifest'].get(key) for key in manifest}:
+            # Nothing changed, unless someone else committed since ``version`` was read;
+            # only the extra files (if any) need a commit
+            if self._read_manifest()[1] != version['manifest_sha']:
+                return None
+            if extra_files and self.storage.commit_files(extra_files, commit_message) is None:
+                return None
+            return version
+
+        manifest['updated_at'] = datetime.now().isoformat(timespec='seconds')
+        manifest_content = json.dumps(manifest, indent=2, ensure_ascii=False) + "\n"
+        files[self.manifest_path] = manifest_content
+        files.update(extra_files or {})
+        if self.storage.commit_files(files, commit_message, expected_shas=expected_shas) is None:
+            return None
+        return {
+            'manifest': manifest,
+            'manifest_sha': blob_sha(manifest_content),
+            'shas': {entry['path']: entry['sha'] for entry in entries}
+        }
+
+def build_github_store(csv_path):
+    """GitHub store selected by HOMEWORK_PARTITIONS ('term' or 'month'; unset keeps one CSV)"""
+    scheme = os.environ.get('HOMEWORK_PARTITIONS', '').strip().lower()
+    if scheme in ('term', 'month'):
+        return PartitionedCsvStore(csv_path, scheme)
+    if scheme:
+        print(f"⚠️ Unknown HOMEWORK_PARTITIONS '{scheme}', keeping a single CSV")
+    return SingleCsvStore(csv_path)
+
+def build_homework_store(csv_path):
+    """Build the store selected by HOMEWORK_STORE ('github' or 'sqlite')
+
+    With 'sqlite' the records live in the HOMEWORK_DB_PATH database and, unless
+    HOMEWORK_GITHUB_MIRROR is 'off', are mirrored to the GitHub store in the background.
+    SQLite is for self-hosted servers only: on Vercel every instance would keep its
+    own database in ``/tmp`` and background exports are frozen with the function,
+    so the GitHub store is used there instead.
+    """
+    backend = os.environ.get('HOMEWORK_STORE', 'github').strip().lower()
+    if backend == 'sqlite' and os.environ.get('VERCEL'):
+        print("⚠️ HOMEWORK_STORE=sqlite needs a self-hosted server with a persistent database, using GitHub on Vercel")
+        backend = 'github'
+    if backend == 'sqlite':
+        from sqlite_store import GitHubMirror, SqliteStore, default_db_path
+
+        mirror = None
+        if os.environ.get('HOMEWORK_GITHUB_MIRROR', 'on').strip().lower() != 'off':
+            mirror = GitHubMirror(build_github_store(csv_path))
+        return SqliteStore(csv_path, default_db_path(), mirror)
+    if backend != 'github':
+        print(f"⚠️ Unknown HOMEWORK_STORE '{backend}', using GitHub")
+    return build_github_store(csv_path)
@@ -0,0 +1,417 @@
+"""
+Homework Sync Pipeline
+Shared fetch stages used by the Vercel functions and the local homework_fetcher.py script
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+import time
+
+from homework_record import CSV_COLUMNS, HomeworkRecord, parse_id, sort_by_due_date
+from id_index import IdIndex
+from list_stream import ListStreamError
+from rate_limit import DeadlineReached, backoff_delay
+
+OBS_HOST = "bogazicisehirkolejiobs.com"
+
+# Detail fetch concurrency (overridable per call); the per-host cap is enforced by the client's connector
+DEFAULT_MAX_WORKERS = int(os.environ.get('HOMEWORK_FETCH_WORKERS', '8'))
+
+# Times a list that breaks off mid-stream is opened again (the same budget as the list request's retries)
+LIST_STREAM_RETRIES = 2
+
+class ListFingerprint:
+    """Incremental list fingerprint: a sha256 over each item's canonical JSON, fed as items arrive"""
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+        self.count = 0
+
+    def add(self, item):
+        canonical = json.dumps(item, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        self._hash.update(canonical.encode('utf-8'))
+        self._hash.update(b'\n')
+        self.count += 1
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+def csv_fieldnames(existing_fieldnames=None):
+    """Existing CSV header with any missing standard columns appended"""
+    fieldnames = list(existing_fieldnames or [])
+    for column in CSV_COLUMNS:
+        if column not in fieldnames:
+            fieldnames.append(column)
+    return fieldnames
+
+def apply_changes(existing_rows, changed_records):
+    """Update stored records in place from re-fetched ones, keeping their status
+
+    Records that predate the listHash column get their hash filled in on the way.
+    """
+    changed_by_id = {record.id: record for record in changed_records}
+    for record in existing_rows:
+        fetched = changed_by_id.get(record.id)
+        if fetched is None:
+            if not record.list_hash:
+                record.list_hash = record.compute_list_hash()
+            continue
+        record.update_list_fields(fetched)
+    return len(changed_by_id)
+
+def extract_description(detail_data):
+    """Extract the description text from a homework detail response"""
+    if detail_data and isinstance(detail_data, dict):
+        if 'data' in detail_data and isinstance(detail_data['data'], dict):
+            return detail_data['data'].get('description', '')
+        elif 'description' in detail_data:
+            return detail_data['description']
+    return ''
+
+def extract_homework_items(homework_list_data):
+    """Pull the list of homework items out of a getHomeworkList payload (None if unrecognised)"""
+    if isinstance(homework_list_data, dict):
+        if 'data' in homework_list_data:
+            return homework_list_data['data'] or []
+        if 'homework' in homework_list_data or 'homeworks' in homework_list_data:
+            return homework_list_data.get('homework', homework_list_data.get('homeworks', []))
+        return None
+    if isinstance(homework_list_data, list):
+        return homework_list_data
+    return None
+
+async def fetch_detail_item(item, fetch_detail):
+    """HomeworkRecord for a list item with the description from its detail call ('' if it has no ID or the call fails)
+
+    Returns None if the detail call was cut off by the sync deadline, so the item stays pending.
+    """
+    homework_id = item.get('id')
+    description = ''
+    if homework_id:
+        try:
+            detail_data = await fetch_detail(homework_id)
+            description = extract_description(detail_data)
+        except DeadlineReached:
+            return None
+        except Exception as e:
+            print(f"⚠️ Detail fetch failed for homework {homework_id}: {e}")
+    return HomeworkRecord.from_obs(item, description)
+
+@contextlib.contextmanager
+def timed_stage(on_stage, name, **info):
+    """Report a pipeline stage to ``on_stage(name, elapsed=None, **info)`` on entry and with its duration on exit"""
+    if on_stage is None:
+        yield
+        return
+    on_stage(name, **info)
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        on_stage(name, elapsed=time.monotonic() - started)
+
+async def sync_homework_async(client, load_existing, state=None, force=False, deadline=None,
+                              on_progress=None, max_workers=None, on_stage=None, load_index=None):
+    """Run one sync on the event loop: list, plan and details overlapped, then merge
+
+    ``client`` is an AsyncOBSClient. ``load_existing()`` is a blocking callable returning
+    ``(fieldnames, records)`` for the stored CSV as HomeworkRecords; it runs in a worker
+    thread, started only once the CSV is needed: when an item has to be classified
+    without a saved index, when the first new or changed item turns up, or when the
+    list's fingerprint differs from the saved one (straight away for a forced run or
+    a pending checkpoint). An unchanged list therefore never reads the CSV. The list is parsed as it streams in and each new or changed item is
+    queued for a detail worker straight away, so details for the first items are being
+    fetched before the rest of the list has arrived; a list that breaks off mid-stream is
+    opened again (up to LIST_STREAM_RETRIES times) without queueing its items twice.
+    ``load_index()`` optionally returns the IdIndex saved with the CSV (or None); items are then classified against it
+    without waiting for the CSV, which is still loaded and checked against the index
+    before merging. ``state`` is the saved sync state
+    (fingerprint, validators, pending_ids). Returns None if the list could not be
+    fetched, otherwise a dict with:
+
+    - ``unchanged``: list matched the saved fingerprint/validators; nothing else is set
+    - ``list_result``/``fingerprint``: what to save once the result is stored
+    - ``fieldnames``/``rows``: merged HomeworkRecords (edited ones updated in place, new ones appended)
+    - ``new_rows``, ``updated_count``, ``total_items``
+    - ``id_index``: IdIndex of the merged rows, to save next to the CSV
+    - ``complete``/``still_pending``: whether the deadline cut the detail stage short
+
+    ``on_stage`` (see timed_stage) hears about the list, load, details and merge stages;
+    the details stage starts with the list and reports ``items``, the number of details
+    to fetch, once the list is complete.
+    """
+    state = state or {}
+    pending_ids = {parse_id(homework_id) for homework_id in state.get('pending_ids') or []}
+    # A checkpoint left by an interrupted run means there is work to finish even if the list is unchanged
+    use_validators = not force and not pending_ids
+    if max_workers is None:
+        max_workers = DEFAULT_MAX_WORKERS
+
+    list_started = time.monotonic()
+    if on_stage:
+        on_stage('list')
+    stream = await client.open_homework_list(
+        etag=state.get('list_etag') if use_validators else None,
+        last_modified=state.get('list_last_modified') if use_validators else None
+    )
+    if not stream:
+        if on_stage:
+            on_stage('list', elapsed=time.monotonic() - list_started)
+        return None
+
+    list_result = {'etag': stream.etag, 'last_modified': stream.last_modified,
+                   'not_modified': stream.not_modified}
+    if stream.not_modified:
+        if on_stage:
+            on_stage('list', elapsed=time.monotonic() - list_started)
+        return {'list_result': list_result, 'fingerprint': state.get('list_fingerprint'),
+                'unchanged': True}
+
+    async def load():
+        with timed_stage(on_stage, 'load'):
+            return await asyncio.to_thread(load_existing)
+
+    load_task = None
+
+    def start_load():
+        """Start reading the stored CSV once; it overlaps whatever is left of the list download"""
+        nonlocal load_task
+        if load_task is None:
+            load_task = asyncio.ensure_future(load())
+        return load_task
+
+    # Without the unchanged-list shortcut the stored CSV is needed whatever the list holds
+    if not use_validators:
+        start_load()
+
+    # Pending items go first; edited items bypass the detail cache
+    queue = asyncio.PriorityQueue()
+    work_items = []
+    queued_ids = set()
+    changed_ids = set()
+    results = {}
+
+    async def fetch_detail(homework_id):
+        return await client.get_homework_detail(homework_id, refresh=parse_id(homework_id) in changed_ids,
+                                                deadline=deadline)
+
+    async def detail_worker():
+        while True:
+            _, index, item = await queue.get()
+            if item is None:
+                return
+            # Items not reached before the deadline are checkpointed for the next invocation
+            if deadline is not None and time.monotonic() >= deadline:
+                continue
+            record = await fetch_detail_item(item, fetch_detail)
+            if record is None:
+                continue
+            results[index] = record
+            if on_progress:
+                on_progress(len(results), len(work_items), results[index])
+
+    details_started = None
+
+    def enqueue(item, kind):
+        nonlocal details_started
+        homework_id = parse_id(item.get('id'))
+        # A list read again after breaking off repeats the items queued from the first attempt
+        if homework_id in queued_ids:
+            return
+        queued_ids.add(homework_id)
+        if kind == 'changed':
+            changed_ids.add(homework_id)
+        # The list differs from the stored data, so the CSV will be merged into
+        start_load()
+        if details_started is None:
+            details_started = time.monotonic()
+            if on_stage:
+                on_stage('details')
+        queue.put_nowait((0 if homework_id in pending_ids else 1, len(work_items), item))
+        work_items.append(item)
+
+    async def read_saved_index():
+        try:
+            return await asyncio.to_thread(load_index)
+        except Exception as e:
+            print(f"⚠️ Could not read the saved ID index: {e}")
+            return None
+
+    workers = [asyncio.ensure_future(detail_worker()) for _ in range(max(1, max_workers))]
+    fingerprint = ListFingerprint()
+    id_index = None
+    # Items a saved index called unchanged; re-checked if the index turns out to be stale
+    unchecked = [] if load_index else None
+
+    try:
+        reopened = 0
+        while True:
+            try:
+                async for item in stream:
+                    fingerprint.add(item)
+                    if id_index is None:
+                        if load_index:
+                            id_index = await read_saved_index()
+                        if id_index is None:
+                            unchecked = None
+                            fieldnames, existing_rows = await start_load()
+                            id_index = IdIndex.from_records(existing_rows)
+
+                    kind = id_index.classify(item)
+                    if kind is not None:
+                        enqueue(item, kind)
+                    elif unchecked is not None:
+                        unchecked.append(item)
+                break
+            except ListStreamError as e:
+                if reopened >= LIST_STREAM_RETRIES:
+                    print(f"❌ {e}; giving up after {reopened + 1} attempts")
+                    return None
+                delay = backoff_delay(reopened)
+                reopened += 1
+                print(f"⚠️ {e}; reading the list again in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+                # Details already queued keep going; the fingerprint starts over with the new body
+                stream = await client.open_homework_list()
+                if not stream:
+                    return None
+                list_result = {'etag': stream.etag, 'last_modified': stream.last_modified,
+                               'not_modified': False}
+                fingerprint = ListFingerprint()
+                if unchecked is not None:
+                    unchecked = []
+
+        if on_stage:
+            on_stage('list', elapsed=time.monotonic() - list_started)
+
+        if stream.envelope is not None:
+            if extract_homework_items(stream.envelope) is None:
+                print("⚠️ Unexpected data format from homework list API")
+                print(json.dumps(stream.envelope, indent=2, ensure_ascii=False))
+                return None
+
+        outcome = {'list_result': list_result, 'fingerprint': fingerprint.hexdigest(), 'unchanged': False}
+        if use_validators and outcome['fingerprint'] == state.get('list_fingerprint'):
+            outcome['unchanged'] = True
+            return outcome
+
+        fieldnames, existing_rows = await start_load()
+        stored_index = id_index if unchecked is None and id_index is not None else IdIndex.from_records(existing_rows)
+        if unchecked and stored_index != id_index:
+            print("⚠️ Saved ID index is out of date, re-checking the list against the CSV")
+            for item in unchecked:
+                kind = stored_index.classify(item)
+                if kind is not None:
+                    enqueue(item, kind)
+
+        if details_started is None:
+            details_started = time.monotonic()
+            if on_stage:
+                on_stage('details')
+        if on_stage and work_items:
+            on_stage('details', items=len(work_items))
+
+        # Tell the workers the list is complete (sentinels sort after every real item)
+        for _ in workers:
+            queue.put_nowait((2, len(work_items), None))
+        await asyncio.gather(*workers)
+        if on_stage:
+            on_stage('details', elapsed=time.monotonic() - details_started)
+    finally:
+        if stream:
+            stream.close()
+        for task in workers:
+            task.cancel()
+        if load_task is not None:
+            if load_task.done() and not load_task.cancelled():
+                load_task.exception()  # Already raised above if it mattered
+            else:
+                load_task.cancel()
+
+    still_pending = [str(item.get('id')) for index, item in enumerate(work_items) if index not in results]
+
+    # Sort fetched records out against the stored rows (a stale saved index may have queued some needlessly)
+    new_rows = []
+    fetched_changed = []
+    for index in sorted(results):
+        record = results[index]
+        stored_hash = stored_index.list_hash(record.id)
+        if stored_hash is None:
+            new_rows.append(record)
+        elif stored_hash != record.list_hash:
+            fetched_changed.append(record)
+
+    with timed_stage(on_stage, 'merge'):
+        # Sort new records by due date (descending)
+        sort_by_due_date(new_rows)
+
+        # Update edited records in place, then add new ones
+        updated_count = apply_changes(existing_rows, fetched_changed)
+
+    all_rows = existing_rows + new_rows
+    outcome.update(
+        existing_fieldnames=fieldnames,
+        fieldnames=csv_fieldnames(fieldnames),
+        rows=all_rows,
+        id_index=IdIndex.from_records(all_rows),
+        new_rows=new_rows,
+        updated_count=updated_count,
+        total_items=fingerprint.count,
+        still_pending=still_pending,
+        complete=not still_pending
+    )
+    return outcome
+
+async def _sync_with_client(session_manager, load_existing, **kwargs):
+    """Open an AsyncOBSClient for one SessionManager and run a sync through it"""
+    # Imported here so the pure helpers above stay usable without aiohttp
+    from obs_client import AsyncOBSClient
+
+    async with AsyncOBSClient(session_manager) as client:
+        outcome = await sync_homework_async(client, load_existing, **kwargs)
+        if outcome is not None:
+            outcome['connections'] = client.get_connection_stats()
+        return outcome
+
+def sync_homework(session_manager, load_existing, **kwargs):
+    """Blocking wrapper around sync_homework_async for the Flask endpoints and the CLI"""
+    return asyncio.run(_sync_with_client(session_manager, load_existing, **kwargs))
+
+def sync_accounts(pool, accounts, load_existing, save_outcome, states=None, load_index=None, **kwargs):
+    """Sync several student accounts concurrently on one event loop
+
+    ``pool`` is a SessionPool supplying each account's SessionManager (leased for its sync).
+    ``load_existing(account)`` and ``save_outcome(account, outcome)`` are blocking
+    callables run in worker threads; each account's result is saved as soon as its
+    own sync finishes, so the total time is about that of the slowest account.
+    ``states`` maps account names to saved sync states and ``load_index(account)``
+    optionally returns an account's saved IdIndex. Returns a dict mapping each
+    account name to what ``save_outcome`` returned, or ``{'success': False, 'error': ...}``
+    if that account failed. Other keyword arguments go to sync_homework_async.
+    """
+    states = states or {}
+
+    async def run_account(account):
+        name = account['name']
+        try:
+            # Leased so a batch larger than the pool cannot evict a manager mid-sync
+            with pool.lease(account) as manager:
+                outcome = await _sync_with_client(
+                    manager,
+                    lambda: load_existing(account),
+                    state=states.get(name),
+                    load_index=(lambda: load_index(account)) if load_index else None,
+                    **kwargs
+                )
+            return name, await asyncio.to_thread(save_outcome, account, outcome)
+        except Exception as e:
+            print(f"❌ Sync failed for {name}: {e}")
+            return name, {'success': False, 'error': str(e)}
+
+    async def run():
+        return dict(await asyncio.gather(*(run_account(account) for account in accounts)))
+
+    return asyncio.run(run())
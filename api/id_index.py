@@ -0,0 +1,167 @@
+"""
+ID Index
+Compact sorted index of stored homework IDs and list hashes, persisted next to the CSV
+"""
+
+import base64
+import json
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+from homework_record import obs_list_hash, parse_id
+
+INDEX_MAGIC = b'HWIDX1'
+_HEADER = struct.Struct('<6sII')
+
+def index_path_for(csv_path):
+    """Where the ID index of a local CSV file is kept"""
+    return f"{csv_path}.idx"
+
+class IdIndex:
+    """Sorted homework IDs with the list hash stored for each
+
+    Integer IDs live in an ``array('q')`` with a parallel ``array('Q')`` of 64-bit
+    list hashes, 16 bytes per homework instead of a str object, a set slot and a
+    row dict. Lookups are a binary search. The rare ID that is not an integer is
+    kept in a small dict.
+    """
+
+    def __init__(self, ids=None, hashes=None, others=None):
+        self.ids = ids if ids is not None else array('q')
+        self.hashes = hashes if hashes is not None else array('Q')
+        self.others = others or {}
+
+    @classmethod
+    def from_records(cls, records):
+        """Build the index of a list of HomeworkRecords"""
+        pairs = []
+        others = {}
+        for record in records:
+            homework_id = record.id
+            if homework_id is None:
+                continue
+            list_hash = record.current_list_hash()
+            if len(list_hash) != 16:
+                list_hash = record.compute_list_hash()
+            if isinstance(homework_id, int):
+                try:
+                    pairs.append((homework_id, int(list_hash, 16)))
+                except ValueError:
+                    # A hand-edited listHash; the row's own fields give the real one
+                    pairs.append((homework_id, int(record.compute_list_hash(), 16)))
+            else:
+                others.setdefault(homework_id, list_hash)
+        pairs.sort()
+        return cls(array('q', (pair[0] for pair in pairs)), array('Q', (pair[1] for pair in pairs)), others)
+
+    def __len__(self):
+        return len(self.ids) + len(self.others)
+
+    def __eq__(self, other):
+        if not isinstance(other, IdIndex):
+            return NotImplemented
+        return self.ids == other.ids and self.hashes == other.hashes and self.others == other.others
+
+    __hash__ = None
+
+    def _position(self, homework_id):
+        ids = self.ids
+        position = bisect_left(ids, homework_id)
+        if position < len(ids) and ids[position] == homework_id:
+            return position
+        return -1
+
+    def __contains__(self, homework_id):
+        homework_id = parse_id(homework_id)
+        if isinstance(homework_id, int):
+            return self._position(homework_id) >= 0
+        return homework_id in self.others
+
+    def list_hash(self, homework_id):
+        """Stored list hash of an ID, or None if the ID is not in the index"""
+        homework_id = parse_id(homework_id)
+        if not isinstance(homework_id, int):
+            return self.others.get(homework_id)
+        position = self._position(homework_id)
+        if position < 0:
+            return None
+        return f"{self.hashes[position]:016x}"
+
+    def classify(self, item):
+        """'new', 'changed' or None (unchanged or without an ID) for one getHomeworkList item"""
+        homework_id = parse_id(item.get('id'))
+        if homework_id is None:
+            return None
+        stored_hash = self.list_hash(homework_id)
+        if stored_hash is None:
+            return 'new'
+        if stored_hash != obs_list_hash(item):
+            return 'changed'
+        return None
+
+    # --- Persistence ---
+
+    def to_bytes(self):
+        """Binary form: magic, counts, a small JSON header, then the raw little-endian arrays"""
+        ids, hashes = self.ids, self.hashes
+        if sys.byteorder != 'little':
+            ids, hashes = array('q', ids), array('Q', hashes)
+            ids.byteswap()
+            hashes.byteswap()
+        header = json.dumps({'others': self.others}, ensure_ascii=False).encode('utf-8')
+        return _HEADER.pack(INDEX_MAGIC, len(ids), len(header)) + header + ids.tobytes() + hashes.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Parse to_bytes() output; returns None if it is not a readable index"""
+        try:
+            magic, count, header_size = _HEADER.unpack_from(data)
+            if magic != INDEX_MAGIC:
+                return None
+            offset = _HEADER.size
+            header = json.loads(bytes(data[offset:offset + header_size]).decode('utf-8'))
+            offset += header_size
+            ids, hashes = array('q'), array('Q')
+            ids.frombytes(data[offset:offset + count * ids.itemsize])
+            offset += count * ids.itemsize
+            hashes.frombytes(data[offset:offset + count * hashes.itemsize])
+        except (struct.error, ValueError):
+            return None
+        if len(ids) != count or len(hashes) != count:
+            return None
+        if sys.byteorder != 'little':
+            ids.byteswap()
+            hashes.byteswap()
+        return cls(ids, hashes, header.get('others'))
+
+    def to_text(self):
+        """to_bytes() as base64 text, for JSON state stores"""
+        return base64.b64encode(self.to_bytes()).decode('ascii')
+
+    @classmethod
+    def from_text(cls, text):
+        if not text:
+            return None
+        try:
+            return cls.from_bytes(base64.b64decode(text))
+        except ValueError:
+            return None
+
+    def save(self, path):
+        """Atomically write the index to a file"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self.to_bytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read an index file; None if it is missing or unreadable"""
+        try:
+            with open(path, 'rb') as f:
+                return cls.from_bytes(f.read())
+        except OSError:
+            return None
@@ -0,0 +1,171 @@
+"""
+Job Store
+Status and progress records for fetches running in the background
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from session_store import shared_kv
+
+JOB_KEY_PREFIX = "homework:job"
+DEFAULT_JOB_DIR = os.path.join(tempfile.gettempdir(), "homework_jobs")
+
+# Finished jobs are kept this long for late status polls
+JOB_TTL_SECONDS = int(os.environ.get('JOB_TTL_HOURS', '24')) * 3600
+
+# Minimum gap between progress writes while details are being fetched
+PROGRESS_WRITE_INTERVAL = 0.5
+
+class FileJobStore:
+    """Job records kept as JSON files in a local directory"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def load(self, job_id):
+        """Return a job record or None"""
+        # Job IDs come from the query string; never let them escape the directory
+        if not job_id or not job_id.isalnum():
+            return None
+        try:
+            with open(self._path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save(self, job):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(job['id'])
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+    def prune(self):
+        """Delete records of jobs created more than JOB_TTL_SECONDS ago"""
+        cutoff = time.time() - JOB_TTL_SECONDS
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+class KeyValueJobStore:
+    """Job records kept in a key/value client with get/set, expiring after JOB_TTL_SECONDS"""
+
+    def __init__(self, client=None):
+        self.client = client if client is not None else shared_kv
+
+    def load(self, job_id):
+        raw = self.client.get(f"{JOB_KEY_PREFIX}:{job_id}")
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def save(self, job):
+        self.client.set(f"{JOB_KEY_PREFIX}:{job['id']}", json.dumps(job), ex=JOB_TTL_SECONDS)
+
+    def prune(self):
+        pass
+
+def build_job_store():
+    """Build the job store selected by JOB_STORE ('file' or 'kv')"""
+    if os.environ.get('JOB_STORE', 'file').lower() == 'kv':
+        return KeyValueJobStore()
+    return FileJobStore(os.environ.get('JOB_STORE_DIR', DEFAULT_JOB_DIR))
+
+class JobTracker:
+    """Records one background fetch's status, detail progress and per-stage timing
+
+    ``on_stage`` and ``on_progress`` plug straight into sync_homework_async; the
+    record is written to the store on every stage change and at most every
+    PROGRESS_WRITE_INTERVAL seconds while details come in.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+        self.job = {
+            'id': uuid.uuid4().hex,
+            'status': 'queued',
+            'stage': None,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'progress': {'planned': 0, 'fetched': 0, 'pending': 0},
+            'stages': {},
+            'result': None,
+            'http_status': None
+        }
+        self._save()
+
+    @property
+    def job_id(self):
+        return self.job['id']
+
+    def _save(self):
+        self._last_write = time.monotonic()
+        try:
+            self.store.save(self.job)
+        except Exception as e:
+            print(f"⚠️ Could not save job {self.job['id']}: {e}")
+
+    def start(self):
+        with self._lock:
+            self.job['status'] = 'running'
+            self.job['started_at'] = time.time()
+            self._save()
+
+    def on_stage(self, name, elapsed=None, items=None):
+        """A stage started (``elapsed`` None) or finished after ``elapsed`` seconds
+
+        Concurrent accounts add up into the same stage totals.
+        """
+        with self._lock:
+            if elapsed is None:
+                self.job['stage'] = name
+                if items:
+                    progress = self.job['progress']
+                    progress['planned'] += items
+                    progress['pending'] = progress['planned'] - progress['fetched']
+            else:
+                stages = self.job['stages']
+                stages[name] = round(stages.get(name, 0) + elapsed, 3)
+            self._save()
+
+    def on_progress(self, done, total, item):
+        with self._lock:
+            progress = self.job['progress']
+            progress['fetched'] += 1
+            progress['pending'] = max(0, progress['planned'] - progress['fetched'])
+            if time.monotonic() - self._last_write >= PROGRESS_WRITE_INTERVAL:
+                self._save()
+
+    def finish(self, result, http_status):
+        with self._lock:
+            self.job['status'] = 'done' if http_status < 400 else 'failed'
+            self.job['stage'] = None
+            self.job['finished_at'] = time.time()
+            self.job['result'] = result
+            self.job['http_status'] = http_status
+            if result.get('pending_items') is not None:
+                self.job['progress']['pending'] = result['pending_items']
+            self._save()
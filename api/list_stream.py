@@ -0,0 +1,241 @@
+"""
+List Stream
+Incremental parser that yields getHomeworkList items while the response body is still arriving
+"""
+
+import codecs
+import json
+import re
+
+# Top-level keys that hold the homework array (same as extract_homework_items)
+LIST_KEYS = ('data', 'homework', 'homeworks')
+
+# Bodies without a homework array are kept up to this size to inspect them as an envelope
+ENVELOPE_LIMIT = 64 * 1024
+
+_STRUCTURAL = re.compile(r'["\[\]{},:]')
+_STRING_END = re.compile(r'["\\]')
+
+class ListStreamError(Exception):
+    """The list body broke off or turned out corrupt while it was being read"""
+
+class ListItemParser:
+    """Pulls the elements of the homework array out of a JSON body fed in chunks
+
+    The body may be a bare array or an object holding the array under one of
+    LIST_KEYS. Each element is parsed on its own as soon as its closing bracket
+    arrives, so memory stays bounded by one element plus one chunk. Everything
+    outside the array is skipped, except that the start of the body is kept
+    (up to ENVELOPE_LIMIT) for error envelopes and login pages.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.buffer = ''
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.string_start = None
+        self.last_string = None
+        self.root = None
+        self.current_key = None
+        self.array_depth = None
+        self.array_done = False
+        self.item_start = None
+        self.head = ''
+        self.head_truncated = False
+
+    @property
+    def found_array(self):
+        return self.array_depth is not None
+
+    def feed(self, chunk):
+        """Feed raw bytes (or text); returns the items completed by this chunk"""
+        text = self._decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        return self._feed_text(text)
+
+    def close(self):
+        """Flush the decoder; returns any items completed by the final bytes"""
+        return self._feed_text(self._decoder.decode(b'', final=True))
+
+    def _feed_text(self, text):
+        if not text:
+            return []
+        if len(self.head) < ENVELOPE_LIMIT:
+            self.head += text[:ENVELOPE_LIMIT - len(self.head)]
+        else:
+            self.head_truncated = True
+        self.buffer += text
+        items = self._scan()
+        self._trim()
+        return items
+
+    def _scan(self):
+        items = []
+        buf = self.buffer
+        n = len(buf)
+        pos = self.pos
+
+        while pos < n:
+            if self.in_string:
+                match = _STRING_END.search(buf, pos)
+                if not match:
+                    pos = n
+                    break
+                if match.group() == '\\':
+                    if match.end() >= n:
+                        # Escape split across chunks - wait for the escaped character
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                self.in_string = False
+                pos = match.end()
+                if self.depth == 1 and self.root == '{':
+                    self.last_string = buf[self.string_start:pos]
+                self.string_start = None
+                continue
+
+            if self.root is None:
+                stripped = buf[pos:].lstrip()
+                if not stripped:
+                    pos = n
+                    break
+                self.root = stripped[0]
+            if self.root not in '[{':
+                # Not JSON (e.g. an HTML login page) - nothing to scan
+                pos = n
+                break
+
+            match = _STRUCTURAL.search(buf, pos)
+            if not match:
+                pos = n
+                break
+            char = match.group()
+            pos = match.end()
+
+            if char == '"':
+                self.in_string = True
+                self.string_start = match.start()
+            elif char in '[{':
+                self.depth += 1
+                if self.array_depth is None and not self.array_done and char == '[':
+                    if self.depth == 1 or (self.depth == 2 and self.root == '{' and
+                                           self.current_key in LIST_KEYS):
+                        self.array_depth = self.depth
+                        self.item_start = pos
+            elif char in ']}':
+                if self.array_depth is not None and self.depth == self.array_depth and char == ']':
+                    items.extend(self._finish_item(buf, match.start()))
+                    self.array_depth = None
+                    self.array_done = True
+                    self.item_start = None
+                self.depth -= 1
+            elif char == ',':
+                if self.array_depth is not None and self.depth == self.array_depth:
+                    items.extend(self._finish_item(buf, match.start()))
+                    self.item_start = pos
+                elif self.depth == 1:
+                    self.current_key = None
+            elif char == ':' and self.depth == 1 and self.root == '{' and self.last_string:
+                try:
+                    self.current_key = json.loads(self.last_string)
+                except ValueError:
+                    self.current_key = None
+
+        self.pos = pos
+        return items
+
+    def _finish_item(self, buf, end):
+        text = buf[self.item_start:end].strip()
+        if not text:
+            return []
+        return [json.loads(text)]
+
+    def _trim(self):
+        """Drop consumed text, keeping the item or key currently being read"""
+        keep = self.pos
+        if self.item_start is not None:
+            keep = min(keep, self.item_start)
+        if self.string_start is not None:
+            keep = min(keep, self.string_start)
+        if keep:
+            self.buffer = self.buffer[keep:]
+            self.pos -= keep
+            if self.item_start is not None:
+                self.item_start -= keep
+            if self.string_start is not None:
+                self.string_start -= keep
+
+    def envelope(self):
+        """The whole body parsed as JSON when it had no homework array and was small enough, else None"""
+        if self.found_array or self.array_done or self.head_truncated:
+            return None
+        try:
+            return json.loads(self.head)
+        except ValueError:
+            return None
+
+class HomeworkListStream:
+    """getHomeworkList result whose items can be iterated while they download
+
+    ``not_modified`` is True for a 304 (no items). After iteration, ``envelope`` holds
+    the parsed body if it had no homework array (an error or an unexpected format).
+    Iteration raises ListStreamError if the download breaks off or the body is corrupt or cut short.
+    """
+
+    def __init__(self, response=None, parser=None, items=None, etag=None, last_modified=None,
+                 not_modified=False, chunk_size=64 * 1024):
+        self.response = response
+        self.parser = parser
+        self._ready = list(items or [])
+        self.etag = etag
+        self.last_modified = last_modified
+        self.not_modified = not_modified
+        self.chunk_size = chunk_size
+        self.envelope = None
+
+    @classmethod
+    def from_data(cls, data, etag=None, last_modified=None):
+        """Stream over an already parsed list payload (e.g. the list kept during session validation)"""
+        from homework_sync import extract_homework_items
+        items = extract_homework_items(data)
+        stream = cls(items=items or [], etag=etag, last_modified=last_modified)
+        if items is None:
+            stream.envelope = data
+        return stream
+
+    async def __aiter__(self):
+        try:
+            ready, self._ready = self._ready, []
+            for item in ready:
+                yield item
+            if self.response is None:
+                return
+            chunks = self.response.content.iter_chunked(self.chunk_size)
+            while True:
+                # Only the download and parsing are guarded, not the caller's work between items
+                try:
+                    items = self.parser.feed(await chunks.__anext__())
+                except StopAsyncIteration:
+                    break
+                except Exception as e:
+                    raise ListStreamError(f"Homework list download failed: {e}") from e
+                for item in items:
+                    yield item
+            try:
+                items = self.parser.close()
+            except ValueError as e:
+                raise ListStreamError(f"Homework list is corrupt: {e}") from e
+            if self.parser.found_array:
+                raise ListStreamError("Homework list ended before the homework array was complete")
+            for item in items:
+                yield item
+            self.envelope = self.parser.envelope()
+        finally:
+            self.close()
+
+    def close(self):
+        if self.response is not None:
+            self.response.release()
+            self.response = None
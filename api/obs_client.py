@@ -0,0 +1,460 @@
+"""
+Async OBS Client
+asyncio client for the homework endpoints of the school portal
+"""
+
+import asyncio
+import json
+import os
+import time
+
+import aiohttp
+
+from list_stream import ENVELOPE_LIMIT, HomeworkListStream, ListItemParser
+from rate_limit import (
+    DeadlineReached, LatencyTracker, backoff_delay, is_overload_status, parse_retry_after
+)
+from session_manager import (
+    API_HEADERS, HOMEWORK_DETAIL_URL, HOMEWORK_LIST_URL, is_logged_out_response
+)
+
+# Hedged detail requests (opt-in): once a detail call runs past this percentile of recent
+# detail latencies a duplicate is sent, within a budget of extra requests
+HEDGE_DETAILS = os.environ.get('OBS_HEDGE', 'off').lower() in ('on', '1', 'true')
+HEDGE_PERCENTILE = float(os.environ.get('OBS_HEDGE_PERCENTILE', '95'))
+HEDGE_MIN_DELAY = float(os.environ.get('OBS_HEDGE_MIN_DELAY', '0.5'))
+HEDGE_BUDGET = float(os.environ.get('OBS_HEDGE_BUDGET', '0.1'))
+
+# Recent getHomeworkDetail latencies, kept across clients so warm invocations start with an estimate
+detail_latency = LatencyTracker()
+
+class AsyncOBSClient:
+    """Non-blocking getHomeworkList/getHomeworkDetail calls on top of a SessionManager
+
+    The SessionManager stays the single owner of session state (stored session,
+    refresh-ahead, hedged acquisition, detail cache). When a new session is needed
+    its acquisition runs in a worker thread; every list and detail call is native
+    asyncio over one keep-alive connector.
+
+    Use as ``async with AsyncOBSClient(session_manager) as client: ...``.
+    """
+
+    def __init__(self, session_manager, pool_size=None, per_host_limit=None, timeout=30, hedge=None):
+        self.session_manager = session_manager
+        self.hedge = HEDGE_DETAILS if hedge is None else hedge
+        if pool_size is None:
+            pool_size = int(os.environ.get('HOMEWORK_HTTP_POOL_SIZE', '10'))
+        if per_host_limit is None:
+            per_host_limit = int(os.environ.get('HOMEWORK_FETCH_PER_HOST', '4'))
+        self.pool_size = pool_size
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.http = None
+        self._acquire_lock = None
+        self._stats = {'requests': 0, 'connections_opened': 0, 'connections_reused': 0}
+        self._detail_calls = 0
+        self._hedge_stats = {'hedges': 0, 'hedge_wins': 0}
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.per_host_limit)
+        # Cookies are sent explicitly per request, so the client keeps no jar of its own
+        self.http = aiohttp.ClientSession(
+            connector=connector,
+            cookie_jar=aiohttp.DummyCookieJar(),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            trace_configs=[self._trace_config()]
+        )
+        self._acquire_lock = asyncio.Lock()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self.http is not None:
+            await self.http.close()
+            self.http = None
+
+    def _trace_config(self):
+        """Count requests and whether each one opened or reused a connection"""
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            self._stats['requests'] += 1
+
+        async def on_connection_create_end(session, context, params):
+            self._stats['connections_opened'] += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            self._stats['connections_reused'] += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    def get_connection_stats(self):
+        """Requests made by this client, how many reused a pooled connection and the limiter window"""
+        stats = {**self._stats, **self.session_manager.limiter.get_stats()}
+        if self.hedge:
+            stats.update(self._hedge_stats)
+        return stats
+
+    def _cookie_header(self, session_id):
+        """Portal cookies from the shared jar plus the pinned PHPSESSID"""
+        cookies = [
+            f"{cookie.name}={cookie.value}"
+            for cookie in self.session_manager.http.cookies
+            if cookie.name != 'PHPSESSID'
+        ]
+        cookies.append(f"PHPSESSID={session_id}")
+        return "; ".join(cookies)
+
+    async def get_valid_session(self, want_list=False):
+        """Get a valid session ID without blocking the event loop"""
+        manager = self.session_manager
+
+        # Fast path: current session is usable (refresh-ahead renews on its own thread)
+        if manager.has_valid_session() or (manager.refresh_ahead and manager.current_session):
+            return manager.get_valid_session(want_list)
+
+        # Only one coroutine acquires; the rest wait and reuse its result
+        async with self._acquire_lock:
+            if manager.has_valid_session():
+                return manager.current_session
+            return await asyncio.to_thread(manager.get_valid_session, want_list)
+
+    @staticmethod
+    def _check_deadline(deadline):
+        if deadline is not None and time.monotonic() >= deadline:
+            raise DeadlineReached()
+
+    def _timeout_options(self, deadline):
+        """Request options capping the timeout at the time left before ``deadline``"""
+        if deadline is None:
+            return {}
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineReached()
+        return {'timeout': aiohttp.ClientTimeout(total=min(self.timeout, remaining))}
+
+    async def _backoff(self, delay, deadline):
+        """Sleep before a retry, unless the retry could not start before ``deadline``"""
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            raise DeadlineReached()
+        await asyncio.sleep(delay)
+
+    async def request(self, url, headers=None, max_retries=2, latency_tracker=None, deadline=None):
+        """Make a portal API call with automatic session refresh on failure
+
+        Returns ``(status, data, headers)`` with the parsed JSON body (None on a 304),
+        or None if the request kept failing. Only auth signals (401/403, a session error
+        or the login page) drop the session and retry; 429s, 5xxs, timeouts and garbled
+        bodies back off and shrink the shared limiter's window instead. Dropping or
+        confirming the session touches the encrypted session store, so it runs off the loop.
+        Successful response times are recorded in ``latency_tracker`` if given.
+
+        With a ``deadline`` (a time.monotonic() value) each attempt's timeout is capped
+        at the time left, no retry is started or slept towards past it, and
+        DeadlineReached is raised once the deadline cuts the request off.
+        """
+        manager = self.session_manager
+        limiter = manager.limiter
+        final_headers = {**API_HEADERS, **(headers or {})}
+
+        for attempt in range(max_retries + 1):
+            self._check_deadline(deadline)
+            session_id = await self.get_valid_session()
+            if not session_id:
+                return None
+
+            request_headers = {**final_headers, 'Cookie': self._cookie_header(session_id)}
+            await limiter.acquire_async()
+            held = True
+            try:
+                options = self._timeout_options(deadline)
+                started = time.monotonic()
+                try:
+                    async with self.http.get(url, headers=request_headers, **options) as response:
+                        status = response.status
+                        response_headers = response.headers
+                        text = await response.text() if status != 304 else ''
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    held = False
+                    limiter.release(overloaded=True)
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise DeadlineReached() from e
+                    if attempt < max_retries:
+                        delay = backoff_delay(attempt)
+                        print(f"⚠️ Request failed (attempt {attempt + 1}), retrying in {delay:.1f}s: {e}")
+                        await self._backoff(delay, deadline)
+                        continue
+                    print(f"❌ Request failed after {max_retries + 1} attempts: {e}")
+                    return None
+
+                latency = time.monotonic() - started
+                overloaded = is_overload_status(status)
+                held = False
+                limiter.release(latency, overloaded=overloaded)
+            finally:
+                if held:
+                    # Cancelled (a losing hedge), past the deadline or failed while decoding:
+                    # free the slot without counting it as a response
+                    limiter.abandon()
+
+            # Portal is overloaded - back off, the session is fine
+            if overloaded:
+                if attempt < max_retries:
+                    delay = backoff_delay(attempt, parse_retry_after(response_headers.get('Retry-After')))
+                    print(f"⏳ Portal busy (HTTP {status}), retrying in {delay:.1f}s...")
+                    await self._backoff(delay, deadline)
+                    continue
+                print(f"❌ Portal still busy (HTTP {status}) after {max_retries + 1} attempts")
+                return None
+
+            # Check for session-related errors
+            if status in (401, 403):
+                print(f"🔒 Session invalid (HTTP {status}), attempting refresh...")
+                await asyncio.to_thread(manager.invalidate_session, session_id)  # Force refresh
+                continue
+
+            # Conditional request and nothing changed - there is no body to check
+            if status == 304:
+                await asyncio.to_thread(manager.mark_validated, session_id)
+                return status, None, response_headers
+
+            # Check response content for session errors (including a silent redirect to the login page)
+            if is_logged_out_response(text):
+                print("🔒 Session expired based on response content, attempting refresh...")
+                await asyncio.to_thread(manager.invalidate_session, session_id)  # Force refresh
+                continue
+
+            # Check if response is valid JSON (expected for API calls)
+            try:
+                data = json.loads(text)
+            except ValueError:
+                if attempt < max_retries:
+                    delay = backoff_delay(attempt)
+                    print(f"⚠️ Invalid JSON response, retrying in {delay:.1f}s...")
+                    await self._backoff(delay, deadline)
+                    continue
+                print("❌ Invalid JSON response after retries")
+                return None
+
+            if status >= 400:
+                print(f"❌ Request failed with HTTP {status}")
+                return None
+
+            await asyncio.to_thread(manager.mark_validated, session_id)
+            if latency_tracker is not None:
+                latency_tracker.record(latency)
+            return status, data, response_headers
+
+        return None
+
+    async def open_homework_list(self, etag=None, last_modified=None, max_retries=2):
+        """Start downloading the homework list and return a HomeworkListStream (None on failure)
+
+        Only the start of the body is read here, enough to tell a login page or an error
+        envelope from the homework array; the items are parsed as they arrive while the
+        caller iterates the stream. Retry and limiter handling match request().
+        """
+        manager = self.session_manager
+        limiter = manager.limiter
+        session_id = await self.get_valid_session(want_list=True)
+        if not session_id:
+            return None
+
+        validated_list = manager.take_validated_list(session_id)
+        if validated_list is not None:
+            print("♻️ Reusing homework list downloaded during session validation")
+            return HomeworkListStream.from_data(
+                validated_list['data'], validated_list['etag'], validated_list['last_modified']
+            )
+
+        headers = dict(API_HEADERS)
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        for attempt in range(max_retries + 1):
+            session_id = await self.get_valid_session(want_list=False)
+            if not session_id:
+                return None
+
+            request_headers = {**headers, 'Cookie': self._cookie_header(session_id)}
+            await limiter.acquire_async()
+            held = True
+            try:
+                started = time.monotonic()
+                try:
+                    response = await self.http.get(HOMEWORK_LIST_URL, headers=request_headers)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    held = False
+                    limiter.release(overloaded=True)
+                    if attempt < max_retries:
+                        delay = backoff_delay(attempt)
+                        print(f"⚠️ List request failed (attempt {attempt + 1}), retrying in {delay:.1f}s: {e}")
+                        await asyncio.sleep(delay)
+                        continue
+                    print(f"❌ List request failed after {max_retries + 1} attempts: {e}")
+                    return None
+
+                status = response.status
+                overloaded = is_overload_status(status)
+                held = False
+                limiter.release(time.monotonic() - started, overloaded=overloaded)
+            finally:
+                if held:
+                    # Cancelled or failed some other way: free the slot without counting it as a response
+                    limiter.abandon()
+
+            if overloaded:
+                response.release()
+                if attempt < max_retries:
+                    delay = backoff_delay(attempt, parse_retry_after(response.headers.get('Retry-After')))
+                    print(f"⏳ Portal busy (HTTP {status}), retrying in {delay:.1f}s...")
+                    await asyncio.sleep(delay)
+                    continue
+                print(f"❌ Portal still busy (HTTP {status}) after {max_retries + 1} attempts")
+                return None
+
+            if status in (401, 403):
+                response.release()
+                print(f"🔒 Session invalid (HTTP {status}), attempting refresh...")
+                await asyncio.to_thread(manager.invalidate_session, session_id)  # Force refresh
+                continue
+
+            new_etag = response.headers.get('ETag') or etag
+            new_last_modified = response.headers.get('Last-Modified') or last_modified
+            if status == 304:
+                response.release()
+                await asyncio.to_thread(manager.mark_validated, session_id)
+                return HomeworkListStream(etag=new_etag, last_modified=new_last_modified, not_modified=True)
+
+            if status >= 400:
+                response.release()
+                print(f"❌ List request failed with HTTP {status}")
+                return None
+
+            # Read until the homework array starts (or the body ends) to check what came back
+            parser = ListItemParser()
+            ready = []
+            try:
+                while not parser.found_array and not parser.array_done:
+                    chunk = await response.content.read(64 * 1024)
+                    if not chunk:
+                        ready.extend(parser.close())
+                        break
+                    ready.extend(parser.feed(chunk))
+                    if parser.root is not None and parser.root not in '[{':
+                        break
+                    if len(parser.head) >= ENVELOPE_LIMIT:
+                        break
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                response.release()
+                if attempt < max_retries:
+                    delay = backoff_delay(attempt)
+                    print(f"⚠️ List download failed, retrying in {delay:.1f}s: {e}")
+                    await asyncio.sleep(delay)
+                    continue
+                print(f"❌ List download failed after {max_retries + 1} attempts: {e}")
+                return None
+
+            if parser.found_array or parser.array_done:
+                await asyncio.to_thread(manager.mark_validated, session_id)
+                return HomeworkListStream(response, parser, items=ready, etag=new_etag,
+                                          last_modified=new_last_modified)
+
+            # No homework array: a login page, an error envelope or garbage
+            response.release()
+            if is_logged_out_response(parser.head):
+                print("🔒 Session expired based on response content, attempting refresh...")
+                await asyncio.to_thread(manager.invalidate_session, session_id)  # Force refresh
+                continue
+
+            envelope = parser.envelope()
+            if envelope is None:
+                if attempt < max_retries:
+                    delay = backoff_delay(attempt)
+                    print(f"⚠️ Invalid JSON response, retrying in {delay:.1f}s...")
+                    await asyncio.sleep(delay)
+                    continue
+                print("❌ Invalid JSON response after retries")
+                return None
+
+            await asyncio.to_thread(manager.mark_validated, session_id)
+            stream = HomeworkListStream(etag=new_etag, last_modified=new_last_modified)
+            stream.envelope = envelope
+            return stream
+
+        return None
+
+    async def get_homework_detail(self, homework_id, refresh=False, deadline=None):
+        """Get homework detail, from the detail cache when a fresh entry exists unless ``refresh`` is set
+
+        With a ``deadline`` the call raises DeadlineReached if it is cut off (see request()).
+        """
+        manager = self.session_manager
+        # The detail cache lives on disk, so it is read and written off the event loop
+        if manager.detail_cache and not refresh:
+            cached = await asyncio.to_thread(manager.cached_detail, homework_id)
+            if cached is not None:
+                return cached
+
+        url = HOMEWORK_DETAIL_URL.format(homework_id=homework_id)
+        if self.hedge:
+            result = await self._hedged_request(url, deadline)
+        else:
+            result = await self.request(url, latency_tracker=detail_latency, deadline=deadline)
+        if not result:
+            return None
+
+        _, detail_data, _ = result
+        if manager.detail_cache:
+            await asyncio.to_thread(manager.cache_detail, homework_id, detail_data)
+        return detail_data
+
+    def _take_hedge_budget(self):
+        """Allow a hedge only while hedges stay within HEDGE_BUDGET of detail calls"""
+        allowed = max(1, int(self._detail_calls * HEDGE_BUDGET))
+        if self._hedge_stats['hedges'] >= allowed:
+            return False
+        self._hedge_stats['hedges'] += 1
+        return True
+
+    async def _hedged_request(self, url, deadline=None):
+        """Send a request and, if it runs past the tail-latency threshold, a duplicate
+
+        Whichever copy answers first wins and the other is cancelled. Both go through
+        the shared limiter, so hedges never exceed the rate or concurrency window.
+        """
+        self._detail_calls += 1
+        primary = asyncio.ensure_future(self.request(url, latency_tracker=detail_latency, deadline=deadline))
+
+        threshold = detail_latency.percentile(HEDGE_PERCENTILE)
+        if threshold is None:
+            # No latency estimate yet
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=max(HEDGE_MIN_DELAY, threshold))
+        if done or not self._take_hedge_budget():
+            return await primary
+
+        print(f"🏎️ Detail call slower than p{HEDGE_PERCENTILE:g} ({threshold:.2f}s), sending a hedge...")
+        hedge = asyncio.ensure_future(self.request(url, latency_tracker=detail_latency, deadline=deadline))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result is not None:
+                        if task is hedge:
+                            self._hedge_stats['hedge_wins'] += 1
+                        return result
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,185 @@
+"""
+Rate Limiting
+Token-bucket rate limit, AIMD adaptive concurrency and jittered backoff for school portal calls
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+
+# Steady request rate and burst allowed against the school portal
+DEFAULT_RATE = float(os.environ.get('OBS_RATE_LIMIT', '5'))
+DEFAULT_BURST = float(os.environ.get('OBS_RATE_BURST', '10'))
+
+# Concurrency window bounds; the window grows while the portal is healthy and halves on overload
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get('OBS_MAX_CONCURRENCY', os.environ.get('HOMEWORK_FETCH_WORKERS', '8')))
+DEFAULT_MIN_CONCURRENCY = int(os.environ.get('OBS_MIN_CONCURRENCY', '1'))
+DEFAULT_INITIAL_CONCURRENCY = int(os.environ.get('OBS_INITIAL_CONCURRENCY', '4'))
+
+# Responses slower than this count as an overload signal
+DEFAULT_LATENCY_TARGET = float(os.environ.get('OBS_LATENCY_TARGET', '2.0'))
+
+# Exponential backoff base and cap (seconds) between retries of a failed request
+BACKOFF_BASE = float(os.environ.get('OBS_BACKOFF_BASE', '0.5'))
+BACKOFF_CAP = float(os.environ.get('OBS_BACKOFF_CAP', '10'))
+
+# How often waiters re-check for a free slot; works from threads and any event loop
+POLL_INTERVAL = 0.02
+
+class DeadlineReached(Exception):
+    """A request was cut off because the caller's deadline passed (or would pass while backing off)"""
+
+def backoff_delay(attempt, retry_after=None, base=None, cap=None):
+    """Full-jitter exponential backoff: a random delay up to base * 2**attempt, capped
+
+    A server-sent Retry-After (seconds) is used as a floor.
+    """
+    base = BACKOFF_BASE if base is None else base
+    cap = BACKOFF_CAP if cap is None else cap
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after:
+        delay = max(delay, min(cap, retry_after))
+    return delay
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (only the delta-seconds form), or None"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens per second up to ``capacity``
+
+    Callers reserve a token under a lock and then sleep off any deficit, so the
+    bucket can be shared by worker threads and event loops alike.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Take a token and return how long the caller must wait before using it"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+class AdaptiveLimiter:
+    """AIMD concurrency window in front of a token bucket
+
+    Each healthy response (fast enough, not 429/5xx/timeout) grows the window by
+    1/window, i.e. about one slot per round of requests; an overload signal halves
+    it, at most once per ``cooldown`` seconds so a burst of failures from the same
+    round only counts once.
+    """
+
+    def __init__(self, rate=None, burst=None, initial=None, minimum=None, maximum=None,
+                 latency_target=None, cooldown=1.0):
+        self.bucket = TokenBucket(DEFAULT_RATE if rate is None else rate,
+                                  DEFAULT_BURST if burst is None else burst)
+        self.minimum = max(1, DEFAULT_MIN_CONCURRENCY if minimum is None else minimum)
+        self.maximum = max(self.minimum, DEFAULT_MAX_CONCURRENCY if maximum is None else maximum)
+        initial = DEFAULT_INITIAL_CONCURRENCY if initial is None else initial
+        self.limit = float(min(self.maximum, max(self.minimum, initial)))
+        self.latency_target = DEFAULT_LATENCY_TARGET if latency_target is None else latency_target
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self.overloads = 0
+
+    def _try_enter(self):
+        with self._lock:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        """Wait for a concurrency slot and a rate token (blocking)"""
+        while not self._try_enter():
+            time.sleep(POLL_INTERVAL)
+        self.bucket.acquire()
+
+    async def acquire_async(self):
+        """Wait for a concurrency slot and a rate token without blocking the event loop"""
+        while not self._try_enter():
+            await asyncio.sleep(POLL_INTERVAL)
+        try:
+            await self.bucket.acquire_async()
+        except asyncio.CancelledError:
+            self.abandon()
+            raise
+
+    def abandon(self):
+        """Free a slot whose request was cancelled (e.g. a losing hedge) without adjusting the window"""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def release(self, latency=None, overloaded=False):
+        """Free a slot and adjust the window from the request's outcome"""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            if overloaded or (latency is not None and latency > self.latency_target):
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self._last_decrease = now
+                    self.limit = max(float(self.minimum), self.limit / 2)
+                    self.overloads += 1
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+
+    def get_stats(self):
+        return {'concurrency_limit': int(self.limit), 'overloads': self.overloads}
+
+class LatencyTracker:
+    """Sliding window of recent request latencies for percentile estimates"""
+
+    def __init__(self, window=200, min_samples=20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        with self._lock:
+            self.samples.append(latency)
+
+    def percentile(self, percent):
+        """Latency at the given percentile, or None until enough samples were seen"""
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+def is_overload_status(status_code):
+    """429 and 5xx mean the portal is struggling, not that the session is bad"""
+    return status_code == 429 or status_code >= 500
+
+# Shared by every SessionManager and async client in the process: all accounts hit the same portal
+obs_limiter = AdaptiveLimiter()
@@ -0,0 +1,309 @@
+"""
+Run Lock
+Single-flight coalescing and a leased cross-process lock so overlapping fetches share one sync
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from session_store import account_slug, shared_kv
+
+RUN_LOCK_KEY = "homework:run_lock"
+DEFAULT_RUN_LOCK_DIR = tempfile.gettempdir()
+
+# A holder that crashes leaves its lease behind for at most this long
+DEFAULT_LEASE_TTL = float(os.environ.get('RUN_LOCK_TTL', '120'))
+
+class RunInProgress(Exception):
+    """Another process holds the run lock and did not finish within the wait timeout"""
+
+class FileLease:
+    """Leased lock kept in a local file, shared by processes on the same machine
+
+    A fresh lease is created with O_EXCL. Taking over an expired lease, renewing and
+    releasing all rewrite a file that exists, so they are serialized on a second
+    O_EXCL marker file and re-check the lease under it.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_LEASE_TTL):
+        self.path = path
+        self.result_path = f"{path}.result"
+        self.marker_path = f"{path}.rewrite"
+        self.ttl = ttl
+
+    def _read(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self, path, record):
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f)
+        os.replace(tmp_path, path)
+
+    def _age(self, path):
+        try:
+            return time.time() - os.path.getmtime(path)
+        except FileNotFoundError:
+            return None
+
+    def _lock_marker(self, wait=1.0):
+        """Take the rewrite marker; False if another process kept it for ``wait`` seconds"""
+        give_up_at = time.monotonic() + wait
+        while True:
+            try:
+                os.close(os.open(self.marker_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+                return True
+            except FileExistsError:
+                age = self._age(self.marker_path)
+                if age is None:
+                    continue
+                if age > self.ttl:
+                    # Left behind by a process that died mid-rewrite
+                    self._unlock_marker()
+                    continue
+            if time.monotonic() >= give_up_at:
+                return False
+            time.sleep(0.01)
+
+    def _unlock_marker(self):
+        try:
+            os.remove(self.marker_path)
+        except FileNotFoundError:
+            pass
+
+    def acquire(self):
+        """Take the lease; returns an owner token, or None if someone else holds it"""
+        token = uuid.uuid4().hex
+        record = {'owner': token, 'expires_at': time.time() + self.ttl}
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            current = self._read(self.path)
+            if current is None:
+                # Unreadable: either being written by its creator right now or a crashed holder's
+                age = self._age(self.path)
+                if age is None or age < self.ttl:
+                    return None
+            elif time.time() < current.get('expires_at', 0):
+                return None
+            return self._take_over(current, record)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(record, f)
+        return token
+
+    def _take_over(self, expired, record):
+        """Replace the expired lease ``expired`` with ``record`` unless another process got there first"""
+        if not self._lock_marker(wait=0):
+            return None
+        try:
+            if self._read(self.path) != expired:
+                return None
+            print("⚠️ Taking over an expired run lock")
+            self._write(self.path, record)
+            return record['owner']
+        finally:
+            self._unlock_marker()
+
+    def renew(self, token):
+        """Extend the lease by another ttl; False if it is no longer ours"""
+        if not self._lock_marker():
+            return True  # Busy; the next renewal tries again
+        try:
+            current = self._read(self.path)
+            if not current or current.get('owner') != token:
+                return False
+            self._write(self.path, {'owner': token, 'expires_at': time.time() + self.ttl})
+            return True
+        finally:
+            self._unlock_marker()
+
+    def release(self, token):
+        """Drop the lease if it is still ours"""
+        if not self._lock_marker():
+            return  # It expires on its own
+        try:
+            current = self._read(self.path)
+            if current and current.get('owner') == token:
+                try:
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
+        finally:
+            self._unlock_marker()
+
+    def publish(self, result):
+        """Leave the finished run's result for callers that waited on the lease"""
+        self._write(self.result_path, {'finished_at': time.time(), 'result': result})
+
+    def last_result(self):
+        return self._read(self.result_path)
+
+class KeyValueLease:
+    """Leased lock kept in a key/value client supporting set(..., ex=, nx=)"""
+
+    def __init__(self, client=None, key=RUN_LOCK_KEY, ttl=DEFAULT_LEASE_TTL):
+        self.client = client if client is not None else shared_kv
+        self.key = key
+        self.result_key = f"{key}:result"
+        self.ttl = ttl
+
+    def acquire(self):
+        token = uuid.uuid4().hex
+        # The key expires with the lease, so a crashed holder cannot block others for longer than ttl
+        if self.client.set(self.key, token, ex=max(1, int(self.ttl)), nx=True):
+            return token
+        return None
+
+    def _owner(self):
+        current = self.client.get(self.key)
+        if isinstance(current, bytes):
+            current = current.decode('utf-8')
+        return current
+
+    def renew(self, token):
+        """Extend the lease by another ttl; False if it is no longer ours
+
+        Renewals run well before expiry, so the key can not change hands between the check and the write.
+        """
+        if self._owner() != token:
+            return False
+        self.client.set(self.key, token, ex=max(1, int(self.ttl)))
+        return True
+
+    def release(self, token):
+        if self._owner() == token:
+            self.client.delete(self.key)
+
+    def publish(self, result):
+        self.client.set(self.result_key, json.dumps({'finished_at': time.time(), 'result': result}),
+                        ex=max(1, int(self.ttl)))
+
+    def last_result(self):
+        raw = self.client.get(self.result_key)
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+class _Call:
+    """One in-progress run that other threads can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Coalesces overlapping runs of the same job
+
+    Within a process, callers arriving while a run is in progress wait for it and
+    get its result. Across processes the run is guarded by ``lease``, renewed while
+    the run lasts: a caller that cannot take it polls until the holder publishes its
+    result, and gives up with RunInProgress after ``wait_timeout`` seconds. Results
+    must be JSON-serializable.
+    """
+
+    def __init__(self, lease, wait_timeout=60, poll_interval=0.5):
+        self.lease = lease
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._current = None
+
+    def run(self, fn, accept=None):
+        """Run ``fn`` or join the run already in progress; returns ``(result, coalesced)``
+
+        ``accept(result)`` decides whether the result of a run this caller joined will
+        do (by default any will); if not, the caller waits for that run to end and
+        then runs ``fn`` itself.
+        """
+        while True:
+            with self._lock:
+                call = self._current
+                leader = call is None
+                if leader:
+                    call = self._current = _Call()
+
+            if leader:
+                break
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            result, _ = call.result
+            if accept is None or accept(result):
+                return result, True
+
+        try:
+            call.result = self._run_across_processes(fn, accept)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._current = None
+            call.done.set()
+
+    def _run_across_processes(self, fn, accept=None):
+        waiting_since = time.time()
+        give_up_at = time.monotonic() + self.wait_timeout
+        announced = False
+
+        while True:
+            # A run that finished while we waited already has our answer
+            if announced:
+                published = self.lease.last_result()
+                if (published and published.get('finished_at', 0) >= waiting_since and
+                        (accept is None or accept(published['result']))):
+                    return published['result'], True
+
+            token = self.lease.acquire()
+            if token:
+                stop = threading.Event()
+                threading.Thread(target=self._keep_renewed, args=(token, stop),
+                                 name="run-lock-renewal", daemon=True).start()
+                try:
+                    result = fn()
+                    self.lease.publish(result)
+                    return result, False
+                finally:
+                    stop.set()
+                    self.lease.release(token)
+
+            if not announced:
+                print("⏳ Another fetch is already running, waiting for its result...")
+                announced = True
+
+            if time.monotonic() >= give_up_at:
+                raise RunInProgress("A homework sync is already running")
+            time.sleep(self.poll_interval)
+
+    def _keep_renewed(self, token, stop):
+        """Renew the lease every third of its ttl until ``stop`` is set, so a long run keeps it"""
+        interval = max(1.0, self.lease.ttl / 3)
+        while not stop.wait(interval):
+            if not self.lease.renew(token):
+                print("⚠️ Run lock was taken over while the run was still going")
+                return
+
+def build_single_flight(name, wait_timeout=None):
+    """Build the single-flight guard for a job, with the lease selected by RUN_LOCK_STORE ('file' or 'kv')"""
+    if wait_timeout is None:
+        wait_timeout = float(os.environ.get('RUN_LOCK_WAIT', '60'))
+
+    if os.environ.get('RUN_LOCK_STORE', 'file').lower() == 'kv':
+        lease = KeyValueLease(key=f"{RUN_LOCK_KEY}:{account_slug(name)}")
+    else:
+        directory = os.environ.get('RUN_LOCK_DIR', DEFAULT_RUN_LOCK_DIR)
+        lease = FileLease(os.path.join(directory, f"homework_run_{account_slug(name)}.lock"))
+    return SingleFlight(lease, wait_timeout=wait_timeout)
@@ -1,27 +1,133 @@
 import requests
+from requests.adapters import HTTPAdapter
 import re
 import os
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 import json
+from session_store import build_session_store
+from detail_cache import build_detail_cache
+from rate_limit import obs_limiter
+
+HOMEWORK_LIST_URL = "https://bogazicisehirkolejiobs.com/obsapi/homework/getHomeworkList?[object%20FormData]&_=1758909470368"
+HOMEWORK_DETAIL_URL = "https://bogazicisehirkolejiobs.com/obsapi/homework/getHomeworkDetail?id={homework_id}&[object%20FormData]&_=1758909470369"
+
+# Base headers for school API data calls
+API_HEADERS = {
+    'accept': '*/*',
+    'accept-language': 'en-US,en;q=0.9,tr;q=0.8',
+    'priority': 'u=1, i',
+    'referer': 'https://bogazicisehirkolejiobs.com/',
+    'sec-ch-ua': '"Chromium";v="140", "Not=A?Brand";v="24", "Google Chrome";v="140"',
+    'sec-ch-ua-mobile': '?0',
+    'sec-ch-ua-platform': '"macOS"',
+    'sec-fetch-dest': 'empty',
+    'sec-fetch-mode': 'cors',
+    'sec-fetch-site': 'same-origin',
+    'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36',
+    'x-requested-with': 'XMLHttpRequest'
+}
+
+# Response text that means the portal dropped our session
+SESSION_ERROR_MARKERS = ['session expired', 'login required', 'authentication failed', 'unauthorized']
+
+def is_logged_out_response(text):
+    """Whether a data call answered with a session error or the HTML login page instead of JSON"""
+    content = text.lower()
+    return any(error in content for error in SESSION_ERROR_MARKERS) or content.lstrip().startswith('<')
+
+def is_data_payload(data):
+    """Whether a JSON reply carries data rather than an error envelope"""
+    if isinstance(data, list):
+        return True
+    if not isinstance(data, dict) or data.get('success') is False or data.get('error'):
+        return False
+    return data.get('success') is True or 'data' in data
+
+# How long a list downloaded during validation may be handed out as the list result
+VALIDATED_LIST_MAX_AGE = timedelta(seconds=60)
+
+# A stored session not confirmed valid for this long is re-checked before it is reused
+SESSION_REVALIDATE_AFTER = timedelta(minutes=int(os.environ.get('SESSION_REVALIDATE_MINUTES', '30')))
+
+# Minimum gap between store writes that only bump validated_at
+VALIDATED_AT_WRITE_INTERVAL = timedelta(minutes=1)
+
+# Minimum gap between background refresh attempts after one has failed
+REFRESH_AHEAD_RETRY_INTERVAL = timedelta(minutes=1)
 
 class SessionManager:
-    def __init__(self):
+    def __init__(self, pool_size=None, validation_mode=None, store=None, refresh_ahead=None,
+                 acquire_mode=None, hedge_stagger=None, detail_cache=None, username=None, password=None,
+                 limiter=None):
+        # Credentials default to SCHOOL_USERNAME/SCHOOL_PASSWORD; an explicit account
+        # (batch sync) never falls back to the browser PHPSESSID from the environment
+        self.username = username or os.environ.get('SCHOOL_USERNAME')
+        self.password = password or os.environ.get('SCHOOL_PASSWORD')
+        self.env_session = None if username else os.environ.get('PHPSESSID')
+        
         self.current_session = None
         self.session_expiry = None
+        self.session_obtained = None
+        self.session_validated = None
+        
+        # Persists the session across cold starts (see session_store.py)
+        self.store = store if store is not None else build_session_store()
+        
+        # Rate limit and adaptive concurrency for data calls, shared across accounts (see rate_limit.py)
+        self.limiter = limiter if limiter is not None else obs_limiter
+        
+        # Disk cache in front of getHomeworkDetail (see detail_cache.py)
+        self.detail_cache = detail_cache if detail_cache is not None else build_detail_cache()
+        
+        # Refresh-ahead: renew in the background once this fraction of the session lifetime
+        # has passed, while callers keep using the current cookie (0 disables)
+        if refresh_ahead is None:
+            refresh_ahead = float(os.environ.get('SESSION_REFRESH_AHEAD', '0'))
+        self.refresh_ahead = refresh_ahead
+        self._background_refresh = None
+        self._last_refresh_attempt = None
+        
+        # 'sequential' tries env session, login, then public pages in turn;
+        # 'hedged' races them, starting one every hedge_stagger seconds
+        self.acquire_mode = acquire_mode or os.environ.get('SESSION_ACQUIRE_MODE', 'sequential')
+        if hedge_stagger is None:
+            hedge_stagger = float(os.environ.get('SESSION_HEDGE_STAGGER', '1.0'))
+        self.hedge_stagger = hedge_stagger
+        self.session_strategy = None
+        self.strategy_wins = None
+        
+        # 'reuse': keep the list fetched while validating for the list call that follows
+        # 'full': download the list again after validating (previous behaviour)
+        self.validation_mode = validation_mode or os.environ.get('SESSION_VALIDATION_MODE', 'reuse')
+        self._validated_list = None
         self.base_url = "https://bogazicisehirkolejiobs.com"
+        # Serializes session refreshes when detail fetches run in parallel
+        self._refresh_lock = threading.Lock()
+        self._state_lock = threading.Lock()
         
-        # Try to get initial session from environment
-        env_session = os.environ.get('PHPSESSID')
-        if env_session:
-            self.current_session = env_session
+        # Pooled keep-alive transport shared by login, validation and data calls
+        if pool_size is None:
+            pool_size = int(os.environ.get('HOMEWORK_HTTP_POOL_SIZE', '10'))
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.http = requests.Session()
+        self.http.mount('https://', self.adapter)
+        self.http.mount('http://', self.adapter)
+        
+        # Try to get initial session from environment, unless a stored one is waiting to be restored
+        if self.env_session and not self._load_stored_session():
+            self.current_session = self.env_session
+            self.session_obtained = datetime.now()
             # Set expiry to 1 hour from now as a default
             self.session_expiry = datetime.now() + timedelta(hours=1)
 
-    def login_and_get_session(self):
+    def login_and_get_session(self, want_list=False, adopt=True):
         """Login using credentials and get authenticated session"""
         try:
-            username = os.environ.get('SCHOOL_USERNAME')
-            password = os.environ.get('SCHOOL_PASSWORD')
+            username = self.username
+            password = self.password
             
             if not username or not password:
                 print("⚠️ No login credentials found in environment variables")
@@ -30,8 +136,8 @@ class SessionManager:
             
             print(f"🔐 Attempting login for user: {username}")
             
-            # First get a basic session from the main page
-            session = requests.Session()
+            # First get a basic session from the main page (own jar, shared connection pool)
+            session = self._isolated_session()
             
             # Get initial session
             init_response = session.get(f"{self.base_url}/", timeout=10)
@@ -81,10 +187,12 @@ class SessionManager:
                             print(f"🔑 Got authenticated session ID: {session_id[:10]}...")
                             
                             # Verify the session works for homework API
-                            if self.test_session_validity(session_id):
+                            self._adopt_cookies(session.cookies)
+                            if self.test_session_validity(session_id, keep_list=want_list):
                                 print("✅ Authenticated session is valid for homework API!")
-                                self.current_session = session_id
-                                self.session_expiry = datetime.now() + timedelta(hours=4)  # Longer expiry for authenticated sessions
+                                if adopt:
+                                    self._record_strategy_win('login')
+                                    self._set_session(session_id, timedelta(hours=4))  # Longer expiry for authenticated sessions
                                 return session_id
                             else:
                                 print("⚠️ Authenticated session not valid for homework API")
@@ -106,82 +214,209 @@ class SessionManager:
             print(f"❌ Error during login: {e}")
             return None
 
-    def get_fresh_session(self):
-        """Get a fresh session ID, trying login first, then fallback methods"""
+    def _try_env_session(self, want_list=False):
+        """Strategy: the PHPSESSID from the environment"""
+        env_session = self.env_session
+        if not env_session:
+            return None
+        
+        print(f"🔑 Trying environment session ID: {env_session[:10]}...")
+        if self.test_session_validity(env_session, keep_list=want_list):
+            print(f"✅ Environment session ID is valid!")
+            return env_session, timedelta(hours=2)
+        
+        print("⚠️ Environment session ID is invalid")
+        return None
+
+    def _try_login(self, want_list=False):
+        """Strategy: log in with the account credentials"""
+        session_id = self.login_and_get_session(want_list, adopt=False)
+        if session_id:
+            return session_id, timedelta(hours=4)  # Longer expiry for authenticated sessions
+        return None
+
+    def _try_public_endpoint(self, endpoint, want_list=False):
+        """Strategy: pick up a session cookie from a public page"""
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.9,tr;q=0.8',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1'
+        }
+        
         try:
-            # First, try to use any existing environment session ID
-            env_session = os.environ.get('PHPSESSID')
-            if env_session:
-                print(f"🔑 Trying environment session ID: {env_session[:10]}...")
-                if self.test_session_validity(env_session):
-                    print(f"✅ Environment session ID is valid!")
-                    self.current_session = env_session
-                    self.session_expiry = datetime.now() + timedelta(hours=2)
-                    return env_session
-                else:
-                    print("⚠️ Environment session ID is invalid")
-            
-            # Try to login and get authenticated session
-            session_id = self.login_and_get_session()
-            if session_id:
-                return session_id
-            
-            print("🔄 Login method failed, trying fallback methods...")
-            
-            # Fallback: try to get session from public pages
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.9,tr;q=0.8',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1'
-            }
-            
-            # Try different endpoints to get a session
-            endpoints_to_try = [
-                f"{self.base_url}/",
-                f"{self.base_url}/login",
-                f"{self.base_url}/index.php"
-            ]
+            response = self._isolated_session().get(endpoint, headers=headers, timeout=10, allow_redirects=True)
             
-            for endpoint in endpoints_to_try:
-                try:
-                    response = requests.get(endpoint, headers=headers, timeout=10, allow_redirects=True)
+            # Check if we got a PHPSESSID in the response cookies
+            if 'PHPSESSID' in response.cookies:
+                session_id = response.cookies['PHPSESSID']
+                print(f"🔍 Got session ID from {endpoint}: {session_id[:10]}...")
+                
+                # Test if this session actually works for the homework API
+                if self.test_session_validity(session_id, keep_list=want_list):
+                    print(f"✅ Valid session ID obtained!")
+                    return session_id, timedelta(hours=2)
+                else:
+                    print(f"⚠️ Session ID from {endpoint} is not valid for homework API")
                     
-                    # Check if we got a PHPSESSID in the response cookies
-                    if 'PHPSESSID' in response.cookies:
-                        session_id = response.cookies['PHPSESSID']
-                        print(f"🔍 Got session ID from {endpoint}: {session_id[:10]}...")
-                        
-                        # Test if this session actually works for the homework API
-                        if self.test_session_validity(session_id):
-                            print(f"✅ Valid session ID obtained!")
-                            self.current_session = session_id
-                            self.session_expiry = datetime.now() + timedelta(hours=2)
-                            return session_id
-                        else:
-                            print(f"⚠️ Session ID from {endpoint} is not valid for homework API")
-                            
-                except Exception as e:
-                    print(f"⚠️ Failed to get session from {endpoint}: {e}")
-                    continue
+        except Exception as e:
+            print(f"⚠️ Failed to get session from {endpoint}: {e}")
+        
+        return None
+
+    def _session_strategies(self):
+        """Session acquisition strategies in their default priority order"""
+        strategies = []
+        if self.env_session:
+            strategies.append(('env', self._try_env_session))
+        strategies.append(('login', self._try_login))
+        
+        # Fallback: try to get session from public pages
+        for path in ['/', '/login', '/index.php']:
+            endpoint = f"{self.base_url}{path}"
+            strategies.append((f"public:{path}", functools.partial(self._try_public_endpoint, endpoint)))
+        return strategies
+
+    def _load_strategy_wins(self):
+        """Load the per-strategy win counts kept alongside the stored session"""
+        if self.strategy_wins is None:
+            record = self.store.load()
+            self.strategy_wins = dict((record or {}).get('strategy_wins') or {})
+        return self.strategy_wins
+
+    def _ordered_session_strategies(self):
+        """Strategies ordered by how often each has won, falling back to the default order"""
+        self._load_strategy_wins()
+        strategies = self._session_strategies()
+        return sorted(strategies, key=lambda strategy: -self.strategy_wins.get(strategy[0], 0))
+
+    def _record_strategy_win(self, name):
+        """Count a win for a strategy so later races start it first"""
+        self._load_strategy_wins()
+        self.strategy_wins[name] = self.strategy_wins.get(name, 0) + 1
+        self.session_strategy = name
+
+    def get_fresh_session(self, want_list=False):
+        """Get a fresh session ID, trying login first, then fallback methods"""
+        if self.acquire_mode == 'hedged':
+            return self._get_fresh_session_hedged(want_list)
+        
+        try:
+            for name, strategy in self._session_strategies():
+                result = strategy(want_list)
+                if result:
+                    session_id, lifetime = result
+                    self._record_strategy_win(name)
+                    self._set_session(session_id, lifetime)
+                    return session_id
+                
+                if name == 'login':
+                    print("🔄 Login method failed, trying fallback methods...")
             
-            print("❌ Could not obtain valid session ID using any method")
-            print("💡 Solutions:")
-            print("   1. Set SCHOOL_USERNAME and SCHOOL_PASSWORD environment variables for automatic login")
-            print("   2. Set PHPSESSID environment variable with a valid session from your browser")
+            self._print_session_help()
             return None
             
         except Exception as e:
             print(f"❌ Error getting fresh session: {e}")
             return None
 
-    def test_session_validity(self, session_id):
-        """Test if a session ID is valid by making a test API call"""
+    def _get_fresh_session_hedged(self, want_list=False):
+        """Race the acquisition strategies, starting one every hedge_stagger seconds
+
+        The first strategy that returns a validated session wins; strategies that
+        have not started yet are skipped and late results are discarded.
+        """
+        strategies = self._ordered_session_strategies()
+        cancelled = threading.Event()
+        
+        def run(index, name, strategy):
+            # Stagger the starts; a set event means another strategy already won
+            if cancelled.wait(index * self.hedge_stagger):
+                return None
+            result = strategy(want_list)
+            return (name, result) if result else None
+        
+        print(f"🏎️ Racing {len(strategies)} session strategies...")
+        executor = ThreadPoolExecutor(max_workers=len(strategies), thread_name_prefix="session-hedge")
+        futures = [
+            executor.submit(run, index, name, strategy)
+            for index, (name, strategy) in enumerate(strategies)
+        ]
+        
+        winner = None
+        try:
+            for future in as_completed(futures):
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    print(f"⚠️ Session strategy failed: {e}")
+                    continue
+                if outcome:
+                    winner = outcome
+                    break
+        finally:
+            cancelled.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        if not winner:
+            self._print_session_help()
+            return None
+        
+        name, (session_id, lifetime) = winner
+        print(f"🏁 Session strategy '{name}' won the race")
+        self._record_strategy_win(name)
+        self._set_session(session_id, lifetime)
+        return session_id
+
+    def _print_session_help(self):
+        """Explain how to configure a working session"""
+        print("❌ Could not obtain valid session ID using any method")
+        print("💡 Solutions:")
+        print("   1. Set SCHOOL_USERNAME and SCHOOL_PASSWORD environment variables for automatic login")
+        print("   2. Set PHPSESSID environment variable with a valid session from your browser")
+
+    def _isolated_session(self):
+        """Session with its own empty cookie jar that still uses the shared connection pool"""
+        session = requests.Session()
+        session.mount('https://', self.adapter)
+        session.mount('http://', self.adapter)
+        return session
+
+    def _adopt_cookies(self, cookie_jar):
+        """Copy portal cookies from a login into the shared jar used by validation and data calls"""
+        for cookie in cookie_jar:
+            # PHPSESSID is pinned per request so candidate sessions never clash in the jar
+            if cookie.name != 'PHPSESSID':
+                self.http.cookies.set_cookie(cookie)
+
+    def get_connection_stats(self):
+        """Report how many requests reused a pooled connection instead of opening a new one"""
+        pools = self.adapter.poolmanager.pools
+        total_requests = 0
+        connections_opened = 0
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            total_requests += pool.num_requests
+            connections_opened += pool.num_connections
+        
+        return {
+            'requests': total_requests,
+            'connections_opened': connections_opened,
+            'connections_reused': max(0, total_requests - connections_opened)
+        }
+
+    def test_session_validity(self, session_id, keep_list=False):
+        """Test if a session ID is valid by making a test API call
+
+        The check downloads the homework list, the one endpoint whose logged-out
+        reply can be told apart from real data. With ``keep_list`` the list is kept
+        so that AsyncOBSClient.open_homework_list() can stream it instead of downloading it again.
+        """
         try:
-            test_url = "https://bogazicisehirkolejiobs.com/obsapi/homework/getHomeworkList?[object%20FormData]&_=1758909470368"
-            
             headers = {
                 'accept': '*/*',
                 'accept-language': 'en-US,en;q=0.9,tr;q=0.8',
@@ -198,21 +433,16 @@ class SessionManager:
             }
             
             cookies = {'PHPSESSID': session_id}
-            response = requests.get(test_url, headers=headers, cookies=cookies, timeout=10)
+            response = self.http.get(HOMEWORK_LIST_URL, headers=headers, cookies=cookies, timeout=10)
             
             if response.status_code == 200:
                 try:
                     data = response.json()
-                    # Check if the response indicates login is required
-                    if isinstance(data, dict):
-                        if data.get('success') == False and 'login' in str(data.get('error', '')).lower():
-                            return False
-                        if 'data' in data or 'success' in data:
-                            return True
-                    elif isinstance(data, list):
-                        return True
-                except:
-                    pass
+                except ValueError:
+                    return False
+                if is_data_payload(data):
+                    self._keep_validated_list(session_id, data, response, keep_list)
+                    return True
             
             return False
             
@@ -220,125 +450,221 @@ class SessionManager:
             print(f"⚠️ Error testing session validity: {e}")
             return False
 
-    def get_valid_session(self):
-        """Get a valid session ID, refreshing if necessary"""
-        
-        # Check if current session exists and is not expired
-        if (self.current_session and 
-            self.session_expiry and 
-            datetime.now() < self.session_expiry):
-            return self.current_session
+    def _keep_validated_list(self, session_id, data, response, keep_list):
+        """Remember a list payload downloaded during validation"""
+        if keep_list and self.validation_mode == 'reuse':
+            self._validated_list = {
+                'session_id': session_id,
+                'data': data,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched_at': datetime.now()
+            }
+
+    def take_validated_list(self, session_id):
+        """Return (and forget) the list kept during validation if it belongs to this session"""
+        kept = self._validated_list
+        self._validated_list = None
+        if (kept and kept['session_id'] == session_id and 
+            datetime.now() - kept['fetched_at'] < VALIDATED_LIST_MAX_AGE):
+            return kept
+        return None
+
+    def _set_session(self, session_id, lifetime):
+        """Adopt a freshly validated session and persist it"""
+        now = datetime.now()
+        self.current_session = session_id
+        self.session_obtained = now
+        self.session_validated = now
+        self.session_expiry = now + lifetime
+        self._save_session()
+
+    def _save_session(self):
+        """Write the current session to the store"""
+        try:
+            self.store.save({
+                'session_id': self.current_session,
+                'obtained_at': self.session_obtained,
+                'validated_at': self.session_validated,
+                'expires_at': self.session_expiry,
+                'strategy': self.session_strategy,
+                'strategy_wins': self.strategy_wins or {}
+            })
+        except Exception as e:
+            print(f"⚠️ Could not persist session: {e}")
+
+    def _load_stored_session(self):
+        """Load the stored session record if it has not expired"""
+        try:
+            record = self.store.load()
+        except Exception as e:
+            print(f"⚠️ Could not read session store: {e}")
+            return None
         
-        # Session is expired or doesn't exist, get a fresh one
-        print("🔄 Session expired or missing, getting fresh session...")
-        return self.get_fresh_session()
+        if not record or not record.get('session_id'):
+            return None
+        if not record.get('expires_at') or datetime.now() >= record['expires_at']:
+            self._forget_stored_session(record)
+            return None
+        return record
 
-    def make_api_request(self, url, headers=None, cookies=None, timeout=30, max_retries=2):
-        """Make API request with automatic session refresh on failure"""
+    def _forget_stored_session(self, record):
+        """Drop the session from a stored record, keeping the learned strategy stats"""
+        try:
+            self.store.save({
+                'session_id': None,
+                'obtained_at': None,
+                'validated_at': None,
+                'expires_at': None,
+                'strategy': record.get('strategy'),
+                'strategy_wins': self.strategy_wins if self.strategy_wins is not None
+                                 else record.get('strategy_wins') or {}
+            })
+        except Exception as e:
+            print(f"⚠️ Could not update session store: {e}")
+
+    def _restore_session(self, want_list=False):
+        """Reuse the session persisted by an earlier invocation, re-checking it if stale"""
+        record = self._load_stored_session()
+        if not record:
+            return None
         
-        if headers is None:
-            headers = {}
+        session_id = record['session_id']
+        validated_at = record.get('validated_at') or record.get('obtained_at')
+        if not validated_at or datetime.now() - validated_at > SESSION_REVALIDATE_AFTER:
+            print(f"🔍 Re-checking stored session {session_id[:10]}...")
+            if not self.test_session_validity(session_id, keep_list=want_list):
+                print("⚠️ Stored session is no longer valid")
+                self._forget_stored_session(record)
+                return None
+            validated_at = datetime.now()
         
-        if cookies is None:
-            cookies = {}
+        self.current_session = session_id
+        self.session_obtained = record.get('obtained_at')
+        self.session_strategy = record.get('strategy')
+        if self.strategy_wins is None:
+            self.strategy_wins = dict(record.get('strategy_wins') or {})
+        self.session_validated = validated_at
+        self.session_expiry = record['expires_at']
+        if validated_at != record.get('validated_at'):
+            self._save_session()
         
-        # Base headers for school API
-        base_headers = {
-            'accept': '*/*',
-            'accept-language': 'en-US,en;q=0.9,tr;q=0.8',
-            'priority': 'u=1, i',
-            'referer': 'https://bogazicisehirkolejiobs.com/',
-            'sec-ch-ua': '"Chromium";v="140", "Not=A?Brand";v="24", "Google Chrome";v="140"',
-            'sec-ch-ua-mobile': '?0',
-            'sec-ch-ua-platform': '"macOS"',
-            'sec-fetch-dest': 'empty',
-            'sec-fetch-mode': 'cors',
-            'sec-fetch-site': 'same-origin',
-            'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36',
-            'x-requested-with': 'XMLHttpRequest'
-        }
+        print(f"💾 Reusing stored session {session_id[:10]}...")
+        return session_id
+
+    def mark_validated(self, session_id):
+        """Record that a session just served a successful request"""
+        if self.current_session != session_id:
+            return
+        now = datetime.now()
+        last_validated = self.session_validated
+        self.session_validated = now
+        if not last_validated or now - last_validated >= VALIDATED_AT_WRITE_INTERVAL:
+            self._save_session()
+
+    def has_valid_session(self):
+        """Check whether the current session exists and has not expired"""
+        return (self.current_session and 
+                self.session_expiry and 
+                datetime.now() < self.session_expiry)
+
+    def _needs_refresh_ahead(self):
+        """Check whether the current session is past the refresh-ahead point of its lifetime"""
+        if not (self.session_obtained and self.session_expiry):
+            return True
+        lifetime = self.session_expiry - self.session_obtained
+        return datetime.now() >= self.session_obtained + lifetime * self.refresh_ahead
+
+    def _start_background_refresh(self):
+        """Start renewing the session on a background thread unless one is already running"""
+        with self._state_lock:
+            if self._background_refresh and self._background_refresh.is_alive():
+                return
+            now = datetime.now()
+            if (self._last_refresh_attempt and 
+                now - self._last_refresh_attempt < REFRESH_AHEAD_RETRY_INTERVAL):
+                return
+            self._last_refresh_attempt = now
+            self._background_refresh = threading.Thread(
+                target=self._refresh_in_background, name="session-refresh-ahead", daemon=True
+            )
+            self._background_refresh.start()
+
+    def _refresh_in_background(self):
+        """Acquire a new session; the old one stays in use until the new one is validated"""
+        print("🔄 Refreshing session ahead of expiry in background...")
+        with self._refresh_lock:
+            if self.current_session and not self._needs_refresh_ahead():
+                return
+            session_id = self.get_fresh_session()
+        
+        if session_id:
+            print("✅ Background session refresh complete")
+        else:
+            print("⚠️ Background session refresh failed, keeping current session")
+
+    def get_valid_session(self, want_list=False):
+        """Get a valid session ID, refreshing if necessary"""
         
-        # Merge with provided headers
-        final_headers = {**base_headers, **headers}
+        # In refresh-ahead mode only a rejected (dropped) cookie makes callers wait for a login
+        if self.refresh_ahead and self.current_session:
+            session_id = self.current_session
+            if self._needs_refresh_ahead():
+                self._start_background_refresh()
+            return session_id
         
-        for attempt in range(max_retries + 1):
-            try:
-                # Get valid session
-                session_id = self.get_valid_session()
-                if not session_id:
-                    return None
-                
-                # Set session cookie
-                final_cookies = {**cookies, 'PHPSESSID': session_id}
-                
-                # Make the request
-                response = requests.get(url, headers=final_headers, cookies=final_cookies, timeout=timeout)
-                
-                # Check for session-related errors
-                if response.status_code == 401 or response.status_code == 403:
-                    print(f"🔒 Session invalid (HTTP {response.status_code}), attempting refresh...")
-                    self.current_session = None  # Force refresh
-                    continue
-                
-                # Check response content for session errors
-                try:
-                    content = response.text.lower()
-                    if any(error in content for error in ['session expired', 'login required', 'authentication failed', 'unauthorized']):
-                        print("🔒 Session expired based on response content, attempting refresh...")
-                        self.current_session = None  # Force refresh
-                        continue
-                except:
-                    pass
-                
-                # Check if response is valid JSON (expected for API calls)
-                try:
-                    response.json()
-                except json.JSONDecodeError:
-                    if attempt < max_retries:
-                        print("⚠️ Invalid JSON response, possibly session issue, attempting refresh...")
-                        self.current_session = None  # Force refresh
-                        continue
-                    else:
-                        print("❌ Invalid JSON response after retries")
-                        return None
-                
-                # If we get here, the request was successful
-                response.raise_for_status()
-                return response
-                
-            except requests.exceptions.RequestException as e:
-                if attempt < max_retries:
-                    print(f"⚠️ Request failed (attempt {attempt + 1}), retrying: {e}")
-                    self.current_session = None  # Force refresh on network errors
-                else:
-                    print(f"❌ Request failed after {max_retries + 1} attempts: {e}")
-                    return None
+        # Check if current session exists and is not expired
+        if self.has_valid_session():
+            return self.current_session
         
-        return None
+        with self._refresh_lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self.has_valid_session():
+                return self.current_session
+            
+            # A previous invocation may have left a usable session in the store
+            session_id = self._restore_session(want_list)
+            if session_id:
+                return session_id
+            
+            # Session is expired or doesn't exist, get a fresh one
+            print("🔄 Session expired or missing, getting fresh session...")
+            return self.get_fresh_session(want_list)
 
-    def get_homework_list(self):
-        """Get homework list with automatic session management"""
-        url = "https://bogazicisehirkolejiobs.com/obsapi/homework/getHomeworkList?[object%20FormData]&_=1758909470368"
-        response = self.make_api_request(url)
-        
-        if response:
-            try:
-                return response.json()
-            except json.JSONDecodeError:
-                return None
-        return None
+    def invalidate_session(self, session_id):
+        """Drop the current session if it is still the one that failed"""
+        if self.current_session == session_id:
+            self.current_session = None
+            # Only forget the stored session if no other invocation replaced it meanwhile
+            record = self._load_stored_session()
+            if record and record['session_id'] == session_id:
+                self._forget_stored_session(record)
 
-    def get_homework_detail(self, homework_id):
-        """Get homework detail with automatic session management"""
-        url = f"https://bogazicisehirkolejiobs.com/obsapi/homework/getHomeworkDetail?id={homework_id}&[object%20FormData]&_=1758909470369"
-        response = self.make_api_request(url)
-        
-        if response:
-            try:
-                return response.json()
-            except json.JSONDecodeError:
-                return None
-        return None
+    def cached_detail(self, homework_id):
+        """Fresh detail payload from the detail cache, or None (reads the disk)"""
+        if not self.detail_cache:
+            return None
+        return self.detail_cache.get(homework_id)
+
+    def cache_detail(self, homework_id, detail_data):
+        """Keep a detail payload in the detail cache (writes the disk); error envelopes are skipped"""
+        if not (self.detail_cache and isinstance(detail_data, dict) and 
+                detail_data.get('success') is not False):
+            return
+        try:
+            self.detail_cache.put(homework_id, detail_data)
+        except OSError as e:
+            print(f"⚠️ Could not cache detail for homework {homework_id}: {e}")
+
+    def flush_detail_cache(self):
+        """Persist detail cache bookkeeping and report its hit rate"""
+        if not self.detail_cache:
+            return None
+        try:
+            self.detail_cache.flush()
+        except OSError as e:
+            print(f"⚠️ Could not write detail cache index: {e}")
+        return {'hits': self.detail_cache.hits, 'misses': self.detail_cache.misses}
 
 # Global session manager instance
 session_manager = SessionManager()
@@ -0,0 +1,134 @@
+"""
+Session Pool
+Per-account SessionManagers for syncing several students from one deployment
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from detail_cache import build_detail_cache
+from session_manager import SessionManager
+from session_store import account_slug, build_session_store
+
+# Most idle accounts kept logged in at once; the least recently used idle one is dropped beyond this
+DEFAULT_SESSION_POOL_SIZE = int(os.environ.get('SESSION_POOL_SIZE', '8'))
+
+def load_accounts(raw=None):
+    """Parse the SCHOOL_ACCOUNTS setting into account dicts
+
+    SCHOOL_ACCOUNTS is a JSON list of ``{"name", "username", "password", "csv_path"}``
+    objects. ``name`` defaults to the username and ``csv_path`` to
+    ``homework_report_<name>.csv``. Entries without credentials are skipped.
+    """
+    if raw is None:
+        raw = os.environ.get('SCHOOL_ACCOUNTS', '')
+    if not raw.strip():
+        return []
+
+    try:
+        entries = json.loads(raw)
+    except ValueError as e:
+        print(f"⚠️ Ignoring unreadable SCHOOL_ACCOUNTS: {e}")
+        return []
+
+    accounts = []
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict) or not entry.get('username') or not entry.get('password'):
+            print("⚠️ Skipping SCHOOL_ACCOUNTS entry without username/password")
+            continue
+        name = str(entry.get('name') or entry['username'])
+        accounts.append({
+            'name': name,
+            'username': entry['username'],
+            'password': entry['password'],
+            'csv_path': entry.get('csv_path') or f"homework_report_{account_slug(name)}.csv"
+        })
+    return accounts
+
+class SessionPool:
+    """LRU-bounded pool of SessionManagers keyed by account name
+
+    Each manager keeps its own session, cookie jar, connection pool and session
+    store entry; the detail cache is shared since homework IDs are global to the portal.
+    Managers taken with lease() are never evicted while in use, so a batch larger than
+    ``max_size`` grows the pool for its duration and it shrinks back as leases end.
+    """
+
+    def __init__(self, max_size=None, detail_cache=None):
+        self.max_size = max_size if max_size is not None else DEFAULT_SESSION_POOL_SIZE
+        self.detail_cache = detail_cache if detail_cache is not None else build_detail_cache()
+        self._managers = OrderedDict()
+        self._in_use = {}
+        self._lock = threading.Lock()
+
+    def get(self, account):
+        """Return the SessionManager for an account, creating it (and evicting the LRU idle one) if needed"""
+        with self._lock:
+            manager = self._get(account)
+            self._evict_idle()
+            return manager
+
+    @contextmanager
+    def lease(self, account):
+        """The SessionManager for an account, kept out of eviction until the block exits"""
+        name = account['name']
+        with self._lock:
+            manager = self._get(account)
+            self._in_use[name] = self._in_use.get(name, 0) + 1
+            self._evict_idle()
+        try:
+            yield manager
+        finally:
+            with self._lock:
+                self._in_use[name] -= 1
+                if not self._in_use[name]:
+                    del self._in_use[name]
+                self._evict_idle()
+
+    def _get(self, account):
+        name = account['name']
+        manager = self._managers.get(name)
+        if manager is not None:
+            self._managers.move_to_end(name)
+            return manager
+
+        manager = SessionManager(
+            username=account['username'],
+            password=account['password'],
+            store=build_session_store(account=name, password=account['password']),
+            detail_cache=self.detail_cache
+        )
+        self._managers[name] = manager
+        return manager
+
+    def _evict_idle(self):
+        """Drop least recently used managers beyond max_size, skipping leased ones"""
+        excess = len(self._managers) - max(1, self.max_size)
+        for name in list(self._managers):
+            if excess <= 0:
+                break
+            if self._in_use.get(name):
+                continue
+            evicted = self._managers.pop(name)
+            print(f"♻️ Dropping pooled session for {name}")
+            evicted.http.close()
+            excess -= 1
+
+    def __len__(self):
+        return len(self._managers)
+
+    def flush_detail_cache(self):
+        """Persist detail cache access times; returns hit/miss counts (None when disabled)"""
+        if not self.detail_cache:
+            return None
+        try:
+            self.detail_cache.flush()
+        except OSError as e:
+            print(f"⚠️ Could not write detail cache index: {e}")
+        return {'hits': self.detail_cache.hits, 'misses': self.detail_cache.misses}
+
+# Process-wide pool so warm invocations keep their logins
+session_pool = SessionPool()
@@ -0,0 +1,189 @@
+"""
+Session Store
+Persists the school portal session so warm and cold invocations can reuse it without logging in again
+"""
+
+import base64
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from cryptography.fernet import Fernet, InvalidToken
+
+SESSION_STORE_KEY = "homework:session"
+DEFAULT_SESSION_STORE_PATH = os.path.join(tempfile.gettempdir(), "homework_session.enc")
+
+def derive_store_key(secret):
+    """Derive a Fernet key from a configured secret"""
+    digest = hashlib.pbkdf2_hmac('sha256', secret.encode('utf-8'), b'homework-session-store', 100000)
+    return base64.urlsafe_b64encode(digest)
+
+def encode_record(record):
+    """Serialize a session record, turning datetimes into ISO strings"""
+    return json.dumps({
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in record.items()
+    }).encode('utf-8')
+
+def decode_record(raw):
+    """Parse a serialized session record back into a dict with datetimes"""
+    record = json.loads(raw.decode('utf-8'))
+    for key in ('obtained_at', 'validated_at', 'expires_at'):
+        if record.get(key):
+            record[key] = datetime.fromisoformat(record[key])
+    return record
+
+class SessionStore:
+    """Base session store: keeps nothing"""
+
+    def load(self):
+        """Return the stored session record or None"""
+        return None
+
+    def save(self, record):
+        """Persist a session record with session_id, obtained_at, validated_at and expires_at"""
+        pass
+
+    def clear(self):
+        """Forget the stored session"""
+        pass
+
+class EncryptedFileSessionStore(SessionStore):
+    """Session store backed by an encrypted local file (e.g. /tmp on Vercel)"""
+
+    def __init__(self, path, secret):
+        self.path = path
+        self.fernet = Fernet(derive_store_key(secret))
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                token = f.read()
+            return decode_record(self.fernet.decrypt(token))
+        except FileNotFoundError:
+            return None
+        except (InvalidToken, ValueError, KeyError) as e:
+            print(f"⚠️ Ignoring unreadable session store {self.path}: {e}")
+            return None
+
+    def save(self, record):
+        token = self.fernet.encrypt(encode_record(record))
+        with self._lock:
+            # Write to a temp file first so a crash never leaves a half-written store
+            tmp_path = f"{self.path}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(token)
+            os.replace(tmp_path, self.path)
+
+    def clear(self):
+        with self._lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+class MemoryKeyValue:
+    """In-process stand-in for a hosted key/value service such as Vercel KV or Redis"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and time.time() >= expires_at:
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None, nx=False):
+        """Store a value (expiring after ``ex`` seconds); with ``nx`` only if the key is absent"""
+        with self._lock:
+            entry = self._data.get(key)
+            if nx and entry is not None and (entry[1] is None or time.time() < entry[1]):
+                return False
+            self._data[key] = (value, time.time() + ex if ex else None)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+# Process-wide stand-in KV shared by every store that does not get its own client
+shared_kv = MemoryKeyValue()
+
+class KeyValueSessionStore(SessionStore):
+    """Session store backed by a key/value client with get/set/delete"""
+
+    def __init__(self, client=None, secret=None, key=SESSION_STORE_KEY):
+        self.client = client if client is not None else shared_kv
+        self.key = key
+        self.fernet = Fernet(derive_store_key(secret)) if secret else None
+
+    def load(self):
+        raw = self.client.get(self.key)
+        if raw is None:
+            return None
+        try:
+            if isinstance(raw, str):
+                raw = raw.encode('utf-8')
+            if self.fernet:
+                raw = self.fernet.decrypt(raw)
+            return decode_record(raw)
+        except (InvalidToken, ValueError, KeyError) as e:
+            print(f"⚠️ Ignoring unreadable session record: {e}")
+            return None
+
+    def save(self, record):
+        raw = encode_record(record)
+        if self.fernet:
+            raw = self.fernet.encrypt(raw)
+        ttl = None
+        if record.get('expires_at'):
+            ttl = max(1, int((record['expires_at'] - datetime.now()).total_seconds()))
+        self.client.set(self.key, raw, ex=ttl)
+
+    def clear(self):
+        self.client.delete(self.key)
+
+def account_slug(account):
+    """Filesystem- and key-safe form of an account name"""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', str(account))
+
+def build_session_store(account=None, password=None):
+    """Build the session store selected by SESSION_STORE ('file', 'kv' or 'none')
+
+    With an ``account`` (batch sync) the session is kept under a per-account key or
+    file, encrypted with SESSION_STORE_SECRET or that account's ``password``.
+    """
+    backend = os.environ.get('SESSION_STORE', 'file').lower()
+    secret = (os.environ.get('SESSION_STORE_SECRET') or password or
+              (None if account else os.environ.get('SCHOOL_PASSWORD')))
+
+    if backend == 'none':
+        return SessionStore()
+
+    if backend == 'kv':
+        key = f"{SESSION_STORE_KEY}:{account_slug(account)}" if account else SESSION_STORE_KEY
+        return KeyValueSessionStore(secret=secret, key=key)
+
+    if not secret:
+        print("⚠️ No SESSION_STORE_SECRET set - session will not be persisted")
+        return SessionStore()
+
+    path = os.environ.get('SESSION_STORE_PATH', DEFAULT_SESSION_STORE_PATH)
+    if account:
+        root, ext = os.path.splitext(path)
+        path = f"{root}.{account_slug(account)}{ext}"
+    return EncryptedFileSessionStore(path, secret)
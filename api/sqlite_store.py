@@ -0,0 +1,335 @@
+"""
+SQLite Store
+Homework records in an embedded SQLite database, with an optional background CSV mirror to GitHub
+
+Meant for self-hosted servers with a persistent database file; see build_homework_store.
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+
+from github_storage import github_storage
+from homework_record import CSV_COLUMNS, HomeworkRecord, format_value, record_row
+from homework_store import HomeworkStore, in_range
+
+DEFAULT_DB_PATH = os.path.join(tempfile.gettempdir(), "homework.sqlite3")
+
+# Rows sent to SQLite per executemany() call when saving
+UPSERT_BATCH_SIZE = int(os.environ.get('HOMEWORK_DB_BATCH_SIZE', '500'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS homework (
+    dataset TEXT NOT NULL,
+    id TEXT,
+    status TEXT NOT NULL DEFAULT '',
+    teaNameSurname TEXT NOT NULL DEFAULT '',
+    lesson TEXT NOT NULL DEFAULT '',
+    startDate TEXT NOT NULL DEFAULT '',
+    endDate TEXT NOT NULL DEFAULT '',
+    description TEXT NOT NULL DEFAULT '',
+    listHash TEXT NOT NULL DEFAULT '',
+    extra TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS homework_id ON homework (dataset, id);
+CREATE INDEX IF NOT EXISTS homework_end_date ON homework (dataset, endDate);
+CREATE INDEX IF NOT EXISTS homework_status ON homework (dataset, status);
+CREATE INDEX IF NOT EXISTS homework_lesson ON homework (dataset, lesson);
+CREATE TABLE IF NOT EXISTS datasets (
+    dataset TEXT PRIMARY KEY,
+    fieldnames TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS mirrors (
+    dataset TEXT PRIMARY KEY,
+    version TEXT
+);
+"""
+
+# Data columns after dataset and id, in table order
+_VALUE_COLUMNS = ['status', 'teaNameSurname', 'lesson', 'startDate', 'endDate', 'description', 'listHash', 'extra']
+
+# Rows are only rewritten when a value actually changed, so a status edit touches one row
+UPSERT = f"""
+INSERT INTO homework (dataset, id, {', '.join(_VALUE_COLUMNS)})
+VALUES (?, ?, {', '.join('?' for _ in _VALUE_COLUMNS)})
+ON CONFLICT (dataset, id) DO UPDATE SET
+    {', '.join(f'{column} = excluded.{column}' for column in _VALUE_COLUMNS)}
+WHERE {' OR '.join(f'{column} IS NOT excluded.{column}' for column in _VALUE_COLUMNS)}
+"""
+
+SELECT = f"SELECT id, {', '.join(_VALUE_COLUMNS)} FROM homework WHERE dataset = ?"
+
+def default_db_path():
+    return os.environ.get('HOMEWORK_DB_PATH', DEFAULT_DB_PATH)
+
+def record_values(record):
+    """Table values of a record after dataset and id"""
+    return (
+        record.status, record.teacher, record.lesson,
+        format_value(record.start_date), format_value(record.end_date),
+        record.description, record.list_hash,
+        json.dumps(record.extra, ensure_ascii=False) if record.extra else None
+    )
+
+def same_records(fieldnames, records, other_fieldnames, other_records):
+    """Whether two datasets hold the same columns and rows, in any row order"""
+    if list(fieldnames) != list(other_fieldnames):
+        return False
+    rows = sorted(tuple(record_row(record, fieldnames)) for record in records)
+    return rows == sorted(tuple(record_row(record, fieldnames)) for record in other_records)
+
+def row_record(row):
+    homework_id, status, teacher, lesson, start, end, description, list_hash, extra = row
+    return HomeworkRecord(
+        id=homework_id, status=status, teacher=teacher, lesson=lesson, start_date=start, end_date=end,
+        description=description, list_hash=list_hash, extra=json.loads(extra) if extra else None
+    )
+
+class GitHubMirror:
+    """Exports saved records to a GitHub store from a background thread
+
+    Saves that arrive while an export is running are coalesced: only the newest
+    snapshot is exported next. Each export is saved against ``version``, the GitHub
+    version the database was last in step with (from seeding or the previous
+    export), so a copy changed on GitHub by anyone else is not overwritten: the
+    export is refused and logged instead. A refused export whose data GitHub
+    already holds (e.g. an earlier export was committed but its version never got
+    recorded) picks up GitHub's current version, so later exports are not all
+    refused against a stale one. ``on_version(version)`` is called with each new
+    version so it can be persisted.
+    """
+
+    def __init__(self, target, version=None, on_version=None):
+        self.target = target
+        self.version = version
+        self.on_version = on_version
+        self._pending = None
+        self._worker = None
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+
+    def submit(self, fieldnames, records, commit_message):
+        """Queue an export of a snapshot of the records"""
+        with self._lock:
+            self._pending = (list(fieldnames), list(records), commit_message)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="github-mirror", daemon=True)
+                self._worker.start()
+
+    def export_now(self, fieldnames, records, commit_message, extra_files=None):
+        """Export right away (superseding a queued snapshot); returns success"""
+        with self._lock:
+            self._pending = None
+        return self._export(list(fieldnames), list(records), commit_message, extra_files)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                job, self._pending = self._pending, None
+                if job is None:
+                    self._worker = None
+                    return
+            try:
+                self._export(*job)
+            except Exception as e:
+                print(f"⚠️ GitHub mirror export failed: {e}")
+
+    def _export(self, fieldnames, records, commit_message, extra_files=None):
+        with self._export_lock:
+            version = self.target.save(fieldnames, records, self.version, commit_message, extra_files)
+            exported = version is not None
+            if not exported:
+                version = self._matching_version(fieldnames, records)
+                if version is not None:
+                    print(f"♻️ GitHub mirror of {self.target.csv_path} already matches the database")
+                    exported = (not extra_files or
+                                self.target.storage.commit_files(extra_files, commit_message) is not None)
+            if version is not None:
+                self.track(version)
+        if not exported:
+            print(f"⚠️ GitHub mirror of {self.target.csv_path} was not written; "
+                  f"it may have been changed on GitHub since the last export")
+        return exported
+
+    def _matching_version(self, fieldnames, records):
+        """GitHub's current version if its copy holds exactly these records, else None"""
+        stored_fieldnames, stored_records, version = self.target.load()
+        if version is None or not same_records(fieldnames, records, stored_fieldnames, stored_records):
+            return None
+        return version
+
+    def track(self, version):
+        """Record the GitHub version the database is now in step with"""
+        self.version = version
+        if self.on_version is not None:
+            self.on_version(version)
+
+class SqliteStore(HomeworkStore):
+    """Records of one dataset in an SQLite database, keyed by ``csv_path``
+
+    The database runs in WAL mode so reads are not blocked by a save. ``id`` is
+    unique per dataset and ``endDate``, ``status`` and ``lesson`` are indexed. A
+    save is one transaction of batched upserts that skip unchanged rows, plus
+    deletes of the IDs no longer present; the version is a counter bumped by
+    every save.
+
+    With a ``mirror`` each save is also exported to GitHub in the background, and
+    an empty database is seeded from the mirror's GitHub copy on first use. The
+    GitHub version the database is in step with is kept in the ``mirrors`` table,
+    so exports after a restart are still checked against it.
+    """
+
+    def __init__(self, csv_path, db_path=None, mirror=None):
+        self.csv_path = csv_path
+        self.db_path = db_path or default_db_path()
+        self.mirror = mirror
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._seed_lock = threading.Lock()
+        self._seeded = mirror is None
+        if mirror is not None:
+            mirror.on_version = self._save_mirror_version
+
+    def _connect(self):
+        """This thread's connection, with the schema created on first use"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    connection.executescript(SCHEMA)
+                    self._schema_ready = True
+            self._local.connection = connection
+        if not self._seeded:
+            with self._seed_lock:
+                if not self._seeded:
+                    self._seed(connection)
+                    self._seeded = True
+        return connection
+
+    def _seed(self, connection):
+        """Copy the mirror's GitHub data into an empty dataset, or pick up the GitHub version it is in step with"""
+        if self._version(connection) is not None:
+            row = connection.execute("SELECT version FROM mirrors WHERE dataset = ?", (self.csv_path,)).fetchone()
+            if row is not None:
+                self.mirror.version = json.loads(row[0])
+                return
+            # Database from before mirror versions were kept: start from GitHub's current copy
+            version = self.mirror.target.current_version()
+        else:
+            fieldnames, records, version = self.mirror.target.load()
+            if version is not None:
+                print(f"📥 Seeding {self.db_path} with {len(records)} records from GitHub")
+                self._write(connection, fieldnames, records, None)
+        self.mirror.version = version
+        self._save_mirror_version(version, connection)
+
+    def _save_mirror_version(self, version, connection=None):
+        connection = connection or self._connect()
+        connection.execute(
+            "INSERT INTO mirrors (dataset, version) VALUES (?, ?) "
+            "ON CONFLICT (dataset) DO UPDATE SET version = excluded.version",
+            (self.csv_path, json.dumps(version))
+        )
+
+    def _version(self, connection):
+        row = connection.execute("SELECT version FROM datasets WHERE dataset = ?", (self.csv_path,)).fetchone()
+        return row[0] if row else None
+
+    def load(self, start=None, end=None):
+        """``(fieldnames, records, version)``; a range is answered from the endDate index and returns no version"""
+        connection = self._connect()
+        connection.execute("BEGIN")
+        try:
+            row = connection.execute("SELECT fieldnames, version FROM datasets WHERE dataset = ?",
+                                     (self.csv_path,)).fetchone()
+            query, args = SELECT, [self.csv_path]
+            if start is not None:
+                query += " AND endDate >= ?"
+                args.append(start.isoformat())
+            if end is not None:
+                query += " AND endDate <= ?"
+                args.append(end.isoformat())
+            rows = connection.execute(query + " ORDER BY endDate DESC", args).fetchall()
+        finally:
+            connection.execute("COMMIT")
+
+        fieldnames = json.loads(row[0]) if row else list(CSV_COLUMNS)
+        records = [row_record(values) for values in rows]
+        if start is not None or end is not None:
+            # Text comparison on endDate; drop free-text dates that happen to sort inside the range
+            return fieldnames, [record for record in records if in_range(record.end_date, start, end)], None
+        return fieldnames, records, row[1] if row else None
+
+    def current_version(self):
+        return self._version(self._connect())
+
+    def _write(self, connection, fieldnames, records, version):
+        """Replace the dataset in one transaction; returns the new version, or None if it is no longer ``version``"""
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if self._version(connection) != version:
+                connection.execute("ROLLBACK")
+                return None
+
+            dataset = self.csv_path
+            keep = set()
+            rows = []
+            for record in records:
+                homework_id = None if record.id is None else format_value(record.id)
+                if homework_id is not None:
+                    keep.add(homework_id)
+                rows.append((dataset, homework_id) + record_values(record))
+
+            stored = {row[0] for row in connection.execute(
+                "SELECT id FROM homework WHERE dataset = ? AND id IS NOT NULL", (dataset,))}
+            # Rows without an ID can not be matched up, so they are replaced wholesale
+            connection.execute("DELETE FROM homework WHERE dataset = ? AND id IS NULL", (dataset,))
+            removed = [(dataset, homework_id) for homework_id in stored - keep]
+            for start in range(0, len(removed), UPSERT_BATCH_SIZE):
+                connection.executemany("DELETE FROM homework WHERE dataset = ? AND id = ?",
+                                       removed[start:start + UPSERT_BATCH_SIZE])
+            for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+                connection.executemany(UPSERT, rows[start:start + UPSERT_BATCH_SIZE])
+
+            connection.execute(
+                "INSERT INTO datasets (dataset, fieldnames, version, updated_at) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT (dataset) DO UPDATE SET fieldnames = excluded.fieldnames, "
+                "version = version + 1, updated_at = excluded.updated_at",
+                (dataset, json.dumps(list(fieldnames)), datetime.now().isoformat(timespec='seconds'))
+            )
+            new_version = self._version(connection)
+            connection.execute("COMMIT")
+            return new_version
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def save(self, fieldnames, records, version, commit_message, extra_files=None):
+        """Replace the stored records unless they changed since ``version``; returns the new version or None
+
+        ``extra_files`` (the HTML report) are published before returning, together
+        with the mirrored CSV; without extra files the mirror catches up in the background.
+        """
+        new_version = self._write(self._connect(), fieldnames, records, version)
+        if new_version is None:
+            print(f"⚠️ {self.csv_path} changed in {self.db_path} since it was read")
+            return None
+        if self.mirror is None:
+            if extra_files and github_storage.commit_files(extra_files, commit_message) is None:
+                return None
+            return new_version
+        if extra_files:
+            if not self.mirror.export_now(fieldnames, records, commit_message, extra_files):
+                return None
+            return new_version
+        self.mirror.submit(fieldnames, records, commit_message)
+        return new_version
@@ -0,0 +1,83 @@
+"""
+Sync State
+Small JSON state kept between fetch runs (last list fingerprint, HTTP validators, ...)
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+from session_store import account_slug, shared_kv
+
+SYNC_STATE_KEY = "homework:sync_state"
+DEFAULT_SYNC_STATE_PATH = os.path.join(tempfile.gettempdir(), "homework_sync_state.json")
+
+class FileSyncState:
+    """Sync state kept in a local JSON file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Return the saved state dict (empty if nothing was saved yet)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (ValueError, OSError) as e:
+            print(f"⚠️ Ignoring unreadable sync state {self.path}: {e}")
+            return {}
+
+    def save(self, state):
+        """Replace the saved state"""
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.path)
+
+    def update(self, **changes):
+        """Merge changes into the saved state and return the result"""
+        state = self.load()
+        state.update(changes)
+        self.save(state)
+        return state
+
+class KeyValueSyncState(FileSyncState):
+    """Sync state kept under one key of a key/value client with get/set"""
+
+    def __init__(self, client=None, key=SYNC_STATE_KEY):
+        self.client = client if client is not None else shared_kv
+        self.key = key
+
+    def load(self):
+        raw = self.client.get(self.key)
+        if raw is None:
+            return {}
+        try:
+            return json.loads(raw)
+        except ValueError as e:
+            print(f"⚠️ Ignoring unreadable sync state: {e}")
+            return {}
+
+    def save(self, state):
+        self.client.set(self.key, json.dumps(state))
+
+def build_sync_state(account=None):
+    """Build the sync state store selected by SYNC_STATE_STORE ('file' or 'kv')
+
+    With an ``account`` (batch sync) the state is kept under a per-account key or file.
+    """
+    if os.environ.get('SYNC_STATE_STORE', 'file').lower() == 'kv':
+        if account:
+            return KeyValueSyncState(key=f"{SYNC_STATE_KEY}:{account_slug(account)}")
+        return KeyValueSyncState()
+
+    path = os.environ.get('SYNC_STATE_PATH', DEFAULT_SYNC_STATE_PATH)
+    if account:
+        root, ext = os.path.splitext(path)
+        path = f"{root}.{account_slug(account)}{ext}"
+    return FileSyncState(path)
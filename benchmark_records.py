@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Homework Record Benchmark
+Compares HomeworkRecord against plain dict rows for parsing, sorting and writing a large CSV
+"""
+
+import csv
+import gc
+import io
+import random
+import sys
+import os
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api'))
+from homework_record import CSV_COLUMNS, parse_csv, records_to_csv, sort_by_due_date
+
+TEACHERS = [f"TEACHER {i}" for i in range(40)]
+LESSONS = ['TÜRKÇE', 'MATEMATİK', 'FEN BİL.', 'SOSYAL BİL.', 'Y.DİL', 'DİN. KÜL.', 'MÜZİK', 'GÖRSEL SAN.']
+STATUSES = ['', '', 'Done', 'In Progress', 'Pending']
+
+def build_csv(count, seed=1):
+    """CSV text with ``count`` homework rows spread over about three school years"""
+    rng = random.Random(seed)
+    first_day = date(2023, 9, 1)
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(CSV_COLUMNS)
+    for homework_id in range(1, count + 1):
+        start = first_day + timedelta(days=rng.randrange(900))
+        end = start + timedelta(days=rng.randrange(1, 14))
+        writer.writerow([
+            homework_id, rng.choice(STATUSES), rng.choice(TEACHERS), rng.choice(LESSONS),
+            start.isoformat(), end.isoformat(), f"Kitap sayfa {rng.randrange(1, 300)} yapılacak",
+            f"{rng.getrandbits(64):016x}"
+        ])
+    return output.getvalue()
+
+def dict_parse(text):
+    reader = csv.DictReader(io.StringIO(text))
+    return reader.fieldnames, list(reader)
+
+def dict_sort(rows):
+    rows.sort(key=lambda x: x.get('endDate', ''), reverse=True)
+
+def dict_write(fieldnames, rows):
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=fieldnames)
+    writer.writeheader()
+    writer.writerows(rows)
+    return output.getvalue()
+
+def measure(parse, sort, write, text):
+    """Seconds for each stage and bytes held by the parsed rows"""
+    gc.collect()
+    started = time.perf_counter()
+    fieldnames, rows = parse(text)
+    parse_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    sort(rows)
+    sort_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    write(fieldnames, rows)
+    write_seconds = time.perf_counter() - started
+    del rows
+
+    # Memory is traced in a separate parse so tracing does not skew the timings
+    gc.collect()
+    tracemalloc.start()
+    parsed = parse(text)
+    held_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del parsed
+    return {'parse': parse_seconds, 'sort': sort_seconds, 'write': write_seconds, 'memory': held_bytes}
+
+def best_of(runs, *args):
+    results = [measure(*args) for _ in range(runs)]
+    return {key: min(result[key] for result in results) for key in results[0]}
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    runs = 3
+    print(f"🧪 Building a CSV with {count:,} homework rows...")
+    text = build_csv(count)
+
+    dicts = best_of(runs, dict_parse, dict_sort, dict_write, text)
+    records = best_of(runs, parse_csv, sort_by_due_date, records_to_csv, text)
+
+    print(f"\n{'':10}{'dict rows':>14}{'HomeworkRecord':>18}{'gain':>10}")
+    for key in ('parse', 'sort', 'write'):
+        print(f"{key:10}{dicts[key] * 1000:>11.0f} ms{records[key] * 1000:>15.0f} ms"
+              f"{dicts[key] / records[key]:>9.1f}x")
+    print(f"{'memory':10}{dicts['memory'] / 2**20:>11.1f} MB{records['memory'] / 2**20:>15.1f} MB"
+          f"{dicts['memory'] / records['memory']:>9.1f}x")
+    print(f"\n📦 {dicts['memory'] / count:.0f} bytes per dict row vs "
+          f"{records['memory'] / count:.0f} bytes per record")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
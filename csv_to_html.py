@@ -4,21 +4,20 @@ CSV to HTML Converter
 Converts the homework CSV report to a beautiful HTML page with status styling
 """
 
-import csv
 from datetime import datetime
 import sys
 import os
 
+# The homework record type is shared with the fetcher and the Vercel functions
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api'))
+from homework_record import format_value, read_records, sort_by_due_date, write_records
+
 def read_csv_data(csv_file_path):
-    """Read CSV data and return list of dictionaries"""
-    
-    homework_data = []
+    """Read CSV data and return a list of HomeworkRecords"""
     
     try:
-        with open(csv_file_path, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                homework_data.append(row)
+        with open(csv_file_path, 'r', newline='', encoding='utf-8') as csvfile:
+            _, homework_data = read_records(csvfile)
         
         print(f"📊 Successfully read {len(homework_data)} homework records from CSV")
         return homework_data
@@ -31,11 +30,11 @@ def read_csv_data(csv_file_path):
         return None
 
 def generate_html_report(homework_data):
-    """Generate beautiful HTML report from homework data"""
+    """Generate beautiful HTML report from a list of HomeworkRecords"""
     
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     total_homework = len(homework_data)
-    completed_homework = len([h for h in homework_data if h.get('status', '').strip().lower() == 'done'])
+    completed_homework = sum(1 for h in homework_data if h.done)
     pending_homework = total_homework - completed_homework
     
     # Calculate completion percentage
@@ -412,19 +411,19 @@ def generate_html_report(homework_data):
     
     # Add homework rows
     for homework in homework_data:
-        status = homework.get('status', '').strip()
+        status = homework.status.strip()
         status_class = 'status-done' if status.lower() == 'done' else ('status-pending' if status else 'status-empty')
         status_text = status if status else 'Not Started'
         
         html_content += f"""
                         <tr>
-                            <td><div class="homework-id">{homework.get('id', '')}</div></td>
+                            <td><div class="homework-id">{format_value(homework.id)}</div></td>
                             <td><span class="{status_class}">{status_text}</span></td>
-                            <td><div class="teacher-name">{homework.get('teaNameSurname', '')}</div></td>
-                            <td><div class="lesson-name">{homework.get('lesson', '')}</div></td>
-                            <td><div class="date-cell">{homework.get('startDate', '')}</div></td>
-                            <td><div class="date-cell">{homework.get('endDate', '')}</div></td>
-                            <td><div class="description-cell">{homework.get('description', '')}</div></td>
+                            <td><div class="teacher-name">{homework.teacher}</div></td>
+                            <td><div class="lesson-name">{homework.lesson}</div></td>
+                            <td><div class="date-cell">{format_value(homework.start_date)}</div></td>
+                            <td><div class="date-cell">{format_value(homework.end_date)}</div></td>
+                            <td><div class="description-cell">{homework.description}</div></td>
                         </tr>"""
     
     html_content += f"""
@@ -449,22 +448,16 @@ def sort_and_rewrite_csv(csv_file_path):
     
     try:
         # Read all data
-        homework_data = []
-        with open(csv_file_path, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                homework_data.append(row)
+        with open(csv_file_path, 'r', newline='', encoding='utf-8') as csvfile:
+            fieldnames, homework_data = read_records(csvfile)
         
         # Sort by due date (descending - most recent due dates first)
-        homework_data.sort(key=lambda x: x.get('endDate', ''), reverse=True)
+        sort_by_due_date(homework_data)
         
         # Rewrite the CSV file with sorted data
         with open(csv_file_path, 'w', newline='', encoding='utf-8') as csvfile:
             if homework_data:
-                fieldnames = homework_data[0].keys()
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(homework_data)
+                write_records(csvfile, fieldnames, homework_data)
         
         print("🔄 Sorted and updated CSV file by due date")
         return True
@@ -516,7 +509,7 @@ def main():
         
         # Show summary stats
         total = len(homework_data)
-        completed = len([h for h in homework_data if h.get('status', '').strip().lower() == 'done'])
+        completed = sum(1 for h in homework_data if h.done)
         pending = total - completed
         percentage = (completed / total * 100) if total > 0 else 0
         
@@ -4,337 +4,42 @@ Homework Fetcher Script
 Fetches homework data from Bogazici Sehir Koleji API and generates a CSV report
 """
 
-import requests
-import json
+import asyncio
 import csv
-from datetime import datetime, timedelta
+import random
 import sys
 import os
-import re
-
-class SessionManager:
-    def __init__(self):
-        self.current_session = None
-        self.session_expiry = None
-        self.base_url = "https://bogazicisehirkolejiobs.com"
-
-    def login_and_get_session(self):
-        """Login using credentials and get authenticated session"""
-        try:
-            username = os.environ.get('SCHOOL_USERNAME')
-            password = os.environ.get('SCHOOL_PASSWORD')
-            
-            if not username or not password:
-                print("⚠️ No login credentials found in environment variables")
-                print("💡 Set SCHOOL_USERNAME and SCHOOL_PASSWORD environment variables")
-                return None
-            
-            print(f"🔐 Attempting login for user: {username}")
-            
-            # First get a basic session from the main page
-            session = requests.Session()
-            
-            # Get initial session
-            init_response = session.get(f"{self.base_url}/", timeout=10)
-            
-            # Prepare login data
-            login_url = f"{self.base_url}/require/class/login.php"
-            
-            headers = {
-                'accept': '*/*',
-                'accept-language': 'en-US,en;q=0.9,tr;q=0.8',
-                'origin': self.base_url,
-                'priority': 'u=1, i',
-                'referer': f"{self.base_url}/",
-                'sec-ch-ua': '"Chromium";v="140", "Not=A?Brand";v="24", "Google Chrome";v="140"',
-                'sec-ch-ua-mobile': '?0',
-                'sec-ch-ua-platform': '"macOS"',
-                'sec-fetch-dest': 'empty',
-                'sec-fetch-mode': 'cors',
-                'sec-fetch-site': 'same-origin',
-                'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36',
-                'x-requested-with': 'XMLHttpRequest'
-            }
-            
-            # Prepare multipart form data
-            form_data = {
-                'request': 'login',
-                'loginAs': 'standard',
-                'isRegister': '0',
-                'password': password,
-                'username': username,
-                'newUser': '0'
-            }
-            
-            # Make login request
-            response = session.post(login_url, headers=headers, data=form_data, timeout=10)
-            
-            if response.status_code == 200:
-                # Check if login was successful
-                try:
-                    login_result = response.json()
-                    if login_result.get('success') == True or login_result.get('status') == 'success':
-                        print("✅ Login successful!")
-                        
-                        # Get the session ID from the session cookies
-                        if 'PHPSESSID' in session.cookies:
-                            session_id = session.cookies['PHPSESSID']
-                            print(f"🔑 Got authenticated session ID: {session_id[:10]}...")
-                            
-                            # Verify the session works for homework API
-                            if self.test_session_validity(session_id):
-                                print("✅ Authenticated session is valid for homework API!")
-                                self.current_session = session_id
-                                self.session_expiry = datetime.now() + timedelta(hours=4)  # Longer expiry for authenticated sessions
-                                return session_id
-                            else:
-                                print("⚠️ Authenticated session not valid for homework API")
-                        else:
-                            print("⚠️ No session ID found after login")
-                    else:
-                        print(f"❌ Login failed: {login_result}")
-                        return None
-                        
-                except json.JSONDecodeError:
-                    print("⚠️ Invalid JSON response from login API")
-                    print(f"Response: {response.text}")
-                    return None
-            else:
-                print(f"❌ Login request failed with status code: {response.status_code}")
-                return None
-                
-        except Exception as e:
-            print(f"❌ Error during login: {e}")
-            return None
-
-    def get_fresh_session(self):
-        """Get a fresh session ID, trying login first, then fallback methods"""
-        try:
-            # First, try to use any existing environment session ID
-            env_session = os.environ.get('PHPSESSID')
-            if env_session:
-                print(f"🔑 Trying environment session ID: {env_session[:10]}...")
-                if self.test_session_validity(env_session):
-                    print(f"✅ Environment session ID is valid!")
-                    self.current_session = env_session
-                    self.session_expiry = datetime.now() + timedelta(hours=2)
-                    return env_session
-                else:
-                    print("⚠️ Environment session ID is invalid")
-            
-            # Try to login and get authenticated session
-            session_id = self.login_and_get_session()
-            if session_id:
-                return session_id
-            
-            print("🔄 Login method failed, trying fallback methods...")
-            
-            # Fallback: try to get session from public pages
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.9,tr;q=0.8',
-                'Connection': 'keep-alive',
-            }
-            
-            endpoints_to_try = [
-                f"{self.base_url}/",
-                f"{self.base_url}/login",
-                f"{self.base_url}/index.php"
-            ]
-            
-            for endpoint in endpoints_to_try:
-                try:
-                    response = requests.get(endpoint, headers=headers, timeout=10, allow_redirects=True)
-                    if 'PHPSESSID' in response.cookies:
-                        session_id = response.cookies['PHPSESSID']
-                        print(f"🔍 Got session ID from {endpoint}: {session_id[:10]}...")
-                        
-                        # Test if this session actually works for the homework API
-                        if self.test_session_validity(session_id):
-                            print(f"✅ Valid session ID obtained!")
-                            self.current_session = session_id
-                            self.session_expiry = datetime.now() + timedelta(hours=2)
-                            return session_id
-                        else:
-                            print(f"⚠️ Session ID from {endpoint} is not valid for homework API")
-                            
-                except Exception as e:
-                    print(f"⚠️ Failed to get session from {endpoint}: {e}")
-                    continue
-            
-            print("❌ Could not obtain valid session ID using any method")
-            print("💡 Solutions:")
-            print("   1. Set SCHOOL_USERNAME and SCHOOL_PASSWORD environment variables for automatic login")
-            print("   2. Set PHPSESSID environment variable with a valid session from your browser")
-            return None
-            
-        except Exception as e:
-            print(f"❌ Error getting fresh session: {e}")
-            return None
-    
-    def test_session_validity(self, session_id):
-        """Test if a session ID is valid by making a test API call"""
-        try:
-            test_url = "https://bogazicisehirkolejiobs.com/obsapi/homework/getHomeworkList?[object%20FormData]&_=1758909470368"
-            
-            headers = {
-                'accept': '*/*',
-                'accept-language': 'en-US,en;q=0.9,tr;q=0.8',
-                'priority': 'u=1, i',
-                'referer': 'https://bogazicisehirkolejiobs.com/',
-                'sec-ch-ua': '"Chromium";v="140", "Not=A?Brand";v="24", "Google Chrome";v="140"',
-                'sec-ch-ua-mobile': '?0',
-                'sec-ch-ua-platform': '"macOS"',
-                'sec-fetch-dest': 'empty',
-                'sec-fetch-mode': 'cors',
-                'sec-fetch-site': 'same-origin',
-                'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36',
-                'x-requested-with': 'XMLHttpRequest'
-            }
-            
-            cookies = {'PHPSESSID': session_id}
-            response = requests.get(test_url, headers=headers, cookies=cookies, timeout=10)
-            
-            if response.status_code == 200:
-                try:
-                    data = response.json()
-                    # Check if the response indicates login is required
-                    if isinstance(data, dict):
-                        if data.get('success') == False and 'login' in str(data.get('error', '')).lower():
-                            return False
-                        if 'data' in data or 'success' in data:
-                            return True
-                    elif isinstance(data, list):
-                        return True
-                except:
-                    pass
-            
-            return False
-            
-        except Exception as e:
-            print(f"⚠️ Error testing session validity: {e}")
-            return False
-
-    def get_valid_session(self):
-        """Get a valid session ID, refreshing if necessary"""
-        if (self.current_session and 
-            self.session_expiry and 
-            datetime.now() < self.session_expiry):
-            return self.current_session
-        
-        print("🔄 Getting fresh session...")
-        return self.get_fresh_session()
-
-    def make_api_request(self, url, max_retries=2):
-        """Make API request with automatic session refresh on failure"""
-        headers = {
-            'accept': '*/*',
-            'accept-language': 'en-US,en;q=0.9,tr;q=0.8',
-            'priority': 'u=1, i',
-            'referer': 'https://bogazicisehirkolejiobs.com/',
-            'sec-ch-ua': '"Chromium";v="140", "Not=A?Brand";v="24", "Google Chrome";v="140"',
-            'sec-ch-ua-mobile': '?0',
-            'sec-ch-ua-platform': '"macOS"',
-            'sec-fetch-dest': 'empty',
-            'sec-fetch-mode': 'cors',
-            'sec-fetch-site': 'same-origin',
-            'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36',
-            'x-requested-with': 'XMLHttpRequest'
-        }
-        
-        for attempt in range(max_retries + 1):
-            try:
-                session_id = self.get_valid_session()
-                if not session_id:
-                    return None
-                
-                cookies = {'PHPSESSID': session_id}
-                response = requests.get(url, headers=headers, cookies=cookies, timeout=30)
-                
-                if response.status_code in [401, 403]:
-                    print(f"🔒 Session invalid (HTTP {response.status_code}), attempting refresh...")
-                    self.current_session = None
-                    continue
-                
-                try:
-                    response.json()  # Validate JSON
-                    response.raise_for_status()
-                    return response
-                except json.JSONDecodeError:
-                    if attempt < max_retries:
-                        print("⚠️ Invalid JSON response, attempting refresh...")
-                        self.current_session = None
-                        continue
-                    else:
-                        return None
-                
-            except requests.exceptions.RequestException as e:
-                if attempt < max_retries:
-                    print(f"⚠️ Request failed (attempt {attempt + 1}), retrying: {e}")
-                    self.current_session = None
-                else:
-                    print(f"❌ Request failed after {max_retries + 1} attempts: {e}")
-                    return None
-        
-        return None
+from datetime import datetime, timedelta
 
-# Global session manager
-session_manager = SessionManager()
+# Session management and pipeline stages are shared with the Vercel functions
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api'))
+from session_manager import session_manager
+from session_pool import load_accounts, session_pool
+from homework_record import CSV_COLUMNS, read_records, sort_by_due_date, write_records
+from homework_sync import sync_accounts, sync_homework, sync_homework_async
+from id_index import IdIndex, index_path_for
 
-def fetch_homework_data():
-    """Make API call to fetch homework data using session manager"""
-    url = "https://bogazicisehirkolejiobs.com/obsapi/homework/getHomeworkList?[object%20FormData]&_=1758909470368"
-    
-    response = session_manager.make_api_request(url)
-    if response:
-        try:
-            return response.json()
-        except json.JSONDecodeError:
-            print("Warning: Response is not valid JSON. Raw response:")
-            print(response.text)
-            return {"raw_response": response.text}
-    return None
-
-def fetch_homework_detail(homework_id):
-    """Make API call to fetch homework detail data for a specific ID using session manager"""
-    url = f"https://bogazicisehirkolejiobs.com/obsapi/homework/getHomeworkDetail?id={homework_id}&[object%20FormData]&_=1758909470369"
-    
-    response = session_manager.make_api_request(url)
-    if response:
-        try:
-            return response.json()
-        except json.JSONDecodeError:
-            print(f"Warning: Detail response for ID {homework_id} is not valid JSON")
-            return None
-    return None
+# Where the single-account CSV is written; batch mode writes next to it
+OUTPUT_FILE = "/Users/nusretbutunay/Desktop/personal/homework_report.csv"
 
 def read_existing_csv(csv_file_path):
-    """Read existing CSV file and return set of existing homework IDs"""
-    existing_ids = set()
-    
+    """Read existing CSV file and return its header and HomeworkRecords"""
     try:
-        with open(csv_file_path, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                if 'id' in row and row['id']:
-                    existing_ids.add(str(row['id']))
+        with open(csv_file_path, 'r', newline='', encoding='utf-8') as csvfile:
+            fieldnames, rows = read_records(csvfile)
         
-        print(f"📋 Found {len(existing_ids)} existing homework records in CSV")
-        return existing_ids
+        print(f"📋 Found {len(rows)} existing homework records in CSV")
+        return fieldnames, rows
         
     except FileNotFoundError:
         print("📝 No existing CSV file found - will create new one")
-        return set()
+        return [], []
     except Exception as e:
         print(f"⚠️ Error reading existing CSV: {e}")
-        return set()
+        return [], []
 
-def append_new_records_to_csv(csv_file_path, new_homework_data):
-    """Append new homework records to existing CSV file"""
-    
-    # Define the columns in the correct order (matching user's CSV structure)
-    columns = ['id', 'status', 'teaNameSurname', 'lesson', 'startDate', 'endDate', 'description']
+def append_new_records_to_csv(csv_file_path, new_rows, fieldnames=CSV_COLUMNS):
+    """Append new homework rows to existing CSV file, in the column order of ``fieldnames``"""
     
     # Check if file exists and has headers
     file_exists = False
@@ -350,7 +55,7 @@ def append_new_records_to_csv(csv_file_path, new_homework_data):
     if not file_exists:
         with open(csv_file_path, 'w', newline='', encoding='utf-8') as csvfile:
             writer = csv.writer(csvfile)
-            writer.writerow(columns)
+            writer.writerow(fieldnames)
         print("📝 Created new CSV file with headers")
         
     # Ensure file ends with proper newline before appending
@@ -365,134 +70,291 @@ def append_new_records_to_csv(csv_file_path, new_homework_data):
     except Exception as e:
         print(f"⚠️ Warning: Could not check/fix file ending: {e}")
     
-    # Append new records
-    new_records_added = 0
+    # Append new records (status left empty for the user to fill manually)
     with open(csv_file_path, 'a', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        
-        for item in new_homework_data:
-            row = []
-            for column in columns:
-                if column == 'status':
-                    # Leave status empty for user to fill manually
-                    row.append('')
-                elif column == 'description':
-                    # Description comes from the detail API call
-                    row.append(item.get('description', ''))
-                else:
-                    # Other columns come from the main homework data
-                    row.append(item.get(column, ''))
-            
-            writer.writerow(row)
-            new_records_added += 1
+        write_records(csvfile, fieldnames, new_rows, header=False)
+    
+    return len(new_rows)
+
+def rewrite_csv(csv_file_path, fieldnames, rows):
+    """Rewrite the whole CSV file, e.g. after rows were updated in place"""
+    tmp_path = f"{csv_file_path}.tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as csvfile:
+        write_records(csvfile, fieldnames, rows)
+    os.replace(tmp_path, csv_file_path)
+
+def load_id_index(csv_file_path):
+    """The ID index saved next to a CSV file (None if there is none yet)"""
+    return IdIndex.load(index_path_for(csv_file_path))
+
+def save_id_index(csv_file_path, outcome):
+    """Save the ID index of a sync outcome's rows next to the CSV file"""
+    try:
+        outcome['id_index'].save(index_path_for(csv_file_path))
+    except OSError as e:
+        print(f"⚠️ Could not save ID index: {e}")
+
+def write_outcome_to_csv(csv_file_path, outcome):
+    """Store a sync outcome in the CSV file and return how many new records were added"""
+    new_rows = outcome['new_rows']
+    existing_fieldnames = outcome['existing_fieldnames']
+    fieldnames = outcome['fieldnames']
+    if outcome['updated_count'] or (existing_fieldnames and fieldnames != existing_fieldnames):
+        # Edited rows (or a header without listHash) need a full rewrite
+        print("📄 Updating edited records and adding new records...")
+        rewrite_csv(csv_file_path, fieldnames, outcome['rows'])
+        return len(new_rows)
     
-    return new_records_added
+    # Append new records to existing CSV (already sorted by due date, most recent first),
+    # laid out like its header
+    print("📄 Appending new records to CSV...")
+    return append_new_records_to_csv(csv_file_path, new_rows, fieldnames)
 
 def main():
     """Main function to run the homework fetcher"""
     print("🚀 Starting homework data fetch...")
     
     # Define output file path
-    output_file = "/Users/nusretbutunay/Desktop/personal/homework_report.csv"
+    output_file = OUTPUT_FILE
     
-    # Read existing CSV to see what homework IDs we already have
-    existing_ids = read_existing_csv(output_file)
+    # Report detail progress as each homework completes
+    def report_progress(done, total, record):
+        if record.id is not None:
+            print(f"📖 Fetched details for homework {record.id} ({done}/{total})")
+        else:
+            print(f"⚠️ Homework item missing ID: {record}")
     
-    # Fetch homework list from API
-    homework_list_data = fetch_homework_data()
+    # List, compare with the CSV and fetch details for new and edited homework on one event loop
+    outcome = sync_homework(
+        session_manager,
+        lambda: read_existing_csv(output_file),
+        on_progress=report_progress,
+        load_index=lambda: load_id_index(output_file)
+    )
     
-    if homework_list_data is None:
+    if outcome is None:
         print("❌ Failed to fetch homework list")
         return 1
     
-    # Extract homework items from the response
-    homework_items = []
-    if isinstance(homework_list_data, dict):
-        if 'data' in homework_list_data:
-            homework_items = homework_list_data['data']
-        elif 'homework' in homework_list_data or 'homeworks' in homework_list_data:
-            homework_items = homework_list_data.get('homework', homework_list_data.get('homeworks', []))
-        else:
-            print("⚠️ Unexpected data format from homework list API")
-            print(json.dumps(homework_list_data, indent=2, ensure_ascii=False))
-            return 1
-    elif isinstance(homework_list_data, list):
-        homework_items = homework_list_data
-    else:
-        print("⚠️ Unexpected data format from homework list API")
-        return 1
-    
-    if not homework_items:
+    if not outcome['total_items']:
         print("📭 No homework items found from API")
         return 0
     
-    # Filter out homework items that already exist in CSV
-    new_homework_items = []
-    for item in homework_items:
-        homework_id = str(item.get('id', ''))
-        if homework_id and homework_id not in existing_ids:
-            new_homework_items.append(item)
+    new_rows = outcome['new_rows']
+    updated_count = outcome['updated_count']
+    print(f"📚 Found {outcome['total_items']} total homework items from API")
+    print(f"🆕 Processed {len(new_rows)} new homework items")
+    print(f"✏️ Refreshed {updated_count} edited homework items")
     
-    print(f"📚 Found {len(homework_items)} total homework items from API")
-    print(f"🆕 Found {len(new_homework_items)} new homework items to process")
+    cache_stats = session_manager.flush_detail_cache()
+    if cache_stats:
+        print(f"🗃️ Detail cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
     
-    if not new_homework_items:
+    if not new_rows and not updated_count:
+        save_id_index(output_file, outcome)
         print("✅ No new homework items to add - CSV is up to date!")
         return 0
     
-    # Fetch details for NEW homework items only
-    new_homework_data_with_details = []
-    for i, item in enumerate(new_homework_items):
-        homework_id = item.get('id')
-        if homework_id:
-            print(f"📖 Fetching details for new homework {homework_id} ({i+1}/{len(new_homework_items)})")
-            detail_data = fetch_homework_detail(homework_id)
-            
-            # Combine main data with detail data
-            combined_item = item.copy()  # Start with the main homework item
-            
-            if detail_data and isinstance(detail_data, dict):
-                # Extract description from detail data
-                if 'data' in detail_data and isinstance(detail_data['data'], dict):
-                    description = detail_data['data'].get('description', '')
-                elif 'description' in detail_data:
-                    description = detail_data['description']
-                else:
-                    description = ''
-                
-                combined_item['description'] = description
-            else:
-                combined_item['description'] = ''
-            
-            new_homework_data_with_details.append(combined_item)
-        else:
-            print(f"⚠️ Homework item missing ID: {item}")
-            # Still add it but without description
-            item_copy = item.copy()
-            item_copy['description'] = ''
-            new_homework_data_with_details.append(item_copy)
-    
-    # Sort new records by due date (descending - most recent due dates first)
-    print("🔄 Sorting new records by due date...")
-    new_homework_data_with_details.sort(key=lambda x: x.get('endDate', ''), reverse=True)
-    
-    # Append new records to existing CSV
-    print("📄 Appending new records to CSV...")
     try:
-        new_records_added = append_new_records_to_csv(output_file, new_homework_data_with_details)
+        new_records_added = write_outcome_to_csv(output_file, outcome)
+        save_id_index(output_file, outcome)
         
         print(f"✅ Successfully updated CSV file: {output_file}")
         print(f"📊 Added {new_records_added} new homework entries")
+        if updated_count:
+            print(f"✏️ Updated {updated_count} edited homework entries")
         print("💾 Your existing data and status values have been preserved!")
         
         if new_records_added > 0:
             print("📝 New records have empty status - you can fill them in manually")
         
+        stats = outcome['connections']
+        print(f"🔌 {stats['requests']} requests over {stats['connections_opened']} connections "
+              f"({stats['connections_reused']} reused)")
+        
     except Exception as e:
         print(f"❌ Error updating CSV file: {e}")
         return 1
     
     return 0
 
+def main_batch(output_dir):
+    """Fetch homework for every account in SCHOOL_ACCOUNTS concurrently, one CSV per account"""
+    accounts = load_accounts()
+    if not accounts:
+        print("❌ No accounts configured - set SCHOOL_ACCOUNTS to a JSON list of accounts")
+        return 1
+    
+    print(f"🚀 Starting homework data fetch for {len(accounts)} accounts...")
+    
+    def csv_path_for(account):
+        return os.path.join(output_dir, account['csv_path'])
+    
+    def save_outcome(account, outcome):
+        if outcome is None:
+            print(f"❌ [{account['name']}] Failed to fetch homework list")
+            return {'success': False, 'error': 'Failed to fetch homework list'}
+        new_rows = outcome['new_rows']
+        updated_count = outcome['updated_count']
+        if new_rows or updated_count or outcome['fieldnames'] != outcome['existing_fieldnames']:
+            sort_by_due_date(outcome['rows'])
+            rewrite_csv(csv_path_for(account), outcome['fieldnames'], outcome['rows'])
+        save_id_index(csv_path_for(account), outcome)
+        print(f"✅ [{account['name']}] {len(new_rows)} new, {updated_count} updated -> {csv_path_for(account)}")
+        return {'success': True, 'new_items': len(new_rows), 'updated_items': updated_count}
+    
+    results = sync_accounts(
+        session_pool,
+        accounts,
+        lambda account: read_existing_csv(csv_path_for(account)),
+        save_outcome,
+        load_index=lambda account: load_id_index(csv_path_for(account))
+    )
+    
+    cache_stats = session_pool.flush_detail_cache()
+    if cache_stats:
+        print(f"🗃️ Detail cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    
+    failed = [name for name, result in results.items() if not result.get('success')]
+    print(f"📊 Synced {len(results) - len(failed)} of {len(results)} accounts")
+    return 1 if failed else 0
+
+class PollSchedule:
+    """Adaptive delay between homework list checks for watch mode
+
+    Polls every ``fast`` seconds right after a change, then doubles the delay on each
+    quiet check up to ``max_school`` during school hours or ``max_off_hours`` outside
+    them. Failed checks back off the same way. Outside school hours the delay never
+    runs past the start of the next school day. Delays get +/-10% jitter.
+    """
+
+    def __init__(self, fast=60, initial=300, max_school=1800, max_off_hours=4 * 3600,
+                 school_start=8, school_end=18, school_days=(0, 1, 2, 3, 4)):
+        self.fast = fast
+        self.initial = initial
+        self.max_school = max_school
+        self.max_off_hours = max_off_hours
+        self.school_start = school_start
+        self.school_end = school_end
+        self.school_days = set(school_days)
+        self.interval = None
+
+    @classmethod
+    def from_env(cls):
+        """Build a schedule from WATCH_* settings (minutes and hours of day)"""
+        school_hours = os.environ.get('WATCH_SCHOOL_HOURS', '8-18').split('-')
+        school_days = os.environ.get('WATCH_SCHOOL_DAYS', '0,1,2,3,4')
+        return cls(
+            fast=float(os.environ.get('WATCH_FAST_MINUTES', '1')) * 60,
+            initial=float(os.environ.get('WATCH_INITIAL_MINUTES', '5')) * 60,
+            max_school=float(os.environ.get('WATCH_MAX_SCHOOL_MINUTES', '30')) * 60,
+            max_off_hours=float(os.environ.get('WATCH_MAX_OFF_HOURS_MINUTES', '240')) * 60,
+            school_start=int(school_hours[0]),
+            school_end=int(school_hours[1]),
+            school_days=[int(day) for day in school_days.split(',') if day.strip()]
+        )
+
+    def in_school_hours(self, now):
+        return now.weekday() in self.school_days and self.school_start <= now.hour < self.school_end
+
+    def seconds_until_school(self, now):
+        """Seconds until the next school-hours window opens"""
+        candidate = now.replace(hour=self.school_start, minute=0, second=0, microsecond=0)
+        for _ in range(8):
+            if candidate > now and candidate.weekday() in self.school_days:
+                return (candidate - now).total_seconds()
+            candidate += timedelta(days=1)
+        return self.max_off_hours
+
+    def next_delay(self, changed, now=None):
+        """Seconds to wait before the next check, given whether this check saw changes"""
+        now = now or datetime.now()
+        school = self.in_school_hours(now)
+        cap = self.max_school if school else self.max_off_hours
+
+        if changed:
+            self.interval = self.fast
+        elif self.interval is None:
+            self.interval = self.initial
+        else:
+            self.interval = self.interval * 2
+        self.interval = min(self.interval, cap)
+
+        delay = self.interval * random.uniform(0.9, 1.1)
+        if not school:
+            delay = min(delay, self.seconds_until_school(now))
+        return max(1.0, delay)
+
+def format_delay(seconds):
+    minutes = seconds / 60
+    return f"{minutes:.0f} min" if minutes >= 1 else f"{seconds:.0f} s"
+
+async def watch_async(output_file, schedule):
+    """Keep one session and connection pool open and re-sync whenever the list changes"""
+    # Imported here so a one-off run does not need aiohttp until it actually syncs
+    from obs_client import AsyncOBSClient
+    
+    # List validators and fingerprint live in memory between checks, so quiet checks are cheap
+    state = {}
+    async with AsyncOBSClient(session_manager) as client:
+        while True:
+            changed = False
+            try:
+                outcome = await sync_homework_async(
+                    client, lambda: read_existing_csv(output_file), state=state,
+                    load_index=lambda: load_id_index(output_file)
+                )
+            except Exception as e:
+                print(f"❌ Check failed: {e}")
+                outcome = None
+            
+            if outcome is None:
+                print("⚠️ Could not fetch homework list")
+            elif outcome['unchanged']:
+                print(f"💤 {datetime.now():%H:%M} No changes")
+            else:
+                changed = bool(outcome['new_rows'] or outcome['updated_count'])
+                if changed:
+                    added = await asyncio.to_thread(write_outcome_to_csv, output_file, outcome)
+                    save_id_index(output_file, outcome)
+                    print(f"🔔 {datetime.now():%H:%M} Added {added} new and updated "
+                          f"{outcome['updated_count']} edited homework entries")
+                else:
+                    print(f"💤 {datetime.now():%H:%M} List changed but no homework to add")
+                
+                list_result = outcome['list_result']
+                if outcome['complete']:
+                    state.update(
+                        list_fingerprint=outcome['fingerprint'],
+                        list_etag=list_result['etag'],
+                        list_last_modified=list_result['last_modified'],
+                        pending_ids=[]
+                    )
+                else:
+                    state['pending_ids'] = outcome['still_pending']
+                session_manager.flush_detail_cache()
+            
+            delay = schedule.next_delay(changed)
+            print(f"⏱️ Next check in {format_delay(delay)}")
+            await asyncio.sleep(delay)
+
+def main_watch():
+    """Run as a daemon that keeps checking for new homework on an adaptive schedule"""
+    print("👀 Watching for new homework (Ctrl+C to stop)...")
+    
+    # Renew the session in the background before it expires so checks never wait for a login
+    if not session_manager.refresh_ahead:
+        session_manager.refresh_ahead = 0.75
+    
+    try:
+        asyncio.run(watch_async(OUTPUT_FILE, PollSchedule.from_env()))
+    except KeyboardInterrupt:
+        print("👋 Stopped watching")
+    return 0
+
 if __name__ == "__main__":
+    if '--watch' in sys.argv[1:]:
+        sys.exit(main_watch())
+    if '--all-accounts' in sys.argv[1:]:
+        sys.exit(main_batch(os.path.dirname(OUTPUT_FILE)))
     sys.exit(main())
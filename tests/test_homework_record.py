@@ -0,0 +1,47 @@
+"""
+Tests for HomeworkRecord parsing and the CSV codec
+
+Run with: python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+
+from homework_record import parse_csv, parse_date, parse_id, records_to_csv
+
+class ParseTest(unittest.TestCase):
+
+    def test_only_canonical_integer_ids_become_ints(self):
+        self.assertEqual(parse_id('42'), 42)
+        self.assertEqual(parse_id(' 42 '), 42)
+        self.assertEqual(parse_id('0'), 0)
+        self.assertEqual(parse_id('007'), '007')
+        self.assertEqual(parse_id('+7'), '+7')
+        self.assertEqual(parse_id('ek-1'), 'ek-1')
+        self.assertIsNone(parse_id('  '))
+
+    def test_only_plain_iso_dates_become_dates(self):
+        self.assertEqual(parse_date('2025-03-05'), date(2025, 3, 5))
+        self.assertEqual(parse_date('2025-W10-1'), '2025-W10-1')
+        self.assertEqual(parse_date('5 March'), '5 March')
+        self.assertIsNone(parse_date(''))
+
+class CsvRoundTripTest(unittest.TestCase):
+
+    def test_csv_is_written_back_unchanged(self):
+        text = (
+            "id,status,teaNameSurname,lesson,startDate,endDate,description,listHash,notes\r\n"
+            "007,done,Ayşe Yılmaz,Türkçe,2025-03-01,2025-03-05,\"Read, then write\",,bring book\r\n"
+            "12,,Mehmet Kaya,Math,2025-W10-1,next week,Exercises,abc,\r\n"
+            "ek-1,,,,,,,,\r\n"
+        )
+        fieldnames, records = parse_csv(text)
+        self.assertEqual([record.id for record in records], ['007', 12, 'ek-1'])
+        self.assertEqual(records_to_csv(fieldnames, records), text)
+
+if __name__ == '__main__':
+    unittest.main()
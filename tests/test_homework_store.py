@@ -0,0 +1,183 @@
+"""
+Tests for the partitioned GitHub homework store, against an in-memory repository
+
+Run with: python -m unittest discover tests
+"""
+
+import json
+import os
+import sys
+import threading
+import unittest
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+
+from github_storage import blob_sha
+from homework_record import CSV_COLUMNS, HomeworkRecord, records_to_csv
+from homework_store import PartitionedCsvStore, partition_key
+
+class FakeStorage:
+    """get_file/commit_files over a dict of paths, refusing commits whose expected SHAs are stale"""
+
+    def __init__(self, files=None):
+        self.files = dict(files or {})
+        self.commits = []
+        self.reads = []
+        self._lock = threading.Lock()
+
+    def get_file(self, path):
+        with self._lock:
+            self.reads.append(path)
+        content = self.files.get(path)
+        return (content, blob_sha(content)) if content is not None else (None, None)
+
+    def commit_files(self, files, commit_message, expected_shas=None, max_attempts=3):
+        expected_shas = expected_shas or {}
+        for path, sha in expected_shas.items():
+            if self.get_file(path)[1] != sha:
+                return None
+        self.commits.append({'files': dict(files), 'expected_shas': dict(expected_shas)})
+        for path, content in files.items():
+            if content is None:
+                self.files.pop(path, None)
+            else:
+                self.files[path] = content
+        return f"commit-{len(self.commits)}"
+
+def record(homework_id, due, status=''):
+    return HomeworkRecord(id=homework_id, status=status, teacher='Ayşe Yılmaz', lesson='Türkçe',
+                          start_date='2025-01-01', end_date=due, description=f"Homework {homework_id}")
+
+RECORDS = [
+    record(1, '2024-10-15'),
+    record(2, '2024-12-01'),
+    record(3, '2025-01-20'),
+    record(4, '2025-03-05'),
+    record(5, '2025-05-30'),
+    record(6, ''),
+]
+
+AUTUMN = 'homework_report/2024-2025-1.csv'
+SPRING = 'homework_report/2024-2025-2.csv'
+UNDATED = 'homework_report/undated.csv'
+MANIFEST = 'homework_report/manifest.json'
+
+class PartitionKeyTest(unittest.TestCase):
+
+    def test_terms(self):
+        self.assertEqual(partition_key(date(2024, 9, 1), 'term'), '2024-2025-1')
+        self.assertEqual(partition_key(date(2025, 1, 31), 'term'), '2024-2025-1')
+        self.assertEqual(partition_key(date(2025, 2, 1), 'term'), '2024-2025-2')
+        self.assertEqual(partition_key(date(2025, 8, 31), 'term'), '2024-2025-2')
+
+    def test_months_and_undated(self):
+        self.assertEqual(partition_key(date(2025, 3, 5), 'month'), '2025-03')
+        self.assertEqual(partition_key('next week', 'term'), 'undated')
+        self.assertEqual(partition_key(None, 'month'), 'undated')
+
+class PartitionedCsvStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = FakeStorage()
+        self.store = PartitionedCsvStore('homework_report.csv', 'term', storage=self.storage)
+
+    def save_all(self):
+        version = self.store.save(CSV_COLUMNS, list(RECORDS), None, "initial")
+        self.assertIsNotNone(version)
+        self.storage.commits.clear()
+        return version
+
+    def test_first_save_writes_every_partition_and_the_manifest(self):
+        version = self.store.save(CSV_COLUMNS, list(RECORDS), None, "initial")
+        self.assertEqual(len(self.storage.commits), 1)
+        commit = self.storage.commits[0]
+        self.assertEqual(set(commit['files']), {AUTUMN, SPRING, UNDATED, MANIFEST})
+        self.assertEqual(commit['expected_shas'], dict.fromkeys(commit['files']))
+
+        manifest = json.loads(self.storage.files[MANIFEST])
+        entries = {entry['key']: entry for entry in manifest['partitions']}
+        self.assertEqual(entries['2024-2025-1']['rows'], 3)
+        self.assertEqual(entries['2024-2025-1']['first_due'], '2024-10-15')
+        self.assertEqual(entries['2024-2025-1']['last_due'], '2025-01-20')
+        self.assertEqual(entries['2024-2025-1']['sha'], blob_sha(self.storage.files[AUTUMN]))
+        self.assertIsNone(entries['undated']['first_due'])
+        self.assertEqual(version, self.store.load()[2])
+
+    def test_load_round_trips_the_records(self):
+        self.save_all()
+        fieldnames, records, _ = self.store.load()
+        self.assertEqual(fieldnames, CSV_COLUMNS)
+        self.assertEqual(sorted(records, key=lambda r: r.id), RECORDS)
+
+    def test_edit_commits_only_its_partition(self):
+        version = self.save_all()
+        spring_sha = version['shas'][SPRING]
+        edited = [record(4, '2025-03-05', status='done') if r.id == 4 else r for r in RECORDS]
+
+        new_version = self.store.save(CSV_COLUMNS, edited, version, "status")
+        self.assertEqual(len(self.storage.commits), 1)
+        commit = self.storage.commits[0]
+        self.assertEqual(set(commit['files']), {SPRING, MANIFEST})
+        self.assertEqual(commit['expected_shas'], {SPRING: spring_sha, MANIFEST: version['manifest_sha']})
+        self.assertEqual(new_version, self.store.load()[2])
+        self.assertNotEqual(new_version['shas'][SPRING], spring_sha)
+        self.assertEqual(new_version['shas'][AUTUMN], version['shas'][AUTUMN])
+
+    def test_emptied_partition_is_deleted(self):
+        version = self.save_all()
+        remaining = [r for r in RECORDS if r.id not in (4, 5)]
+
+        new_version = self.store.save(CSV_COLUMNS, remaining, version, "cleanup")
+        commit = self.storage.commits[0]
+        self.assertEqual(set(commit['files']), {SPRING, MANIFEST})
+        self.assertIsNone(commit['files'][SPRING])
+        self.assertEqual(commit['expected_shas'][SPRING], version['shas'][SPRING])
+        self.assertNotIn(SPRING, self.storage.files)
+        self.assertNotIn(SPRING, new_version['shas'])
+        keys = [entry['key'] for entry in json.loads(self.storage.files[MANIFEST])['partitions']]
+        self.assertEqual(keys, ['2024-2025-1', 'undated'])
+
+    def test_unchanged_save_commits_nothing(self):
+        version = self.save_all()
+        self.assertEqual(self.store.save(CSV_COLUMNS, list(reversed(RECORDS)), version, "again"), version)
+        self.assertEqual(self.storage.commits, [])
+
+    def test_unchanged_save_commits_only_the_extra_files(self):
+        version = self.save_all()
+        report = {'homework_report.html': '<html></html>'}
+        self.assertEqual(self.store.save(CSV_COLUMNS, list(RECORDS), version, "report", report), version)
+        self.assertEqual([commit['files'] for commit in self.storage.commits], [report])
+
+    def test_save_against_a_stale_version_is_refused(self):
+        version = self.save_all()
+        edited = [record(1, '2024-10-15', status='done') if r.id == 1 else r for r in RECORDS]
+        self.assertIsNotNone(self.store.save(CSV_COLUMNS, edited, version, "first writer"))
+        files = dict(self.storage.files)
+
+        changed = [record(5, '2025-05-30', status='done') if r.id == 5 else r for r in RECORDS]
+        self.assertIsNone(self.store.save(CSV_COLUMNS, changed, version, "second writer"))
+        self.assertIsNone(self.store.save(CSV_COLUMNS, list(RECORDS), version, "unchanged writer"))
+        self.assertEqual(self.storage.files, files)
+
+    def test_ranged_load_reads_only_overlapping_partitions(self):
+        self.save_all()
+        self.storage.reads.clear()
+        fieldnames, records, version = self.store.load(start=date(2025, 3, 1), end=date(2025, 3, 31))
+        self.assertIsNone(version)
+        self.assertEqual([r.id for r in records], [4])
+        self.assertEqual(sorted(self.storage.reads), [SPRING, MANIFEST])
+
+    def test_legacy_single_csv_is_split_on_first_save(self):
+        legacy = records_to_csv(CSV_COLUMNS, RECORDS)
+        self.storage.files['homework_report.csv'] = legacy
+        fieldnames, records, version = self.store.load()
+        self.assertEqual(records, RECORDS)
+
+        self.assertIsNotNone(self.store.save(fieldnames, records, version, "split"))
+        self.assertEqual(set(self.storage.commits[0]['files']), {AUTUMN, SPRING, UNDATED, MANIFEST})
+        self.assertEqual(self.storage.files['homework_report.csv'], legacy)
+        self.assertEqual(sorted(self.store.load()[1], key=lambda r: r.id), RECORDS)
+
+if __name__ == '__main__':
+    unittest.main()
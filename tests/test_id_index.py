@@ -0,0 +1,84 @@
+"""
+Tests for the compact ID index
+
+Run with: python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+
+from homework_record import HomeworkRecord
+from id_index import IdIndex
+
+ITEMS = [
+    {'id': 30, 'teaNameSurname': 'Ayşe Yılmaz', 'lesson': 'Türkçe', 'startDate': '2025-10-01', 'endDate': '2025-10-08'},
+    {'id': 10, 'teaNameSurname': 'Mehmet Kaya', 'lesson': 'Math', 'startDate': '2025-10-02', 'endDate': '2025-10-09'},
+    {'id': 'ek-1', 'teaNameSurname': 'Can Demir', 'lesson': 'Art', 'startDate': '2025-10-03', 'endDate': ''},
+    {'id': 20, 'teaNameSurname': 'Zeynep Ak', 'lesson': 'Music', 'startDate': '', 'endDate': 'next week'},
+]
+
+def build_index():
+    return IdIndex.from_records([HomeworkRecord.from_obs(item) for item in ITEMS])
+
+class IdIndexTest(unittest.TestCase):
+
+    def test_integer_ids_are_sorted_and_others_kept_apart(self):
+        index = build_index()
+        self.assertEqual(list(index.ids), [10, 20, 30])
+        self.assertEqual(list(index.others), ['ek-1'])
+        self.assertEqual(len(index), 4)
+
+    def test_lookup_accepts_ids_as_text(self):
+        index = build_index()
+        self.assertIn(10, index)
+        self.assertIn('10', index)
+        self.assertIn(' ek-1 ', index)
+        self.assertNotIn(11, index)
+        self.assertNotIn('ek-2', index)
+        self.assertIsNone(index.list_hash(99))
+
+    def test_records_without_ids_are_skipped(self):
+        index = IdIndex.from_records([HomeworkRecord(lesson='Math'), HomeworkRecord(id='', lesson='Art')])
+        self.assertEqual(len(index), 0)
+
+    def test_hand_edited_list_hash_falls_back_to_the_fields(self):
+        record = HomeworkRecord.from_obs(ITEMS[1])
+        expected = record.list_hash
+        record.list_hash = 'not-a-hex-hash!!'
+        index = IdIndex.from_records([record])
+        self.assertEqual(index.list_hash(10), expected)
+
+    def test_round_trip_through_bytes_text_and_file(self):
+        index = build_index()
+        self.assertEqual(IdIndex.from_bytes(index.to_bytes()), index)
+        self.assertEqual(IdIndex.from_text(index.to_text()), index)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'homework_report.csv.idx')
+            index.save(path)
+            self.assertEqual(IdIndex.load(path), index)
+
+    def test_unreadable_data_decodes_to_none(self):
+        data = build_index().to_bytes()
+        self.assertIsNone(IdIndex.from_bytes(b'NOTIDX' + data[6:]))
+        self.assertIsNone(IdIndex.from_bytes(data[:-3]))
+        self.assertIsNone(IdIndex.from_bytes(b''))
+        self.assertIsNone(IdIndex.from_text(''))
+        self.assertIsNone(IdIndex.from_text('not base64!'))
+        self.assertIsNone(IdIndex.load(os.path.join(tempfile.gettempdir(), 'missing-index.idx')))
+
+    def test_classify(self):
+        index = build_index()
+        self.assertIsNone(index.classify(ITEMS[0]))
+        self.assertIsNone(index.classify(ITEMS[2]))
+        self.assertIsNone(index.classify({'lesson': 'Math'}))
+        self.assertEqual(index.classify({**ITEMS[0], 'id': 40}), 'new')
+        self.assertEqual(index.classify({**ITEMS[2], 'id': 'ek-2'}), 'new')
+        self.assertEqual(index.classify({**ITEMS[1], 'id': '10', 'endDate': '2025-10-10'}), 'changed')
+        self.assertEqual(index.classify({**ITEMS[2], 'lesson': 'Drawing'}), 'changed')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+"""
+Tests for the streaming getHomeworkList parser
+
+Run with: python -m unittest discover tests
+"""
+
+import asyncio
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+
+from list_stream import HomeworkListStream, ListItemParser, ListStreamError
+
+ITEMS = [
+    {'id': 1, 'lesson': 'Türkçe', 'description': 'Read "Çalıkuşu", pages 1-20'},
+    {'id': 2, 'lesson': 'Math', 'description': 'Exercises [3], [4], and {5}, then rest'},
+    {'id': 3, 'lesson': 'Art', 'description': 'Path C:\\drawings\\ and a tab\t and a "quote"'},
+]
+
+def parse_in_chunks(body, size):
+    """Feed ``body`` (bytes) to a parser ``size`` bytes at a time; returns (parser, items)"""
+    parser = ListItemParser()
+    items = []
+    for start in range(0, len(body), size):
+        items.extend(parser.feed(body[start:start + size]))
+    items.extend(parser.close())
+    return parser, items
+
+class ListItemParserTest(unittest.TestCase):
+
+    def assert_parses_at_every_split(self, payload, expected):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        for size in range(1, 17):
+            with self.subTest(chunk_size=size):
+                parser, items = parse_in_chunks(body, size)
+                self.assertEqual(items, expected)
+                self.assertTrue(parser.array_done)
+
+    def test_bare_array(self):
+        self.assert_parses_at_every_split(ITEMS, ITEMS)
+
+    def test_array_under_list_key(self):
+        self.assert_parses_at_every_split({'success': True, 'data': ITEMS, 'count': 3}, ITEMS)
+
+    def test_array_under_other_key_is_skipped(self):
+        payload = {'meta': [{'id': 99}], 'homeworks': ITEMS}
+        self.assert_parses_at_every_split(payload, ITEMS)
+
+    def test_escape_split_across_chunks(self):
+        body = b'[{"description": "a \\"quoted\\" \\\\ word"}]'
+        split = body.index(b'\\"')
+        parser = ListItemParser()
+        items = parser.feed(body[:split + 1]) + parser.feed(body[split + 1:]) + parser.close()
+        self.assertEqual(items, [{'description': 'a "quoted" \\ word'}])
+
+    def test_utf8_character_split_across_chunks(self):
+        body = json.dumps([{'lesson': 'Müzik ğüşiöç'}], ensure_ascii=False).encode('utf-8')
+        split = body.index('ü'.encode('utf-8')) + 1
+        parser = ListItemParser()
+        items = parser.feed(body[:split]) + parser.feed(body[split:]) + parser.close()
+        self.assertEqual(items, [{'lesson': 'Müzik ğüşiöç'}])
+
+    def test_brackets_and_commas_inside_strings(self):
+        payload = [{'id': 1, 'description': '], [, }, {, ",", :'}, {'id': 2, 'description': ',,,'}]
+        self.assert_parses_at_every_split(payload, payload)
+
+    def test_empty_array(self):
+        parser, items = parse_in_chunks(b'{"data": []}', 3)
+        self.assertEqual(items, [])
+        self.assertTrue(parser.array_done)
+
+    def test_error_envelope(self):
+        body = b'{"success": false, "error": "Oturum sonlandi"}'
+        parser, items = parse_in_chunks(body, 5)
+        self.assertEqual(items, [])
+        self.assertFalse(parser.found_array)
+        self.assertFalse(parser.array_done)
+        self.assertEqual(parser.envelope(), {'success': False, 'error': 'Oturum sonlandi'})
+
+    def test_login_page_is_not_scanned(self):
+        parser, items = parse_in_chunks(b'<html><form id="login">[1, 2]</form></html>', 4)
+        self.assertEqual(items, [])
+        self.assertFalse(parser.found_array)
+        self.assertIsNone(parser.envelope())
+
+    def test_truncated_body_leaves_array_open(self):
+        body = json.dumps(ITEMS).encode('utf-8')
+        parser, items = parse_in_chunks(body[:-10], 7)
+        self.assertEqual(items, ITEMS[:2])
+        self.assertTrue(parser.found_array)
+        self.assertFalse(parser.array_done)
+
+    def test_corrupt_item_raises(self):
+        parser = ListItemParser()
+        with self.assertRaises(ValueError):
+            parser.feed(b'[{"id": 1}, {"id": 2,,}]')
+
+class FakeContent:
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+
+    async def iter_chunked(self, size):
+        for chunk in self.chunks:
+            yield chunk
+        if self.error is not None:
+            raise self.error
+
+class FakeResponse:
+    def __init__(self, chunks, error=None):
+        self.content = FakeContent(chunks, error)
+        self.released = False
+
+    def release(self):
+        self.released = True
+
+def read_stream(stream):
+    async def collect():
+        return [item async for item in stream]
+    return asyncio.run(collect())
+
+class HomeworkListStreamTest(unittest.TestCase):
+
+    def test_items_arrive_across_chunks(self):
+        body = json.dumps({'data': ITEMS}).encode('utf-8')
+        response = FakeResponse([body[:25], body[25:60], body[60:]])
+        stream = HomeworkListStream(response, ListItemParser())
+        self.assertEqual(read_stream(stream), ITEMS)
+        self.assertIsNone(stream.envelope)
+        self.assertTrue(response.released)
+
+    def test_download_error_becomes_list_stream_error(self):
+        body = json.dumps(ITEMS).encode('utf-8')
+        response = FakeResponse([body[:40]], error=ConnectionResetError("connection reset"))
+        stream = HomeworkListStream(response, ListItemParser())
+        with self.assertRaises(ListStreamError):
+            read_stream(stream)
+        self.assertTrue(response.released)
+
+    def test_truncated_body_raises(self):
+        body = json.dumps(ITEMS).encode('utf-8')
+        stream = HomeworkListStream(FakeResponse([body[:-5]]), ListItemParser())
+        with self.assertRaises(ListStreamError):
+            read_stream(stream)
+
+    def test_corrupt_body_raises(self):
+        stream = HomeworkListStream(FakeResponse([b'[{"id": 1}, {"id": ]']), ListItemParser())
+        with self.assertRaises(ListStreamError):
+            read_stream(stream)
+
+    def test_envelope_after_iteration(self):
+        stream = HomeworkListStream(FakeResponse([b'{"success": false, ', b'"error": "x"}']), ListItemParser())
+        self.assertEqual(read_stream(stream), [])
+        self.assertEqual(stream.envelope, {'success': False, 'error': 'x'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+"""
+Tests for the file lease behind the run lock
+
+Run with: python -m unittest discover tests
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+
+from run_lock import FileLease
+
+class FileLeaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'homework_run.lock')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def lease(self, ttl=60):
+        return FileLease(self.path, ttl=ttl)
+
+    def stored(self):
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def expire(self):
+        """Backdate the stored lease so it has run out"""
+        record = self.stored()
+        record['expires_at'] = time.time() - 1
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(record, f)
+        return record
+
+    def age(self, path, seconds):
+        past = time.time() - seconds
+        os.utime(path, (past, past))
+
+    def test_held_lease_is_not_taken(self):
+        token = self.lease().acquire()
+        self.assertIsNotNone(token)
+        self.assertIsNone(self.lease().acquire())
+        self.assertEqual(self.stored()['owner'], token)
+
+    def test_expired_lease_is_taken_over(self):
+        old_token = self.lease().acquire()
+        self.expire()
+        new_token = self.lease().acquire()
+        self.assertIsNotNone(new_token)
+        self.assertNotEqual(new_token, old_token)
+        self.assertEqual(self.stored()['owner'], new_token)
+        self.assertFalse(os.path.exists(f"{self.path}.rewrite"))
+
+    def test_takeover_loses_to_a_concurrent_rewrite(self):
+        lease = self.lease()
+        lease.acquire()
+        expired = self.expire()
+        # Another process took the marker and is rewriting the lease right now
+        open(lease.marker_path, 'w').close()
+        self.assertIsNone(lease.acquire())
+        os.remove(lease.marker_path)
+        # ... and has replaced the expired lease by the time we look again
+        winner = lease.acquire()
+        self.assertIsNone(lease._take_over(expired, {'owner': 'late', 'expires_at': time.time() + 60}))
+        self.assertEqual(self.stored()['owner'], winner)
+
+    def test_unreadable_lease_is_only_taken_once_stale(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('{"owner": ')
+        lease = self.lease(ttl=30)
+        self.assertIsNone(lease.acquire())
+        self.age(self.path, 60)
+        self.assertIsNotNone(lease.acquire())
+
+    def test_renew_extends_the_lease(self):
+        lease = self.lease()
+        token = lease.acquire()
+        self.expire()
+        self.assertTrue(lease.renew(token))
+        self.assertGreater(self.stored()['expires_at'], time.time())
+        self.assertIsNone(self.lease().acquire())
+
+    def test_renew_fails_once_taken_over(self):
+        lease = self.lease()
+        token = lease.acquire()
+        self.expire()
+        new_token = self.lease().acquire()
+        self.assertFalse(lease.renew(token))
+        self.assertEqual(self.stored()['owner'], new_token)
+
+    def test_renew_retries_later_while_the_marker_is_busy(self):
+        lease = self.lease()
+        token = lease.acquire()
+        expires_at = self.stored()['expires_at']
+        open(lease.marker_path, 'w').close()
+        started = time.monotonic()
+        self.assertTrue(lease.renew(token))
+        self.assertGreaterEqual(time.monotonic() - started, 0.9)
+        self.assertEqual(self.stored()['expires_at'], expires_at)
+
+    def test_stale_marker_is_cleared(self):
+        lease = self.lease(ttl=30)
+        token = lease.acquire()
+        open(lease.marker_path, 'w').close()
+        self.age(lease.marker_path, 60)
+        self.expire()
+        self.assertTrue(lease.renew(token))
+        self.assertGreater(self.stored()['expires_at'], time.time())
+
+    def test_release_only_drops_our_own_lease(self):
+        lease = self.lease()
+        token = lease.acquire()
+        lease.release('someone-else')
+        self.assertTrue(os.path.exists(self.path))
+        lease.release(token)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNotNone(lease.acquire())
+
+    def test_published_result(self):
+        lease = self.lease()
+        self.assertIsNone(lease.last_result())
+        lease.publish({'success': True})
+        self.assertEqual(lease.last_result()['result'], {'success': True})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+"""
+Tests for the SQLite homework store and its GitHub mirror
+
+Run with: python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api'))
+
+from github_storage import blob_sha
+from homework_record import CSV_COLUMNS, HomeworkRecord
+from homework_store import SingleCsvStore
+from sqlite_store import GitHubMirror, SqliteStore
+
+class FakeStorage:
+    """get_file/update_file/commit_files over a dict of paths, refusing writes against stale SHAs"""
+
+    def __init__(self):
+        self.files = {}
+        self.commits = 0
+
+    def get_file(self, path):
+        content = self.files.get(path)
+        return (content, blob_sha(content)) if content is not None else (None, None)
+
+    def commit_files(self, files, commit_message, expected_shas=None, max_attempts=3):
+        for path, sha in (expected_shas or {}).items():
+            if self.get_file(path)[1] != sha:
+                return None
+        self.files.update(files)
+        self.commits += 1
+        return f"commit-{self.commits}"
+
+    def update_file(self, path, content, sha, commit_message):
+        return self.commit_files({path: content}, commit_message, expected_shas={path: sha}) is not None
+
+def record(homework_id, status='', due='2025-03-05', extra=None):
+    return HomeworkRecord(id=homework_id, status=status, teacher='Ayşe Yılmaz', lesson='Türkçe',
+                          start_date='2025-03-01', end_date=due, description=f"Homework {homework_id}",
+                          extra=extra)
+
+def sample_records():
+    """Fresh records each time, since saving sorts the given list in place"""
+    return [record(1), record(2, due='2025-04-01'), record(3, due='2025-02-10')]
+
+class SqliteStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.directory.name, 'homework.sqlite3')
+        self.store = SqliteStore('homework_report.csv', self.db_path)
+
+    def tearDown(self):
+        self.store._connect().close()
+        self.directory.cleanup()
+
+    def write(self, records, version):
+        """_write through the store's connection; returns (new version, rows changed)"""
+        connection = self.store._connect()
+        before = connection.total_changes
+        new_version = self.store._write(connection, CSV_COLUMNS, records, version)
+        return new_version, connection.total_changes - before
+
+    def test_versions_count_saves(self):
+        self.assertIsNone(self.store.current_version())
+        self.assertEqual(self.store.save(CSV_COLUMNS, sample_records(), None, "first"), 1)
+        self.assertEqual(self.store.save(CSV_COLUMNS, sample_records(), 1, "second"), 2)
+        self.assertEqual(self.store.current_version(), 2)
+        self.assertEqual(self.store.load()[2], 2)
+
+    def test_stale_version_is_refused(self):
+        self.store.save(CSV_COLUMNS, sample_records(), None, "first")
+        self.assertIsNone(self.store.save(CSV_COLUMNS, sample_records()[:1], None, "stale"))
+        self.assertIsNone(self.store.save(CSV_COLUMNS, sample_records()[:1], 5, "stale"))
+        self.assertEqual(len(self.store.load()[1]), 3)
+        self.assertEqual(self.store.current_version(), 1)
+
+    def test_unchanged_rows_are_not_rewritten(self):
+        version, changed = self.write(sample_records(), None)
+        self.assertEqual((version, changed), (1, 4))
+
+        version, changed = self.write(sample_records(), version)
+        self.assertEqual((version, changed), (2, 1))  # only the datasets row
+
+        edited = [record(2, status='done', due='2025-04-01') if r.id == 2 else r for r in sample_records()]
+        version, changed = self.write(edited, version)
+        self.assertEqual((version, changed), (3, 2))
+        self.assertEqual({r.id: r.status for r in self.store.load()[1]}, {1: '', 2: 'done', 3: ''})
+
+    def test_removed_ids_are_deleted_and_rows_without_ids_replaced(self):
+        self.write(sample_records() + [HomeworkRecord(lesson='Art')], None)
+        version, changed = self.write(sample_records()[:2] + [HomeworkRecord(lesson='Music')], 1)
+        self.assertEqual(version, 2)
+        # One removed ID, the old ID-less row out and the new one in, plus the datasets row
+        self.assertEqual(changed, 4)
+        records = self.store.load()[1]
+        self.assertEqual(sorted(r.id for r in records if r.id is not None), [1, 2])
+        self.assertEqual([r.lesson for r in records if r.id is None], ['Music'])
+
+    def test_load_round_trips_extra_columns_and_ranges(self):
+        fieldnames = CSV_COLUMNS + ['notes']
+        records = [record(1, extra={'notes': 'bring paints'})] + sample_records()[1:]
+        self.store.save(fieldnames, records, None, "first")
+
+        loaded_fieldnames, loaded, version = self.store.load()
+        self.assertEqual(loaded_fieldnames, fieldnames)
+        self.assertEqual([r.id for r in loaded], [2, 1, 3])
+        self.assertEqual(loaded[1], records[0])
+
+        _, in_march, version = self.store.load(start=date(2025, 3, 1), end=date(2025, 3, 31))
+        self.assertIsNone(version)
+        self.assertEqual([r.id for r in in_march], [1])
+
+class GitHubMirrorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.directory.name, 'homework.sqlite3')
+        self.storage = FakeStorage()
+        self.target = SingleCsvStore('homework_report.csv', storage=self.storage)
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store._connect().close()
+        self.directory.cleanup()
+
+    def open_store(self):
+        store = SqliteStore('homework_report.csv', self.db_path, GitHubMirror(self.target))
+        self.stores.append(store)
+        return store
+
+    def test_empty_database_is_seeded_from_github(self):
+        github_version = self.target.save(CSV_COLUMNS, sample_records(), None, "on GitHub")
+        store = self.open_store()
+        fieldnames, records, version = store.load()
+        self.assertEqual(sorted(records, key=lambda r: r.id), sample_records())
+        self.assertEqual(version, 1)
+        self.assertEqual(store.mirror.version, github_version)
+
+    def test_export_tracks_the_committed_version_across_restarts(self):
+        store = self.open_store()
+        report = {'homework_report.html': '<html></html>'}
+        self.assertEqual(store.save(CSV_COLUMNS, sample_records(), None, "first", report), 1)
+        self.assertEqual(store.mirror.version, self.target.current_version())
+        self.assertIn('homework_report.html', self.storage.files)
+
+        restarted = self.open_store()
+        restarted.load()
+        self.assertEqual(restarted.mirror.version, self.target.current_version())
+        self.assertEqual(restarted.save(CSV_COLUMNS, sample_records()[:2], 1, "second", report), 2)
+        self.assertEqual(len(self.target.load()[1]), 2)
+
+    def test_changed_github_copy_is_not_overwritten(self):
+        store = self.open_store()
+        report = {'homework_report.html': '<html></html>'}
+        store.save(CSV_COLUMNS, sample_records(), None, "first", report)
+        self.target.save(CSV_COLUMNS, sample_records()[:1], self.target.current_version(), "edited on GitHub")
+        github_files = dict(self.storage.files)
+
+        self.assertIsNone(store.save(CSV_COLUMNS, sample_records()[:2], 1, "second", report))
+        self.assertEqual(self.storage.files, github_files)
+        self.assertEqual(store.current_version(), 2)
+
+    def test_stale_version_recovers_when_github_matches(self):
+        store = self.open_store()
+        report = {'homework_report.html': '<html></html>'}
+        store.save(CSV_COLUMNS, sample_records(), None, "first", report)
+        # The same data committed again with no record of its version (e.g. the process stopped)
+        store.mirror.version = 'lost'
+
+        report = {'homework_report.html': '<html>new</html>'}
+        self.assertEqual(store.save(CSV_COLUMNS, sample_records()[::-1], 1, "again", report), 2)
+        self.assertEqual(store.mirror.version, self.target.current_version())
+        self.assertEqual(self.storage.files['homework_report.html'], '<html>new</html>')
+
+        self.assertEqual(store.save(CSV_COLUMNS, sample_records()[:2], 2, "third", report), 3)
+        self.assertEqual(len(self.target.load()[1]), 2)
+
+if __name__ == '__main__':
+    unittest.main()